@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+守护进程的轻量客户端，参数与 main.py 相同
+
+只导入标准库的 socket/json，将请求发给 core/daemon.py 并输出结果；
+守护进程未运行，或ORCA相关的环境变量(见 workflow_env)与守护进程不同时直接执行
+main.py。以 python -S 启动可跳过 site 初始化。
+
+用法:
+    python -S client.py -t opt -p post -i test_water.xyz
+"""
+import os
+import sys
+import json
+import socket
+
+# 守护进程处理的阶段，其余阶段直接执行 main.py
+DAEMON_PROCESSES = ("pre", "post")
+
+SOCKET = os.environ.get("ORCA_WORKFLOW_SOCKET",
+                        os.path.join(os.path.expanduser("~"), ".cache", "orca-workflow", "daemon.sock"))
+
+# 决定使用哪个ORCA及其行为的环境变量，与守护进程不同时不能由守护进程代为执行
+ENV_NAMES = ("PATH", "LD_LIBRARY_PATH")
+ENV_PREFIXES = ("OPI_", "ORCA", "FAKE_ORCA_")
+ENV_IGNORED = ("ORCA_WORKFLOW_SOCKET",)
+
+
+def workflow_env(environ):
+    """取出影响计算的环境变量(ORCA路径、opi 设置、缓存/暂存目录等)"""
+    return {k: v for k, v in environ.items()
+            if (k in ENV_NAMES or k.startswith(ENV_PREFIXES)) and k not in ENV_IGNORED}
+
+
+def process_arg(argv):
+    """取出 -p/--process 参数的值"""
+    for i, arg in enumerate(argv):
+        if arg in ("-p", "--process") and i + 1 < len(argv):
+            return argv[i + 1]
+        if arg.startswith("--process="):
+            return arg.split("=", 1)[1]
+    return None
+
+
+def run_local(argv):
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    os.execv(sys.executable, [sys.executable, main_py] + argv)
+
+
+def main(argv):
+    if process_arg(argv) not in DAEMON_PROCESSES:
+        run_local(argv)
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(SOCKET)
+    except OSError:
+        # 守护进程未运行，退回到直接调用 main.py
+        sock.close()
+        run_local(argv)
+
+    with sock:
+        request = {"command": "run", "cwd": os.getcwd(), "argv": argv, "env": workflow_env(os.environ)}
+        sock.sendall((json.dumps(request) + "\n").encode())
+        response = json.loads(sock.makefile(encoding="utf-8").readline())
+    if response.get("fallback"):
+        # 环境与守护进程不同(如不同的ORCA)，直接执行 main.py
+        sys.stderr.write(response["output"])
+        run_local(argv)
+    sys.stdout.write(response["output"])
+    sys.exit(response["code"])
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,10 +1,12 @@
+import contextlib
+
 from .utils import *
 # OPI imports
 from opi.core import Calculator
 from opi.output.core import Output
 from opi.input.simple_keywords import *
 from opi.input.structures.structure import Structure
-from opi.input.arbitrary_string import ArbitraryString, ArbitraryStringPos
+from opi.input.arbitrary_string import ArbitraryStringPos
 
 
 class OPIWorkflow:
@@ -27,6 +29,23 @@ class OPIWorkflow:
         self.calc = None
         self.output = None
         self.structure = None
+        self.custom_parameters = []
+        self.guess_file = None
+        self.cost_plan = None
+
+        # 计算层级: 替换任务默认关键词中的方法、基组和色散校正
+        self.level = {}
+
+        # 结果缓存
+        self.cache = None
+        self.cache_key = None
+        self.cache_hit = False
+
+        # 结果仓库
+        self.warehouse = None
+
+        # 计时插桩(core.trace)，默认不记录
+        self.tracer = None
 
         # 确保工作目录存在
         self.working_dir.mkdir(parents=True, exist_ok=True)
@@ -40,9 +59,11 @@ class OPIWorkflow:
         xyz_file : Path
             XYZ格式的分子结构文件路径
         """
-        self.structure = Structure.from_xyz(xyz_file)
+        with self.span("setup_structure") as attrs:
+            self.structure = Structure.from_xyz(xyz_file)
+            attrs["natoms"] = len(self.structure.atoms)
 
-    def setup_calculator(self, ncores: int = 1) -> None:
+    def setup_calculator(self, ncores: int = 1, cost_model: Optional[Any] = None) -> None:
         """
         设置计算器
 
@@ -50,13 +71,87 @@ class OPIWorkflow:
         ----------
         ncores : int, optional
             计算使用的CPU核心数，默认为1
+        cost_model : Optional[CostModel], optional
+            耗时模型(core.cost_model)；给定时 ncores 作为上限，按预测的并行效率
+            选择核数并设置每核内存
         """
         if self.structure is None:
             raise ValueError("请先设置分子结构")
 
-        self.calc = Calculator(basename=self.basename, working_dir=self.working_dir)
-        self.calc.structure = self.structure
-        self.calc.input.ncores = ncores
+        with self.span("setup_calculator"):
+            self.calc = Calculator(basename=self.basename, working_dir=self.working_dir)
+            self.calc.structure = self.structure
+            if cost_model is not None:
+                from core.cache import keyword_name
+                # 按任务关键词(opt / sp / engrad ...)选择耗时模型
+                task = next((keyword_name(k) for k in self.simple_keywords()
+                             if any(k is m for m in vars(Task).values())), None)
+                self.cost_plan = cost_model.plan(self.structure.to_xyz_block(),
+                                                 charge=getattr(self.structure, "charge", 0), max_cores=ncores,
+                                                 task=task)
+                ncores = self.cost_plan["ncores"]
+                self.calc.input.memory = self.cost_plan["maxcore"]
+            self.calc.input.ncores = ncores
+
+    def parsed_output(self, output: Optional[Output] = None) -> Output:
+        """
+        返回已解析的ORCA输出，同一工作流内只解析一次
+
+        参数
+        ----------
+        output : Optional[Output], optional
+            已获取但尚未解析的输出对象，默认通过计算器获取
+        """
+        if self.output is None:
+            output = output or self.calc.get_output()
+            with self.span("parse"):
+                output.parse()
+            self.output = output
+        return self.output
+
+    def enable_tracing(self) -> None:
+        """
+        开启计时插桩，之后各步骤的耗时、CPU时间和内存记录在 self.tracer 中
+        """
+        from core.trace import Tracer
+        self.tracer = Tracer(self.basename)
+
+    def span(self, name: str, **attrs):
+        """
+        记录一个步骤的上下文管理器，未开启计时插桩时不做任何事
+
+        参数
+        ----------
+        name : str
+            步骤名称
+        **attrs
+            附加信息
+        """
+        if self.tracer is None:
+            return contextlib.nullcontext({})
+        return self.tracer.span(name, **attrs)
+
+    def save_trace(self, orca_timings: bool = False) -> Optional[Path]:
+        """
+        将记录的步骤追加写入 <basename>.trace.jsonl
+
+        参数
+        ----------
+        orca_timings : bool, optional
+            是否同时合并 .property.json 中ORCA各阶段的耗时(post 阶段)
+
+        返回
+        ----------
+        Optional[Path]
+            计时文件，未开启计时插桩时为None
+        """
+        if self.tracer is None:
+            return None
+        if orca_timings:
+            self.tracer.add_orca_timings(self.working_dir, self.basename)
+        trace_file = self.working_dir / f"{self.basename}.trace.jsonl"
+        self.tracer.save(trace_file)
+        return trace_file
 
     def _check_output(self) -> None:
         """
@@ -94,8 +189,139 @@ class OPIWorkflow:
 
         for param in parameters.split():
             self.calc.input.add_arbitrary_string(
-                ArbitraryString(f"!{param}", pos=ArbitraryStringPos.TOP)
+                f"!{param}", pos=ArbitraryStringPos.TOP
             )
+            self.custom_parameters.append(param)
+
+    def set_guess(self, gbw_file: Path) -> None:
+        """
+        使用已有计算的 .gbw 文件作为SCF初始猜测(MORead)
+
+        .gbw 会被复制为 <basename>_guess.gbw，避免被本次计算覆盖
+
+        参数
+        ----------
+        gbw_file : Path
+            上一阶段计算得到的 .gbw 文件
+        """
+        if self.calc is None:
+            raise ValueError("请先设置计算器")
+
+        guess = self.working_dir / f"{self.basename}_guess.gbw"
+        if Path(gbw_file).resolve() != guess.resolve():
+            # 不复制权限位: 结果缓存和 .gbw 存储中的文件是只读的
+            shutil.copyfile(gbw_file, guess)
+        self.calc.input.add_arbitrary_string("!MORead", pos=ArbitraryStringPos.TOP)
+        self.calc.input.add_arbitrary_string(
+            f'%moinp "{guess.name}"', pos=ArbitraryStringPos.TOP
+        )
+        self.guess_file = guess
+
+    def simple_keywords(self) -> list:
+        """
+        返回该任务写入输入文件的简单关键词列表，由子类实现
+        """
+        return []
+
+    def input_blocks(self) -> list:
+        """
+        返回该任务写入输入文件的 % 输入块(如 %tddft)，由子类实现，计入结果缓存键
+        """
+        return []
+
+    def set_level(self, method: Optional[str] = None, basis_set: Optional[str] = None,
+                  dispersion: Optional[str] = None) -> None:
+        """
+        设置计算层级，替换 simple_keywords 中默认的方法、基组和色散校正
+
+        已关联结果缓存时按新的关键词重新计算缓存键。
+
+        参数
+        ----------
+        method : Optional[str], optional
+            方法，如 PBE0、R2SCAN-3C；默认保持任务的默认方法
+        basis_set : Optional[str], optional
+            基组，如 def2-SVP；"none" 表示不写基组(复合方法)
+        dispersion : Optional[str], optional
+            色散校正，如 D3BJ、D4；"none" 表示不使用色散校正
+        """
+        level = {"method": method, "basis_set": basis_set, "dispersion": dispersion}
+        level = {k: v for k, v in level.items() if v is not None}
+        if not level or level == self.level:
+            return
+        self.level.update(level)
+        if self.cache is not None:
+            self.attach_cache(self.cache)
+
+    def apply_level(self, keywords: list) -> list:
+        """
+        将任务默认关键词中的方法、基组和色散校正替换为 self.level 中设置的层级
+
+        参数
+        ----------
+        keywords : list
+            任务的默认简单关键词
+
+        返回
+        ----------
+        list
+            替换后的简单关键词
+        """
+        if not self.level:
+            return keywords
+        groups = {
+            "method": (Dft, Method, Wft, Sqm),
+            "basis_set": (BasisSet,),
+            "dispersion": (DispersionCorrection,),
+        }
+        result = list(keywords)
+        for key, value in self.level.items():
+            members = [k for group in groups[key] for k in vars(group).values()]
+            result = [k for k in result if not any(k is m for m in members)]
+            if value.lower() != "none":
+                result.append(SimpleKeyword(value))
+        return result
+
+    def attach_cache(self, cache) -> bool:
+        """
+        关联结果缓存，命中时将缓存的计算结果链接到工作目录
+
+        参数
+        ----------
+        cache : ResultCache
+            结果缓存实例
+
+        返回
+        ----------
+        bool
+            是否命中缓存
+        """
+        if self.structure is None:
+            raise ValueError("请先设置分子结构")
+
+        self.cache = cache
+        self.cache_key = cache.key(
+            type(self).__name__, self.structure, self.simple_keywords(),
+            self.custom_parameters + self.input_blocks()
+        )
+        self.cache_hit = cache.restore(self.cache_key, self.working_dir, self.basename)
+        return self.cache_hit
+
+    def _store_cache(self) -> None:
+        """
+        计算成功后将结果存入缓存
+        """
+        if self.cache is not None and not self.cache_hit:
+            self.cache.store(self.cache_key, self.working_dir, self.basename)
+
+    def record_success(self) -> None:
+        """
+        post 阶段检查通过后调用：写入结果缓存和结果仓库
+        """
+        self._store_cache()
+        if self.warehouse is not None:
+            self.warehouse.ingest(self.working_dir, self.basename)
+
     def check_output(self):
 
         from opi.output.grepper import recipes
@@ -0,0 +1,390 @@
+"""
+批量任务管理器 - 在一次调用中通过进程池对大量结构执行 pre/post 阶段
+"""
+import os
+import sys
+import glob
+import json
+import importlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.task_manager import create_workflow
+from core.journal import DONE, FAILED, FINISHED, PREPARED, needs_restart, restart_input
+
+# 阶段成功后在日志中记录的状态
+STATE_AFTER = {"pre": PREPARED, "post": DONE}
+
+GLOB_CHARS = "*?["
+
+# pre 阶段去重跳过的结构记录在任务目录中，run/submit/post 阶段据此跳过
+DUPLICATES_FILE = "duplicates.json"
+
+
+def read_xyz_frames(xyz_file: Path) -> List[str]:
+    """
+    读取(多帧)XYZ文件，返回每一帧的文本
+
+    参数
+    ----------
+    xyz_file : Path
+        XYZ格式文件路径
+
+    返回
+    ----------
+    List[str]
+        每一帧完整的XYZ文本(含原子数行和注释行)
+    """
+    lines = Path(xyz_file).read_text().splitlines()
+    frames = []
+    i = 0
+    while i < len(lines):
+        if not lines[i].strip():
+            i += 1
+            continue
+        natoms = int(lines[i].split()[0])
+        frame = lines[i:i + natoms + 2]
+        if len(frame) < natoms + 2:
+            raise ValueError(f"XYZ文件 '{xyz_file}' 第{len(frames) + 1}帧不完整")
+        frames.append("\n".join(frame) + "\n")
+        i += natoms + 2
+    return frames
+
+
+def split_xyz_frames(xyz_file: Path, out_dir: Optional[Path] = None) -> List[Path]:
+    """
+    将多帧XYZ文件拆分为单帧文件 <stem>_0001.xyz, <stem>_0002.xyz ...
+
+    参数
+    ----------
+    xyz_file : Path
+        多帧XYZ文件路径
+    out_dir : Optional[Path], optional
+        拆分后文件的存放目录，默认为 <stem>_frames
+    """
+    xyz_file = Path(xyz_file)
+    out_dir = Path(out_dir) if out_dir else xyz_file.with_name(f"{xyz_file.stem}_frames")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    files = []
+    for iframe, frame in enumerate(read_xyz_frames(xyz_file), start=1):
+        frame_file = out_dir / f"{xyz_file.stem}_{iframe:04d}.xyz"
+        frame_file.write_text(frame)
+        files.append(frame_file)
+    return files
+
+
+def collect_inputs(source: str) -> List[Path]:
+    """
+    收集批量输入结构：目录、通配符或多帧XYZ文件
+
+    参数
+    ----------
+    source : str
+        目录路径 / glob 通配符 / (多帧)XYZ文件路径
+
+    返回
+    ----------
+    List[Path]
+        按名称排序的单帧XYZ文件列表
+
+    异常
+    ----------
+    ValueError
+        多个文件的文件名(不含扩展名)相同：输入文件、日志和去重记录都以文件名区分结构，
+        例如通配符 confs*/mol.xyz 会互相覆盖结果
+    """
+    path = Path(source)
+    if path.is_dir():
+        candidates = sorted(path.glob("*.xyz"))
+    elif any(c in source for c in GLOB_CHARS):
+        candidates = sorted(Path(p) for p in glob.glob(source))
+    else:
+        candidates = [path]
+
+    files = []
+    for xyz_file in candidates:
+        if len(read_xyz_frames(xyz_file)) > 1:
+            files.extend(split_xyz_frames(xyz_file))
+        else:
+            files.append(xyz_file)
+
+    seen = {}
+    for f in files:
+        if f.stem in seen:
+            raise ValueError(f"输入结构的文件名重复，计算结果会互相覆盖: {seen[f.stem]} 与 {f}")
+        seen[f.stem] = f
+    return files
+
+
+def is_batch_input(source: str) -> bool:
+    """判断输入是否需要走批量模式(目录、通配符或多帧XYZ)"""
+    path = Path(source)
+    if path.is_dir() or any(c in source for c in GLOB_CHARS):
+        return True
+    return path.is_file() and len(read_xyz_frames(path)) > 1
+
+
+def load_duplicates(working_dir: Path) -> Dict[str, str]:
+    """读取任务目录中 重复结构文件(绝对路径) -> 已有结构名称 的映射"""
+    path = Path(working_dir) / DUPLICATES_FILE
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def record_duplicates(working_dir: Path, unique: Iterable[Path], duplicates: Dict[str, str]) -> None:
+    """
+    更新任务目录中的重复结构映射: 加入本次 pre 阶段跳过的结构，移除本次已准备的结构
+
+    参数
+    ----------
+    working_dir : Path
+        任务目录
+    unique : Iterable[Path]
+        本次 pre 阶段处理的结构
+    duplicates : Dict[str, str]
+        本次跳过的 重复结构文件 -> 已有结构名称
+    """
+    path = Path(working_dir) / DUPLICATES_FILE
+    mapping = load_duplicates(working_dir)
+    for f in unique:
+        mapping.pop(str(Path(f).resolve()), None)
+    mapping.update({str(Path(dup).resolve()): match for dup, match in duplicates.items()})
+    if mapping or path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(mapping, indent=2, ensure_ascii=False))
+
+
+def skip_duplicates(working_dir: Path, inputs: Iterable[Path]) -> Tuple[List[Path], Dict[str, str]]:
+    """
+    去掉 pre 阶段已判定为重复(没有输入文件)的结构
+
+    返回
+    ----------
+    Tuple[List[Path], Dict[str, str]]
+        需要处理的结构，以及跳过的 重复结构文件 -> 已有结构名称
+    """
+    known = load_duplicates(working_dir)
+    kept, duplicates = [], {}
+    for f in inputs:
+        match = known.get(str(Path(f).resolve()))
+        if match is None:
+            kept.append(Path(f))
+        else:
+            duplicates[str(f)] = match
+    return kept, duplicates
+
+
+def skip_cache_hits(working_dir: Path, inputs: Iterable[Path]) -> Tuple[List[Path], List[Path]]:
+    """
+    去掉 pre 阶段命中结果缓存的结构，run 阶段不再运行
+
+    命中缓存时 <basename>.cache_hit 标记在恢复 .inp 之后写入；之后不带缓存重新
+    运行 pre 写入的 .inp 比标记新，该结构仍需运行。
+
+    返回
+    ----------
+    Tuple[List[Path], List[Path]]
+        需要运行的结构，以及命中缓存的结构
+    """
+    from core.cache import HIT_SUFFIX
+    kept, hits = [], []
+    for f in inputs:
+        base = Path(working_dir) / Path(f).stem
+        try:
+            hit = (base.with_name(f"{base.name}{HIT_SUFFIX}").stat().st_mtime_ns
+                   >= base.with_name(f"{base.name}.inp").stat().st_mtime_ns)
+        except FileNotFoundError:
+            hit = False
+        (hits if hit else kept).append(Path(f))
+    return kept, hits
+
+
+def _init_worker() -> None:
+    """进程池初始化：预先导入 opi 与工作流基类，避免每个结构重复导入"""
+    try:
+        importlib.import_module("core.base_workflow")
+    except ImportError:
+        # 导入失败时交由 run_structure 按结构记录错误
+        pass
+
+
+def run_structure(task: str, process: str, input_file: str, ncores: int = 1,
+                  cache: Optional[Any] = None, kwargs: Optional[Dict[str, Any]] = None,
+                  warehouse: Optional[Any] = None, restart: bool = False,
+                  cost_model: Optional[Any] = None, trace: bool = False) -> Dict[str, Any]:
+    """
+    对单个结构执行指定阶段，并以字典形式收集结果和错误
+
+    restart 为True且为优化任务的 pre 阶段时，从上次中断计算的轨迹最后一帧和
+    .gbw 重新开始。trace 为True时各步骤的耗时追加写入 <basename>.trace.jsonl，
+    post 阶段同时合并ORCA各阶段的耗时。
+
+    返回
+    ----------
+    Dict[str, Any]
+        包含 input / basename / status ('ok' 或 'failed') / result / error
+    """
+    record = {
+        "input": str(input_file),
+        "basename": Path(input_file).stem,
+        "status": "ok",
+        "result": None,
+        "error": None,
+        "cache_hit": False,
+        "cost_plan": None,
+    }
+    try:
+        structure_file, guess = input_file, None
+        if restart and task == "opt" and process == "pre":
+            working_dir, basename = Path(task), Path(input_file).stem
+            restart_file = restart_input(working_dir, basename)
+            if restart_file is not None:
+                structure_file = restart_file
+                record["restarted"] = True
+                if (working_dir / f"{basename}.gbw").exists():
+                    guess = working_dir / f"{basename}.gbw"
+
+        workflow = create_workflow(task, structure_file, ncores, cache=cache, warehouse=warehouse,
+                                   cost_model=cost_model, trace=trace)
+        if guess is not None:
+            workflow.set_guess(guess)
+        record["cache_hit"] = workflow.cache_hit
+        record["cost_plan"] = workflow.cost_plan
+        try:
+            with workflow.span(f"{process}_{task}"):
+                record["result"] = getattr(workflow, f"{process}_{task}")(**(kwargs or {}))
+        finally:
+            workflow.save_trace(orca_timings=process == "post")
+    except SystemExit as e:
+        # post_* 在计算失败时调用 sys.exit，批量模式下只记录该结构失败
+        record["status"] = "failed"
+        record["error"] = f"退出码 {e.code}"
+    except Exception as e:
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def run_batch(task: str, process: str, inputs: List[Path], ncores: int = 1,
+              workers: Optional[int] = None, cache: Optional[Any] = None,
+              kwargs: Optional[Dict[str, Any]] = None,
+              warehouse: Optional[Any] = None, journal: Optional[Any] = None,
+              cost_model: Optional[Any] = None, dedup: Optional[Any] = None,
+              bulk: bool = False, trace: bool = False) -> List[Dict[str, Any]]:
+    """
+    通过进程池对一批结构执行 pre/post 阶段
+
+    参数
+    ----------
+    task : str
+        任务类型，如 sp / opt
+    process : str
+        阶段类型，pre 或 post
+    inputs : List[Path]
+        单帧XYZ文件列表
+    ncores : int, optional
+        每个ORCA计算使用的核数
+    workers : Optional[int], optional
+        进程池大小，默认为CPU核数；为1时在当前进程内顺序执行
+    cache : Optional[ResultCache], optional
+        结果缓存，默认不使用
+    kwargs : Optional[Dict[str, Any]], optional
+        传给 pre_*/post_* 方法的关键字参数
+    warehouse : Optional[Warehouse], optional
+        结果仓库，post 阶段成功后写入记录
+    journal : Optional[Journal], optional
+        状态日志；给定时跳过已完成的结构，并重启失败/超时的优化
+    cost_model : Optional[CostModel], optional
+        耗时模型；给定时 ncores 作为上限，按结构大小选择每个计算的核数
+    dedup : Optional[DedupIndex], optional
+        结构去重索引；pre 阶段跳过与已排队或已计算结构RMSD在阈值内的结构，
+        跳过的结构记录在 <task>/duplicates.json，其他阶段不再处理
+    bulk : bool, optional
+        pre 阶段使用模板化写入(core.templates)，不为每个结构创建 Calculator；
+        使用缓存、耗时模型或需要断点重启的结构仍走 Calculator 路径
+    trace : bool, optional
+        开启计时插桩(core.trace)，每个结构的步骤耗时写入 <basename>.trace.jsonl
+
+    返回
+    ----------
+    List[Dict[str, Any]]
+        与 inputs 顺序一致的每个结构的结果记录，去重跳过的结构附在最后
+    """
+    workers = workers or os.cpu_count() or 1
+    states = {}
+    if journal is not None:
+        inputs = journal.pending(task, process, inputs)
+        states = journal.states(task)
+
+    duplicates = {}
+    if process == "pre":
+        if dedup is not None:
+            from core.dedup import deduplicate
+            inputs, duplicates = deduplicate(inputs, dedup)
+        record_duplicates(Path(task), inputs, duplicates)
+    else:
+        inputs, duplicates = skip_duplicates(Path(task), inputs)
+
+    args = []
+    for f in inputs:
+        state = states.get(str(Path(f).resolve()), {}).get("state")
+        restart = process == "pre" and needs_restart(state, Path(task), Path(f).stem)
+        args.append((task, process, str(f), ncores, cache, kwargs, warehouse, restart, cost_model, trace))
+
+    def _record(results):
+        # 每完成一个结构就写入日志，批量任务中断时已完成的部分不会丢失；
+        # 命中缓存的结构已有计算结果，直接标记为 finished 交由 post 阶段处理
+        for r in results:
+            if journal is not None and process in STATE_AFTER:
+                state = STATE_AFTER[process] if r["status"] == "ok" else FAILED
+                if state == PREPARED and r["cache_hit"]:
+                    state = FINISHED
+                journal.record(task, r["input"], state, r["error"])
+            yield r
+
+    # 重复结构不计算，只记录对应的已有结构
+    skipped = [{
+        "input": dup, "basename": Path(dup).stem, "status": "ok", "result": None,
+        "error": None, "cache_hit": False, "cost_plan": None, "duplicate_of": match,
+    } for dup, match in duplicates.items()]
+
+    templated = []
+    if bulk and process == "pre" and cache is None and cost_model is None and not trace:
+        from core.templates import write_inputs
+        try:
+            templated = list(_record(write_inputs(task, [a[2] for a in args if not a[7]], ncores, kwargs)))
+            args = [a for a in args if a[7]]
+        except RuntimeError as e:
+            print(f"模板化写入不可用，改用 Calculator 路径: {e}")
+
+    if workers == 1 or len(args) <= 1:
+        _init_worker()
+        return templated + list(_record(run_structure(*a) for a in args)) + skipped
+
+    # 数千个结构时按块分发，减少进程间通信开销
+    from concurrent.futures import ProcessPoolExecutor
+    chunksize = max(1, len(args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return templated + list(_record(pool.map(run_structure, *zip(*args), chunksize=chunksize))) + skipped
+
+
+def summarize(results: List[Dict[str, Any]]) -> None:
+    """打印批量任务的汇总信息"""
+    failed = [r for r in results if r["status"] != "ok"]
+    hits = sum(1 for r in results if r.get("cache_hit"))
+    restarted = sum(1 for r in results if r.get("restarted"))
+    duplicates = sum(1 for r in results if r.get("duplicate_of"))
+    print(f"批量任务完成: 共 {len(results)} 个结构，成功 {len(results) - len(failed)}，失败 {len(failed)}，"
+          f"命中缓存 {hits}，断点重启 {restarted}，重复结构 {duplicates}")
+    plans = [r["cost_plan"] for r in results if r.get("cost_plan")]
+    if plans:
+        core_hours = sum(p["ncores"] * p["predicted"] for p in plans) / 3600
+        print(f"耗时模型: 核数 {min(p['ncores'] for p in plans)}-{max(p['ncores'] for p in plans)}，"
+              f"预测总消耗 {core_hours:.1f} 核·小时")
+    for r in failed:
+        print(f"  {r['basename']}: {r['error']}")
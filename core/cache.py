@@ -0,0 +1,222 @@
+"""
+内容寻址的计算结果缓存 - 相同结构和关键词的计算不再重复运行
+
+缓存键由结构(元素、按精度取整的坐标、电荷、自旋多重度)、任务类型以及
+解析后的简单关键词/自定义参数计算得到，与核数无关。
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("ORCA_WORKFLOW_CACHE", Path.home() / ".cache" / "orca-workflow"))
+
+# 需要缓存的计算产物后缀，恢复时重命名为 <basename><后缀>
+CACHED_SUFFIXES = [
+    ".inp", ".out", ".gbw", ".json", ".property.json", ".property.txt",
+    ".xyz", "_trj.xyz", ".engrad", ".opt",
+]
+
+# 命中缓存的结构在工作目录中留下 <basename>.cache_hit，run 阶段据此跳过
+HIT_SUFFIX = ".cache_hit"
+
+
+def keyword_name(keyword: Any) -> str:
+    """返回 opi 简单关键词的稳定字符串表示"""
+    return str(getattr(keyword, "keyword", keyword)).lower()
+
+
+def structure_fingerprint(structure: Any, decimals: int = 4) -> str:
+    """
+    结构的规范化文本表示
+
+    参数
+    ----------
+    structure : Structure
+        opi 结构对象
+    decimals : int, optional
+        坐标取整的小数位数(Å)，默认为4
+    """
+    charge = getattr(structure, "charge", 0)
+    mult = getattr(structure, "multiplicity", 1)
+    return xyz_fingerprint(structure.to_xyz_block(), charge, mult, decimals)
+
+
+def xyz_fingerprint(xyz_block: str, charge: int = 0, mult: int = 1, decimals: int = 4) -> str:
+    """
+    XYZ文本(可带原子数/注释行)的规范化表示，见 structure_fingerprint
+    """
+    lines = xyz_block.strip().splitlines()
+    if lines and lines[0].strip().isdigit():
+        lines = lines[2:]
+
+    atoms = []
+    for line in lines:
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        # + 0.0 去掉取整后的 -0.0
+        coords = [round(float(x), decimals) + 0.0 for x in fields[1:4]]
+        atoms.append(f"{fields[0].capitalize()} " + " ".join(f"{x:.{decimals}f}" for x in coords))
+
+    return f"{charge} {mult}\n" + "\n".join(atoms)
+
+
+class ResultCache:
+    """
+    基于文件系统的结果缓存，按最近使用时间进行容量淘汰
+
+    目录结构: <root>/<key[:2]>/<key>/{result<后缀>..., meta.json}
+    """
+    def __init__(self, root: Optional[Path] = None, max_bytes: int = 20 * 1024**3, decimals: int = 4):
+        """
+        初始化缓存
+
+        参数
+        ----------
+        root : Optional[Path], optional
+            缓存根目录，默认为 $ORCA_WORKFLOW_CACHE 或 ~/.cache/orca-workflow
+        max_bytes : int, optional
+            缓存总容量上限(字节)，默认为20 GB
+        decimals : int, optional
+            结构坐标取整的小数位数，默认为4
+        """
+        self.root = Path(root) if root else DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        self.decimals = decimals
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def key(self, task_type: str, structure: Any, keywords: Iterable[Any],
+            extra: Iterable[str] = ()) -> str:
+        """
+        计算缓存键
+
+        参数
+        ----------
+        task_type : str
+            任务类型，如 sp / opt
+        structure : Structure
+            opi 结构对象
+        keywords : Iterable
+            简单关键词列表(顺序无关)
+        extra : Iterable[str], optional
+            其他影响结果的输入，如自定义参数
+        """
+        payload = {
+            "task": task_type,
+            "structure": structure_fingerprint(structure, self.decimals),
+            "keywords": sorted(keyword_name(k) for k in keywords),
+            "extra": sorted(str(e) for e in extra),
+        }
+        blob = json.dumps(payload, sort_keys=True).encode()
+        return hashlib.sha256(blob).hexdigest()
+
+    def _entry(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def lookup(self, key: str) -> Optional[Path]:
+        """查找缓存条目，命中时更新其最近使用时间"""
+        entry = self._entry(key)
+        meta = entry / "meta.json"
+        if not meta.exists():
+            return None
+        os.utime(meta)
+        return entry
+
+    def restore(self, key: str, working_dir: Path, basename: str) -> bool:
+        """
+        将缓存文件复制到工作目录，并写入命中标记 <basename>.cache_hit
+
+        不使用硬链接: 工作目录中的文件之后可能被重新运行的ORCA或 post 阶段覆盖，
+        复制得到的可写文件不会改动缓存条目。未命中时删除之前留下的命中标记。
+
+        返回
+        ----------
+        bool
+            是否命中缓存
+        """
+        marker = Path(working_dir) / f"{basename}{HIT_SUFFIX}"
+        entry = self.lookup(key)
+        if entry is None:
+            marker.unlink(missing_ok=True)
+            return False
+
+        working_dir.mkdir(parents=True, exist_ok=True)
+        for suffix in json.loads((entry / "meta.json").read_text())["suffixes"]:
+            src = entry / f"result{suffix}"
+            dst = working_dir / f"{basename}{suffix}"
+            if dst.exists() or dst.is_symlink():
+                dst.unlink()
+            shutil.copyfile(src, dst)
+        marker.write_text(key)
+        return True
+
+    def store(self, key: str, working_dir: Path, basename: str) -> None:
+        """
+        将工作目录中已完成的计算产物存入缓存
+
+        缓存文件设为只读，防止被意外修改。
+        """
+        entry = self._entry(key)
+        if (entry / "meta.json").exists():
+            return
+
+        tmp = entry.with_name(f".{key}.{os.getpid()}")
+        tmp.mkdir(parents=True, exist_ok=True)
+        suffixes = []
+        size = 0
+        for suffix in CACHED_SUFFIXES:
+            src = working_dir / f"{basename}{suffix}"
+            if not src.is_file():
+                continue
+            dst = tmp / f"result{suffix}"
+            shutil.copy2(src, dst)
+            dst.chmod(0o444)
+            suffixes.append(suffix)
+            size += dst.stat().st_size
+
+        meta = {"suffixes": suffixes, "size": size, "created": time.time()}
+        (tmp / "meta.json").write_text(json.dumps(meta))
+        try:
+            tmp.rename(entry)
+        except OSError:
+            # 其他进程已写入相同条目
+            shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def entries(self) -> List[Dict[str, Any]]:
+        """列出所有缓存条目及其大小和最近使用时间"""
+        entries = []
+        for meta in self.root.glob("*/*/meta.json"):
+            try:
+                info = json.loads(meta.read_text())
+                atime = meta.stat().st_mtime
+            except (OSError, ValueError):
+                continue
+            entries.append({"path": meta.parent, "size": info["size"], "atime": atime})
+        return entries
+
+    def evict(self) -> int:
+        """
+        按最近最少使用顺序淘汰条目，直到总容量不超过上限
+
+        返回
+        ----------
+        int
+            释放的字节数
+        """
+        entries = sorted(self.entries(), key=lambda e: e["atime"])
+        total = sum(e["size"] for e in entries)
+        freed = 0
+        for e in entries:
+            if total <= self.max_bytes:
+                break
+            for f in e["path"].iterdir():
+                f.chmod(0o644)
+            shutil.rmtree(e["path"], ignore_errors=True)
+            total -= e["size"]
+            freed += e["size"]
+        return freed
@@ -0,0 +1,333 @@
+"""
+计算耗时模型 - 根据历史计算的 Calculation_Info / Calculation_Timings 预测耗时并选择核数
+
+每个阶段(GTOINT / SCF / SCFGRAD / GSTEP / PROP)分别拟合
+
+    T(p) = s·构型数 + W / p
+    log W = c0 + c1·log(基函数数) + c2·log(原子数) + c3·log(电子数) + c4·log(构型数)
+
+其中 p 为核数，s 为每个构型不可并行的开销(网格搜索)，W 为可并行的工作量。
+体系越大 W 越大、并行效率越高。基函数数在计算前未知，由各元素的基函数贡献
+(同样从历史数据拟合)估算。每种任务(输入文件中的 SP / OPT / ENGRAD ...)单独拟合，
+历史中没有的任务类型使用全部样本拟合的模型。
+
+用法:
+    python -m core.cost_model fit demo/opt --model cost_model.json
+    python -m core.cost_model report demo/opt --model cost_model.json
+"""
+import re
+import sys
+import json
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.warehouse import TASK_KEYWORDS, parse_input
+
+PHASES = ["GTOINT", "SCF", "SCFGRAD", "GSTEP", "PROP"]
+CORE_CHOICES = [1, 2, 4, 8, 16, 32, 64]
+OVERHEAD_FRACTIONS = np.linspace(0.0, 0.9, 46)
+# 历史计算只有一种核数时串行开销不可辨识，保守地假设最快样本的耗时主要是串行开销，
+# 小体系不会因此被分配大量核数
+PRIOR_OVERHEAD_FRACTION = float(OVERHEAD_FRACTIONS[-1])
+# 全部样本拟合的模型，用于历史中没有的任务类型
+ANY_TASK = "*"
+# 系数先验: [常数, log 基函数数, log 原子数, log 电子数, log 构型数]
+PRIOR_COEF = np.array([0.0, 3.0, 0.0, 0.0, 1.0])
+
+ELEMENTS = [
+    "H", "He", "Li", "Be", "B", "C", "N", "O", "F", "Ne", "Na", "Mg", "Al", "Si", "P", "S",
+    "Cl", "Ar", "K", "Ca", "Sc", "Ti", "V", "Cr", "Mn", "Fe", "Co", "Ni", "Cu", "Zn", "Ga",
+    "Ge", "As", "Se", "Br", "Kr", "Rb", "Sr", "Y", "Zr", "Nb", "Mo", "Tc", "Ru", "Rh", "Pd",
+    "Ag", "Cd", "In", "Sn", "Sb", "Te", "I", "Xe",
+]
+ATOMIC_NUMBER = {el: z for z, el in enumerate(ELEMENTS, start=1)}
+
+# def2-TZVP 每个元素的基函数数初值，历史数据中出现的元素会被拟合值覆盖
+DEFAULT_BASIS_PER_ELEMENT = {"H": 6, "C": 31, "N": 31, "O": 31, "F": 31}
+DEFAULT_BASIS_HEAVY = 40
+
+NPROCS_OUT_RE = re.compile(r"Program running with\s+(\d+)\s+parallel MPI-processes")
+
+
+def element_counts(xyz_block: str) -> Dict[str, int]:
+    """统计XYZ文本中各元素的原子数"""
+    counts = {}
+    for line in xyz_block.strip().splitlines():
+        fields = line.split()
+        if len(fields) >= 4 and fields[0][0].isalpha():
+            el = fields[0].capitalize()
+            counts[el] = counts.get(el, 0) + 1
+    return counts
+
+
+def load_sample(working_dir: Path, basename: str) -> Optional[Dict[str, Any]]:
+    """
+    从一个已完成的计算目录读取训练样本，缺少计时或结构信息时返回None
+    """
+    prop_file = working_dir / f"{basename}.property.json"
+    inp_file = working_dir / f"{basename}.inp"
+    if not prop_file.exists() or not inp_file.exists():
+        return None
+    prop = json.loads(prop_file.read_text())
+    info = prop.get("Calculation_Info", {})
+    timings = prop.get("Calculation_Timings", {})
+    if not info or not timings:
+        return None
+
+    # 实际使用的核数以输出为准，其次为输入文件的 %pal 块
+    ncores = None
+    out_file = working_dir / f"{basename}.out"
+    if out_file.exists():
+        with open(out_file, errors="replace") as f:
+            match = NPROCS_OUT_RE.search(f.read(200_000))
+        if match:
+            ncores = int(match.group(1))
+    if ncores is None:
+        from core.scheduler import read_nprocs
+        ncores = read_nprocs(inp_file)
+
+    inp = parse_input(inp_file)
+    charge = info.get("Charge", inp["charge"] or 0)
+    return {
+        "name": str(working_dir / basename),
+        "task": next((k for k in inp["keywords"] if k in TASK_KEYWORDS), None),
+        "elements": element_counts(inp["xyz"] or ""),
+        "natoms": info["NumOfAtoms"],
+        "nbasis": info["NumOfBasisFuncts"],
+        "nelectrons": info.get("NumOfElectrons", 0) or 1,
+        "charge": charge,
+        "nsteps": max(1, len(prop.get("Geometries", []))),
+        "ncores": ncores,
+        "timings": {k: float(v) for k, v in timings.items()},
+    }
+
+
+def collect_samples(roots: Iterable[Path]) -> List[Dict[str, Any]]:
+    """递归收集结果目录中的所有训练样本"""
+    samples = []
+    for root in roots:
+        for prop_file in sorted(Path(root).rglob("*.property.json")):
+            sample = load_sample(prop_file.parent, prop_file.name[:-len(".property.json")])
+            if sample is not None:
+                samples.append(sample)
+    return samples
+
+
+class CostModel:
+    """
+    分任务、分阶段的耗时模型，可从历史计算拟合并保存为JSON
+    """
+    def __init__(self, tasks: Optional[Dict[str, Dict[str, Any]]] = None,
+                 basis_per_element: Optional[Dict[str, float]] = None):
+        """
+        参数
+        ----------
+        tasks : Optional[Dict[str, Dict]], optional
+            任务类型 -> {phases: 各阶段参数, median_steps: 构型数中位数}，
+            ANY_TASK 为全部样本拟合的模型
+        basis_per_element : Optional[Dict[str, float]], optional
+            各元素的基函数数
+        """
+        self.tasks = tasks or {}
+        self.basis_per_element = dict(DEFAULT_BASIS_PER_ELEMENT)
+        self.basis_per_element.update(basis_per_element or {})
+
+    @staticmethod
+    def _features(nbasis, natoms, nelectrons, nsteps) -> np.ndarray:
+        return np.column_stack([
+            np.ones_like(np.asarray(nbasis, dtype=float)),
+            np.log(nbasis), np.log(natoms), np.log(nelectrons), np.log(nsteps),
+        ])
+
+    @classmethod
+    def _fit_phases(cls, samples: Sequence[Dict[str, Any]], ridge: float) -> Dict[str, Any]:
+        """拟合一组样本各阶段的串行开销和可并行工作量"""
+        nbasis = np.array([s["nbasis"] for s in samples], dtype=float)
+        natoms = np.array([s["natoms"] for s in samples], dtype=float)
+        nelec = np.array([s["nelectrons"] for s in samples], dtype=float)
+        nsteps = np.array([s["nsteps"] for s in samples], dtype=float)
+        ncores = np.array([s["ncores"] for s in samples], dtype=float)
+        X = cls._features(nbasis, natoms, nelec, nsteps)
+        penalty = ridge * np.eye(X.shape[1])
+        penalty[0, 0] = 0.0
+
+        phases = {}
+        for phase in PHASES:
+            t = np.array([s["timings"].get(phase, 0.0) for s in samples])
+            mask = t > 0
+            if not mask.any():
+                continue
+            # 串行开销以最快样本的每构型耗时为尺度搜索；所有样本核数相同时不可辨识，取保守先验
+            per_step = (t[mask] / nsteps[mask]).min()
+            identified = len(set(ncores[mask])) > 1
+            fractions = OVERHEAD_FRACTIONS if identified else [PRIOR_OVERHEAD_FRACTION]
+            best = None
+            for r in fractions:
+                y = np.log(ncores[mask] * (t[mask] - r * per_step * nsteps[mask]))
+                A = X[mask]
+                coef = np.linalg.solve(A.T @ A + penalty, A.T @ y + penalty @ PRIOR_COEF)
+                sse = float(np.sum((A @ coef - y) ** 2))
+                if best is None or sse < best[0]:
+                    best = (sse, float(r * per_step), coef)
+            phases[phase] = {"overhead": best[1], "coef": best[2].tolist(), "identified": identified}
+        return {"phases": phases, "median_steps": float(np.median(nsteps))}
+
+    @classmethod
+    def fit(cls, samples: Sequence[Dict[str, Any]], ridge: float = 1e-3) -> "CostModel":
+        """
+        拟合模型；岭回归将系数收缩到 PRIOR_COEF(DFT 约 N^3 标度、与构型数成正比)，
+        样本很少时仍能给出合理的外推
+
+        参数
+        ----------
+        samples : Sequence[Dict]
+            load_sample / collect_samples 得到的样本
+        ridge : float, optional
+            岭回归系数，默认为1e-3
+        """
+        if not samples:
+            raise ValueError("没有可用于拟合的历史计算")
+
+        # 单点与优化的构型数和每构型耗时差别很大，按任务类型分别拟合
+        tasks = {ANY_TASK: cls._fit_phases(samples, ridge)}
+        for task in sorted({s["task"] for s in samples if s.get("task")}):
+            tasks[task] = cls._fit_phases([s for s in samples if s.get("task") == task], ridge)
+
+        # 各元素的基函数贡献: nbasis ≈ Σ n_el · b_el；以默认值为起点求最小范数修正，
+        # 样本不足以确定所有元素时保持默认值附近
+        nbasis = np.array([s["nbasis"] for s in samples], dtype=float)
+        elements = sorted({el for s in samples for el in s["elements"]})
+        basis = {}
+        if elements:
+            E = np.array([[s["elements"].get(el, 0) for el in elements] for s in samples], dtype=float)
+            b0 = np.array([DEFAULT_BASIS_PER_ELEMENT.get(el, DEFAULT_BASIS_HEAVY) for el in elements], dtype=float)
+            delta, *_ = np.linalg.lstsq(E, nbasis - E @ b0, rcond=None)
+            basis = {el: float(v) for el, v in zip(elements, b0 + delta) if v > 0}
+
+        return cls(tasks, basis)
+
+    def _task(self, task: Optional[str]) -> Dict[str, Any]:
+        """任务类型对应的模型，历史中没有时使用全部样本的模型"""
+        return self.tasks.get(task) or self.tasks[ANY_TASK]
+
+    def estimate_nbasis(self, elements: Dict[str, int]) -> float:
+        """根据元素组成估算基函数数"""
+        return sum(n * self.basis_per_element.get(el, DEFAULT_BASIS_HEAVY) for el, n in elements.items())
+
+    def predict(self, nbasis: float, natoms: int, nelectrons: int, ncores: int,
+                nsteps: Optional[float] = None, task: Optional[str] = None) -> Dict[str, float]:
+        """
+        预测各阶段及总的墙钟时间(秒)
+
+        nsteps 默认为该任务类型历史构型数的中位数。
+        """
+        model = self._task(task)
+        nsteps = nsteps or model["median_steps"]
+        x = self._features([nbasis], [natoms], [max(nelectrons, 1)], [nsteps])[0]
+        result = {}
+        for phase, params in model["phases"].items():
+            result[phase] = float(params["overhead"] * nsteps + np.exp(x @ np.array(params["coef"])) / ncores)
+        result["SUM"] = sum(result.values())
+        return result
+
+    def choose_ncores(self, nbasis: float, natoms: int, nelectrons: int, max_cores: int,
+                      min_efficiency: float = 0.6, nsteps: Optional[float] = None,
+                      task: Optional[str] = None) -> int:
+        """
+        选择并行效率不低于 min_efficiency 的最大核数
+
+        集群吞吐量取决于核·时消耗，效率过低的大核数作业会挤占其他作业。
+        """
+        t1 = self.predict(nbasis, natoms, nelectrons, 1, nsteps, task)["SUM"]
+        best = 1
+        for p in CORE_CHOICES:
+            if p > max_cores:
+                break
+            tp = self.predict(nbasis, natoms, nelectrons, p, nsteps, task)["SUM"]
+            if t1 / (p * tp) >= min_efficiency:
+                best = p
+        return best
+
+    def plan(self, xyz_block: str, charge: int = 0, max_cores: int = 32,
+             min_efficiency: float = 0.6, task: Optional[str] = None) -> Dict[str, Any]:
+        """
+        为一个结构给出核数、每核内存(%maxcore, MB)和预测耗时
+
+        参数
+        ----------
+        xyz_block : str
+            结构的XYZ文本
+        charge : int, optional
+            分子电荷
+        max_cores : int, optional
+            核数上限
+        task : Optional[str], optional
+            任务关键词(sp / opt / engrad ...)，默认使用全部样本的模型
+        """
+        elements = element_counts(xyz_block)
+        natoms = sum(elements.values())
+        nelectrons = sum(ATOMIC_NUMBER.get(el, 0) * n for el, n in elements.items()) - charge
+        nbasis = self.estimate_nbasis(elements)
+        ncores = self.choose_ncores(nbasis, natoms, nelectrons, max_cores, min_efficiency, task=task)
+        # 每核内存按约 10 个 N^2 双精度矩阵估算，限制在 [1000, 8000] MB
+        maxcore = int(min(8000, max(1000, 10 * nbasis ** 2 * 8 / 1024**2)))
+        return {
+            "ncores": ncores,
+            "maxcore": maxcore,
+            "nbasis": nbasis,
+            "predicted": self.predict(nbasis, natoms, nelectrons, ncores, task=task)["SUM"],
+        }
+
+    def save(self, path: Path) -> None:
+        data = {
+            "tasks": self.tasks,
+            "basis_per_element": self.basis_per_element,
+        }
+        Path(path).write_text(json.dumps(data, indent=2))
+
+    @classmethod
+    def load(cls, path: Path) -> "CostModel":
+        data = json.loads(Path(path).read_text())
+        return cls(data["tasks"], data["basis_per_element"])
+
+
+def report(model: CostModel, samples: Sequence[Dict[str, Any]]) -> None:
+    """打印预测耗时与实际耗时的对比"""
+    print(f"{'计算':<40}{'核数':>6}{'基函数':>8}{'预测(s)':>12}{'实际(s)':>12}{'比值':>8}")
+    ratios = []
+    for s in samples:
+        predicted = model.predict(s["nbasis"], s["natoms"], s["nelectrons"], s["ncores"], s["nsteps"],
+                                  s.get("task"))["SUM"]
+        actual = sum(s["timings"].get(p, 0.0) for p in PHASES)
+        ratio = predicted / actual if actual else float("nan")
+        ratios.append(ratio)
+        print(f"{Path(s['name']).name:<40}{s['ncores']:>6}{s['nbasis']:>8}{predicted:>12.2f}{actual:>12.2f}{ratio:>8.2f}")
+    if ratios:
+        log_err = np.abs(np.log(np.array(ratios)))
+        print(f"共 {len(ratios)} 个计算，预测/实际 几何平均误差 {np.exp(np.mean(log_err)):.2f} 倍")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ORCA 计算耗时模型")
+    parser.add_argument("command", choices=["fit", "report"], help="fit (从历史结果拟合), report (预测与实际对比)")
+    parser.add_argument("roots", nargs="+", help="历史结果目录")
+    parser.add_argument("--model", default="cost_model.json", help="模型文件路径，默认为 cost_model.json")
+    args = parser.parse_args(argv)
+
+    samples = collect_samples(Path(r) for r in args.roots)
+    if args.command == "fit":
+        model = CostModel.fit(samples)
+        model.save(Path(args.model))
+        print(f"已从 {len(samples)} 个计算拟合模型: {args.model}")
+    else:
+        report(CostModel.load(Path(args.model)), samples)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+工作流守护进程 - 常驻进程预先导入 opi 和各任务模块，通过 Unix 套接字接收
+pre/post 请求，避免每次调用都重新启动解释器和导入依赖
+
+请求在预热的进程池中执行(每个进程切换到客户端的工作目录)，多个请求并发处理。
+客户端见项目根目录的 client.py，参数与 main.py 相同。客户端的ORCA相关环境变量
+(client.workflow_env)与守护进程不同时拒绝执行，客户端改为直接运行 main.py，
+避免使用与直接调用不同的ORCA。
+
+用法:
+    python -m core.daemon start -j 8 &
+    python client.py -t opt -p post -i test_water.xyz
+    python -m core.daemon status
+    python -m core.daemon stop
+"""
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import importlib
+import threading
+import socketserver
+import contextlib
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from client import workflow_env
+
+DEFAULT_SOCKET = Path(os.environ.get(
+    "ORCA_WORKFLOW_SOCKET", Path.home() / ".cache" / "orca-workflow" / "daemon.sock"
+))
+
+# 守护进程只处理轻量的 pre/post 阶段，run/submit/pipeline 仍由 main.py 直接执行
+ALLOWED_PROCESSES = {"pre", "post"}
+TASK_MODULES = ["task.sp", "task.opt", "task.tddft", "task.freq"]
+# main.py 按需导入的 core 模块，守护进程中预先导入
+CORE_MODULES = ["core.task_manager", "core.batch", "core.journal", "core.extract"]
+
+
+def _preload() -> None:
+    """导入 main、pre/post 用到的 core 模块及所有任务模块；缺少可选依赖的模块跳过"""
+    importlib.import_module("main")
+    for name in CORE_MODULES:
+        importlib.import_module(name)
+    for name in TASK_MODULES:
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"预加载 {name} 失败: {e}")
+
+
+def handle(cwd: str, argv: List[str]) -> Dict[str, Any]:
+    """
+    在进程池中执行一次 main.py 调用
+
+    参数
+    ----------
+    cwd : str
+        客户端的工作目录
+    argv : List[str]
+        main.py 的命令行参数
+
+    返回
+    ----------
+    Dict[str, Any]
+        code (退出码) / output (标准输出和标准错误)
+    """
+    import main
+
+    buf = io.StringIO()
+    code = 0
+    with contextlib.redirect_stdout(buf), contextlib.redirect_stderr(buf):
+        try:
+            os.chdir(cwd)
+            args = main.parse_args(argv)
+            if args.process not in ALLOWED_PROCESSES:
+                raise ValueError(f"守护进程只处理 {'/'.join(sorted(ALLOWED_PROCESSES))} 阶段")
+            main.main(args)
+        except SystemExit as e:
+            if isinstance(e.code, str):
+                print(e.code)
+            code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+        except Exception as e:
+            print(f"任务执行失败: {type(e).__name__}: {e}")
+            code = 1
+    return {"code": code, "output": buf.getvalue()}
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        request = json.loads(self.rfile.readline())
+        server = self.server
+        command = request.get("command", "run")
+        if command == "run":
+            mismatched = server.env_mismatch(request.get("env"))
+            if mismatched:
+                response = {"code": 0, "fallback": True,
+                            "output": f"环境变量与守护进程不同({', '.join(mismatched)})，改为直接执行 main.py\n"}
+            else:
+                response = server.pool.submit(handle, request["cwd"], request["argv"]).result()
+                with server.lock:
+                    server.served += 1
+        elif command == "status":
+            response = {"code": 0, "output": f"pid {os.getpid()}，进程池 {server.workers}，"
+                                              f"已处理 {server.served} 个请求，运行 {time.time() - server.started:.0f} s\n"}
+        elif command == "shutdown":
+            response = {"code": 0, "output": "守护进程已停止\n"}
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        else:
+            response = {"code": 2, "output": f"未知命令: {command}\n"}
+        self.wfile.write((json.dumps(response, ensure_ascii=False) + "\n").encode())
+
+
+class WorkflowDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Unix 套接字服务: 每个连接一个线程，实际计算在预热的进程池中执行
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: Path = DEFAULT_SOCKET, workers: int = None):
+        """
+        参数
+        ----------
+        socket_path : Path, optional
+            套接字路径，默认为 $ORCA_WORKFLOW_SOCKET 或 ~/.cache/orca-workflow/daemon.sock
+        workers : int, optional
+            进程池大小，默认为CPU核数
+        """
+        self.socket_path = Path(socket_path)
+        self.socket_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.socket_path.exists():
+            if _request(self.socket_path, {"command": "status"}) is not None:
+                raise RuntimeError(f"守护进程已在运行: {self.socket_path}")
+            # 上次异常退出留下的套接字文件
+            self.socket_path.unlink()
+
+        # 先在主进程导入，fork 出的工作进程直接继承已导入的模块
+        _preload()
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_preload)
+        self.lock = threading.Lock()
+        self.served = 0
+        self.started = time.time()
+        self.env = workflow_env(os.environ)
+        super().__init__(str(self.socket_path), _Handler)
+
+    def env_mismatch(self, env: Dict[str, str] = None) -> List[str]:
+        """与守护进程取值不同的环境变量名；请求未携带环境时不检查"""
+        if env is None:
+            return []
+        return sorted(k for k in set(env) | set(self.env) if env.get(k) != self.env.get(k))
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        with contextlib.suppress(FileNotFoundError):
+            self.socket_path.unlink()
+
+
+def _request(socket_path: Path, request: Dict[str, Any]) -> Dict[str, Any]:
+    """发送一个请求并等待响应，无法连接时返回None"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.connect(str(socket_path))
+            sock.sendall((json.dumps(request) + "\n").encode())
+            return json.loads(sock.makefile().readline())
+    except (OSError, ValueError):
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ORCA Workflow 守护进程")
+    parser.add_argument("command", choices=["start", "status", "stop"], help="start (启动), status (状态), stop (停止)")
+    parser.add_argument("--socket", default=str(DEFAULT_SOCKET), help="Unix 套接字路径")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程池大小，默认为CPU核数")
+    args = parser.parse_args(argv)
+
+    if args.command == "start":
+        with WorkflowDaemon(args.socket, args.workers) as server:
+            print(f"守护进程已启动: {args.socket} (pid {os.getpid()})")
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        return
+
+    response = _request(Path(args.socket), {"command": "status" if args.command == "status" else "shutdown"})
+    if response is None:
+        sys.exit(f"守护进程未运行: {args.socket}")
+    print(response["output"], end="")
+
+
+if __name__ == "__main__":
+    main()
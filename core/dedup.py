@@ -0,0 +1,247 @@
+"""
+结构去重 - 在 pre 阶段之前剔除与已排队或已计算结构几乎相同的结构
+
+每个结构先规范化(平移到质心、旋转到主轴系)，再按 (化学式, 量化后的主轴方均根
+半径) 放入哈希桶。两个结构的RMSD不小于其主轴半径之差(奇异值的 Weyl 不等式)，
+因此桶宽取RMSD阈值时只需检查相邻的 3^3 个桶，无需两两比较全部结构。
+桶内候选先用各元素原子到质心距离的排序分布(同样是RMSD的下界)筛除，
+剩下的在考虑主轴方向符号、同种元素原子重排和 Kabsch 旋转后计算RMSD。
+
+用法:
+    python -m core.dedup conformers/ --threshold 0.1 --index dedup_index.jsonl
+"""
+import sys
+import json
+import argparse
+import itertools
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+try:
+    from scipy.optimize import linear_sum_assignment
+except ImportError:
+    linear_sum_assignment = None
+
+# 主轴方向的四种右手取向(行列式为 +1 的符号组合)
+AXIS_SIGNS = np.array([s for s in itertools.product((1, -1), repeat=3) if np.prod(s) == 1], dtype=float)
+
+
+def read_xyz(xyz_file: Path) -> Tuple[List[str], np.ndarray]:
+    """读取单帧XYZ文件，返回元素列表和坐标 (Å)"""
+    lines = Path(xyz_file).read_text().splitlines()
+    natoms = int(lines[0].split()[0])
+    fields = [line.split() for line in lines[2:2 + natoms]]
+    return [f[0].capitalize() for f in fields], np.array([f[1:4] for f in fields], dtype=float)
+
+
+def canonicalize(elements: Sequence[str], coords: np.ndarray) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    规范化结构: 按元素排序原子，平移到质心，旋转到主轴系
+
+    返回
+    ----------
+    Tuple[List[str], np.ndarray, np.ndarray]
+        排序后的元素、主轴系坐标，以及从大到小排列的主轴方均根半径 (Å)
+    """
+    order = np.argsort(elements, kind="stable")
+    elements = [elements[i] for i in order]
+    coords = np.asarray(coords, dtype=float)[order]
+    centered = coords - coords.mean(axis=0)
+    _, s, vt = np.linalg.svd(centered, full_matrices=False)
+    if np.linalg.det(vt) < 0:
+        vt[-1] *= -1
+    radii = np.zeros(3)
+    radii[:len(s)] = s / np.sqrt(len(coords))
+    return elements, centered @ vt.T, radii
+
+
+def _assign(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """同种元素原子之间的最优(或贪心)一一对应，返回 b 的重排索引"""
+    cost = ((a[:, None, :] - b[None, :, :]) ** 2).sum(axis=2)
+    if linear_sum_assignment is not None:
+        return linear_sum_assignment(cost)[1]
+    perm = np.empty(len(a), dtype=int)
+    for _ in range(len(a)):
+        i, j = np.unravel_index(np.argmin(cost), cost.shape)
+        perm[i] = j
+        cost[i, :] = np.inf
+        cost[:, j] = np.inf
+    return perm
+
+
+def _match(groups: Dict[str, slice], a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """将 b 的原子按同种元素重新配对到 a 的顺序"""
+    matched = b.copy()
+    for group in groups.values():
+        if group.stop - group.start > 1:
+            matched[group] = b[group][_assign(a[group], b[group])]
+    return matched
+
+
+def kabsch(p: np.ndarray, q: np.ndarray) -> np.ndarray:
+    """使 p @ R 与 q (均已居中) 最接近的旋转矩阵 R"""
+    u, _, vt = np.linalg.svd(p.T @ q)
+    d = np.sign(np.linalg.det(u @ vt))
+    return u @ np.diag([1.0, 1.0, d]) @ vt
+
+
+def aligned_rmsd(groups: Dict[str, slice], a: np.ndarray, b: np.ndarray, iterations: int = 3) -> float:
+    """
+    两个已规范化结构之间的RMSD
+
+    遍历主轴方向的四种取向作为初始叠合，再交替进行同种元素原子重新配对和
+    Kabsch 旋转，处理主轴近简并(方向不稳定)的结构
+    """
+    best = np.inf
+    for signs in AXIS_SIGNS:
+        current = b * signs
+        for _ in range(iterations):
+            matched = _match(groups, a, current)
+            sq = ((a - matched) ** 2).sum()
+            best = min(best, sq)
+            current = current @ kabsch(matched, a)
+        best = min(best, ((a - _match(groups, a, current)) ** 2).sum())
+    return float(np.sqrt(best / len(a)))
+
+
+def radial_profile(groups: Dict[str, slice], coords: np.ndarray) -> np.ndarray:
+    """每种元素的原子到质心距离(排序后)，与取向和原子顺序无关"""
+    r = np.linalg.norm(coords, axis=1)
+    return np.concatenate([np.sort(r[group]) for group in groups.values()])
+
+
+def element_groups(elements: Sequence[str]) -> Dict[str, slice]:
+    """已按元素排序的原子列表中每种元素所占的切片"""
+    groups = {}
+    for i, el in enumerate(elements):
+        start = groups.get(el, slice(i, i)).start
+        groups[el] = slice(start, i + 1)
+    return groups
+
+
+class DedupIndex:
+    """
+    规范化结构的哈希索引
+    """
+    def __init__(self, threshold: float = 0.1):
+        """
+        参数
+        ----------
+        threshold : float, optional
+            视为相同结构的RMSD阈值 (Å)，默认为0.1
+        """
+        self.threshold = threshold
+        self.buckets = {}
+        self.entries = []
+
+    def _bin(self, radii: np.ndarray) -> Tuple[int, ...]:
+        return tuple(np.floor(radii / self.threshold).astype(int))
+
+    def find(self, elements: Sequence[str], coords: np.ndarray) -> Optional[str]:
+        """返回与该结构RMSD在阈值内的已有结构名称，没有时返回None"""
+        elements, canonical, radii = canonicalize(elements, coords)
+        return self._find(elements, canonical, radii)
+
+    def _find(self, elements, canonical, radii) -> Optional[str]:
+        formula = " ".join(elements)
+        center = self._bin(radii)
+        groups = element_groups(elements)
+        profile = radial_profile(groups, canonical)
+        for offset in itertools.product((-1, 0, 1), repeat=3):
+            key = (formula, tuple(c + o for c, o in zip(center, offset)))
+            for idx in self.buckets.get(key, ()):
+                name, _, other, other_radii, other_profile = self.entries[idx]
+                # 主轴半径之差和径向分布之差都是RMSD的下界，先用它们排除
+                if np.abs(other_radii - radii).max() > self.threshold:
+                    continue
+                if np.sqrt(((other_profile - profile) ** 2).mean()) > self.threshold:
+                    continue
+                if aligned_rmsd(groups, canonical, other) <= self.threshold:
+                    return name
+        return None
+
+    def add(self, name: str, elements: Sequence[str], coords: np.ndarray) -> Optional[str]:
+        """
+        查找重复结构，没有重复时将该结构加入索引
+
+        返回
+        ----------
+        Optional[str]
+            重复时返回已有结构的名称，否则返回None
+        """
+        elements, canonical, radii = canonicalize(elements, coords)
+        match = self._find(elements, canonical, radii)
+        if match is None:
+            self._insert(name, elements, canonical, radii)
+        return match
+
+    def _insert(self, name, elements, canonical, radii) -> None:
+        key = (" ".join(elements), self._bin(radii))
+        self.buckets.setdefault(key, []).append(len(self.entries))
+        profile = radial_profile(element_groups(elements), canonical)
+        self.entries.append((name, elements, canonical, radii, profile))
+
+    def save(self, path: Path) -> None:
+        """以 JSON Lines 保存索引中的规范化结构"""
+        with open(path, "w") as f:
+            for name, elements, canonical, *_ in self.entries:
+                f.write(json.dumps({"name": name, "elements": elements,
+                                    "coords": np.round(canonical, 6).tolist()}) + "\n")
+
+    @classmethod
+    def load(cls, path: Path, threshold: float = 0.1) -> "DedupIndex":
+        """读取 save 保存的索引；文件不存在时返回空索引"""
+        index = cls(threshold)
+        if Path(path).exists():
+            with open(path) as f:
+                for line in f:
+                    entry = json.loads(line)
+                    index._insert(entry["name"], *canonicalize(entry["elements"], np.array(entry["coords"])))
+        return index
+
+
+def deduplicate(inputs: Iterable[Path], index: DedupIndex) -> Tuple[List[Path], Dict[str, str]]:
+    """
+    过滤重复结构
+
+    返回
+    ----------
+    Tuple[List[Path], Dict[str, str]]
+        保留的结构文件，以及 重复结构文件 -> 已有结构名称 的映射
+    """
+    unique, duplicates = [], {}
+    for f in inputs:
+        match = index.add(str(f), *read_xyz(f))
+        # 索引中已有的同一文件(重新运行 pre)不算重复
+        if match is None or match == str(f):
+            unique.append(Path(f))
+        else:
+            duplicates[str(f)] = match
+    return unique, duplicates
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="结构去重")
+    parser.add_argument("input", help="目录、通配符或多帧XYZ文件")
+    parser.add_argument("--threshold", type=float, default=0.1, help="RMSD阈值 (Å)，默认为0.1")
+    parser.add_argument("--index", default=None, help="持久化索引文件，包含之前已计算的结构")
+    args = parser.parse_args(argv)
+
+    from core.batch import collect_inputs
+    index = DedupIndex.load(args.index, args.threshold) if args.index else DedupIndex(args.threshold)
+    inputs = collect_inputs(args.input)
+    unique, duplicates = deduplicate(inputs, index)
+    for dup, match in duplicates.items():
+        print(f"{dup} -> {match}")
+    print(f"共 {len(inputs)} 个结构，保留 {len(unique)}，重复 {len(duplicates)}")
+    if args.index:
+        index.save(args.index)
+
+
+if __name__ == "__main__":
+    main()
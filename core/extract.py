@@ -0,0 +1,229 @@
+"""
+轻量级结果提取 - 通过内存映射扫描 .property.json / .out，只读取所需字段
+
+用于 post 阶段最常见的查询(最终能量、收敛标志、Mulliken电荷)，避免将完整JSON
+转换并载入内存；结果按 (文件, 修改时间, 大小) 缓存，文件不变时不再重复扫描。
+"""
+import re
+import json
+import mmap
+from pathlib import Path
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Optional
+
+FIELDS = (
+    "terminated", "scf_converged", "opt_converged",
+    "final_energy", "energies", "mulliken_charges",
+)
+
+FINAL_ENERGY_RE = re.compile(rb"FINAL SINGLE POINT ENERGY\s+(-?\d+\.\d+)")
+PROP_FINAL_ENERGY_RE = re.compile(rb'"FinalEnergy"\s*:\s*(-?[\d.eE+-]+)')
+PROP_CONVERGED_RE = re.compile(rb'"Converged"\s*:\s*(true|false)')
+
+
+def _map(path: Path) -> Optional[mmap.mmap]:
+    """以只读方式内存映射文件，文件不存在或为空时返回None"""
+    try:
+        with open(path, "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _json_value_after(buf: mmap.mmap, key: bytes, start: int = 0) -> Any:
+    """解析 buf 中 start 之后第一个 "key": 后面的JSON值"""
+    pos = buf.find(b'"' + key + b'"', start)
+    if pos < 0:
+        return None
+    pos = buf.find(b":", pos) + 1
+    # 数组/对象的结束位置未知，逐步扩大窗口直到能完整解码
+    window = 4096
+    decoder = json.JSONDecoder()
+    while True:
+        text = buf[pos:pos + window].decode(errors="replace").lstrip()
+        try:
+            return decoder.raw_decode(text)[0]
+        except ValueError:
+            if pos + window >= len(buf):
+                return None
+            window *= 4
+
+
+def read_sections(path: Path, keys) -> Dict[str, Any]:
+    """
+    读取 .property.json 中的若干顶层字段(如 Calculation_Info / Calculation_Timings)，
+    不解析 "Geometries" 数组
+
+    参数
+    ----------
+    path : Path
+        .property.json 文件
+    keys : Iterable[str]
+        字段名
+
+    返回
+    ----------
+    Dict[str, Any]
+        字段名 -> 值，文件或字段不存在时为None
+    """
+    buf = _map(path)
+    if buf is None:
+        return {key: None for key in keys}
+    with buf:
+        return {key: _json_value_after(buf, key.encode()) for key in keys}
+
+
+def iter_geometries(path: Path, window: int = 1 << 16) -> Iterator[Dict[str, Any]]:
+    """
+    逐个解析 .property.json 中 "Geometries" 数组的元素(每个优化步一个)
+
+    不载入完整JSON，内存占用与单个构型的大小相当: 已解析部分的映射页随即释放
+    (MADV_DONTNEED)，不随优化步数增长；提前停止迭代时释放内存映射。
+
+    参数
+    ----------
+    path : Path
+        .property.json 文件
+    window : int, optional
+        初始解码窗口(字节)，构型较大时自动扩大
+    """
+    buf = _map(path)
+    if buf is None:
+        return
+    decoder = json.JSONDecoder()
+    with buf:
+        pos = buf.find(b'"Geometries"')
+        if pos < 0:
+            return
+        pos = buf.find(b"[", pos) + 1
+        size = len(buf)
+        released = 0
+        while True:
+            # 跳过元素之间的空白和逗号
+            while pos < size and buf[pos] in b" \t\r\n,":
+                pos += 1
+            if pos >= size or buf[pos] == ord("]"):
+                return
+            # latin-1 按字节一一解码，raw_decode 返回的偏移即字节数
+            while True:
+                try:
+                    geometry, end = decoder.raw_decode(buf[pos:pos + window].decode("latin-1"))
+                    break
+                except ValueError:
+                    if pos + window >= size:
+                        return
+                    window *= 2
+            pos += end
+            done = pos // mmap.PAGESIZE * mmap.PAGESIZE
+            if done > released and hasattr(mmap, "MADV_DONTNEED"):
+                buf.madvise(mmap.MADV_DONTNEED, released, done - released)
+                released = done
+            yield geometry
+
+
+def _scan_out(path: Path) -> Dict[str, Any]:
+    buf = _map(path)
+    if buf is None:
+        return {}
+    with buf:
+        tail = buf[max(0, len(buf) - 8192):]
+        last_scf = max(buf.rfind(b"SCF CONVERGED AFTER"), buf.rfind(b"SCF NOT CONVERGED"))
+        return {
+            "terminated": b"ORCA TERMINATED NORMALLY" in tail,
+            "scf_converged": last_scf >= 0 and buf[last_scf:last_scf + 7] == b"SCF CON",
+            "opt_converged": buf.find(b"THE OPTIMIZATION HAS CONVERGED") >= 0,
+            "energies": [float(e) for e in FINAL_ENERGY_RE.findall(buf)],
+        }
+
+
+def _scan_property(path: Path) -> Dict[str, Any]:
+    buf = _map(path)
+    if buf is None:
+        return {}
+    with buf:
+        result = {
+            "energies": [float(e) for e in PROP_FINAL_ENERGY_RE.findall(buf)],
+            "status": _json_value_after(buf, b"Status"),
+        }
+        converged = PROP_CONVERGED_RE.findall(buf)
+        if converged:
+            result["scf_converged"] = converged[-1] == b"true"
+
+        # 最后一个构型的Mulliken电荷(使用 NOPOP 时不存在)
+        last = buf.rfind(b'"Mulliken_Population_Analysis"')
+        if last >= 0:
+            charges = _json_value_after(buf, b"AtomicCharges", last)
+            if charges:
+                result["mulliken_charges"] = [c[0] if isinstance(c, list) else c for c in charges]
+        return result
+
+
+@lru_cache(maxsize=4096)
+def _extract_cached(working_dir: str, basename: str, signature: tuple) -> Dict[str, Any]:
+    base = Path(working_dir) / basename
+    out = _scan_out(base.with_name(f"{basename}.out"))
+    prop = _scan_property(base.with_name(f"{basename}.property.json"))
+
+    energies = prop.get("energies") or out.get("energies") or []
+    return {
+        "terminated": out.get("terminated", prop.get("status") == "NORMAL TERMINATION"),
+        "scf_converged": prop.get("scf_converged", out.get("scf_converged", False)),
+        "opt_converged": out.get("opt_converged", False),
+        "final_energy": energies[-1] if energies else None,
+        "energies": energies,
+        "mulliken_charges": prop.get("mulliken_charges"),
+    }
+
+
+def _signature(working_dir: Path, basename: str) -> tuple:
+    sig = []
+    for suffix in (".out", ".property.json"):
+        try:
+            st = (working_dir / f"{basename}{suffix}").stat()
+            sig.append((st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            sig.append(None)
+    return tuple(sig)
+
+
+def extract(working_dir: Path, basename: str, fields=FIELDS) -> Dict[str, Any]:
+    """
+    从计算输出中提取常用字段，不调用 opi 的完整解析
+
+    参数
+    ----------
+    working_dir : Path
+        计算所在目录
+    basename : str
+        计算的基本名称
+    fields : Iterable[str], optional
+        需要的字段，默认见 FIELDS
+
+    返回
+    ----------
+    Dict[str, Any]
+        terminated / scf_converged / opt_converged / final_energy /
+        energies(每个构型的最终单点能) / mulliken_charges(最后构型，可能为None)
+    """
+    working_dir = Path(working_dir)
+    result = _extract_cached(str(working_dir.resolve()), basename, _signature(working_dir, basename))
+    return {k: result[k] for k in fields}
+
+
+def read_last_frame(trj_file: Path) -> Optional[str]:
+    """读取 _trj.xyz 的最后一帧(XYZ文本)，只扫描文件末尾"""
+    buf = _map(trj_file)
+    if buf is None:
+        return None
+    with buf:
+        # 每帧以原子数行开头；从末尾向前找到该行，找不到时扩大读取窗口
+        window = 1 << 16
+        while True:
+            lines = buf[max(0, len(buf) - window):].decode(errors="replace").rstrip().splitlines()
+            for i in range(len(lines) - 1, -1, -1):
+                fields = lines[i].split()
+                if len(fields) == 1 and fields[0].isdigit() and int(fields[0]) == len(lines) - i - 2:
+                    return "\n".join(lines[i:]) + "\n"
+            if window >= len(buf):
+                return None
+            window *= 4
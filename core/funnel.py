@@ -0,0 +1,273 @@
+"""
+多层级筛选漏斗 - 先用廉价方法计算全部结构，按能量排序后只将前 k 个或能量窗口内的
+结构送入下一层级，昂贵的 DFT 只用于最后剩下的候选结构
+
+每个层级是一个 sp 或 opt 任务，在 funnel/<序号>_<层级名>/ 目录下完成 pre → ORCA → post；
+层级的关键词(如 XTB2、R2SCAN-3C、B97-3C)替换任务默认的方法、基组和色散校正，
+opt 层级的优化结构作为下一层级的输入。
+
+层级写法为 "任务:关键词:规则"，规则以逗号分隔:
+    top=K       只保留能量最低的 K 个结构
+    window=X    只保留相对能量不超过 X kcal/mol 的结构
+    ncores=N    该层级每个计算的核数，默认为 -n
+关键词为空时使用任务的默认关键词；最后一个层级通常不带规则。
+
+用法:
+    python main.py -t sp -p funnel -i conformers/ --levels "opt:XTB2:window=6" "sp:R2SCAN-3C:top=10" "sp"
+"""
+import sys
+import json
+import time
+import importlib
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.extract import extract, read_last_frame
+from core.scheduler import LocalScheduler
+
+HARTREE_TO_KCAL = 627.509474
+
+# 可作为筛选层级的任务类型(每个结构得到一个可比较的能量)
+FUNNEL_TASKS = ("sp", "opt")
+
+# 未指定 --levels 时: GFN2-xTB 优化 → r2SCAN-3c 单点 → -t 指定任务的默认 DFT 层级
+DEFAULT_LEVELS = ["opt:XTB2:window=6", "sp:R2SCAN-3C:top=10"]
+
+
+def parse_level(spec: str) -> Dict[str, Any]:
+    """
+    解析层级描述 "任务:关键词:规则"
+
+    参数
+    ----------
+    spec : str
+        例如 "opt:XTB2:window=6"、"sp:R2SCAN-3C:top=10,ncores=4" 或 "sp"
+
+    返回
+    ----------
+    Dict[str, Any]
+        name / task / keywords / top / window / ncores
+    """
+    task, _, rest = spec.strip().partition(":")
+    keywords, _, rules = rest.partition(":")
+    if task not in FUNNEL_TASKS:
+        raise ValueError(f"筛选层级只支持 {'/'.join(FUNNEL_TASKS)} 任务: {spec}")
+
+    level = {"task": task, "keywords": keywords.split(), "top": None, "window": None, "ncores": None}
+    for rule in filter(None, (r.strip() for r in rules.split(","))):
+        key, _, value = rule.partition("=")
+        if key not in ("top", "window", "ncores"):
+            raise ValueError(f"未知的筛选规则 '{rule}': {spec}")
+        try:
+            level[key] = float(value) if key == "window" else int(value)
+        except ValueError:
+            raise ValueError(f"筛选规则 '{rule}' 的值无效: {spec}") from None
+    level_settings(level["keywords"])
+    level["name"] = f"{task}_{'-'.join(level['keywords']).lower() or 'default'}"
+    return level
+
+
+def level_settings(keywords: Sequence[str]) -> Dict[str, str]:
+    """
+    将层级关键词映射为 OPIWorkflow.set_level 的参数
+
+    基组和色散校正关键词按 opi 的关键词组识别，其余关键词作为方法；层级未给出的
+    基组和色散校正为 "none"(如 XTB2、R2SCAN-3C 等复合方法)。keywords 为空时返回
+    空字典，即使用任务的默认关键词。
+
+    返回
+    ----------
+    Dict[str, str]
+        method / basis_set / dispersion
+    """
+    if not keywords:
+        return {}
+
+    from opi.input.simple_keywords import BasisSet, DispersionCorrection
+
+    def names(group) -> set:
+        return {k.keyword.lower() for k in vars(group).values() if hasattr(k, "keyword")}
+
+    basis_sets, dispersions = names(BasisSet), names(DispersionCorrection)
+    settings = {"method": [], "basis_set": [], "dispersion": []}
+    for k in keywords:
+        key = "basis_set" if k.lower() in basis_sets else "dispersion" if k.lower() in dispersions else "method"
+        settings[key].append(k)
+    if not settings["method"]:
+        raise ValueError(f"筛选层级缺少方法关键词: {' '.join(keywords)}")
+    return {key: " ".join(values) or "none" for key, values in settings.items()}
+
+
+class Funnel:
+    """
+    对一组结构逐层级计算和筛选
+    """
+    def __init__(self, inputs: Sequence[Path], levels: Sequence[Dict[str, Any]], ncores: int = 1,
+                 total_cores: int = 1, orca_cmd: Optional[str] = None, staging: Optional[Any] = None,
+                 cache: Optional[Any] = None, root: Path = Path("funnel")):
+        """
+        参数
+        ----------
+        inputs : Sequence[Path]
+            候选结构(XYZ)
+        levels : Sequence[Dict[str, Any]]
+            由 parse_level 得到的层级，从廉价到昂贵排列
+        ncores : int, optional
+            每个计算默认使用的核数
+        total_cores : int, optional
+            每个层级并发运行ORCA的总核数预算
+        orca_cmd : Optional[str], optional
+            ORCA可执行文件，默认见 core.scheduler.find_orca
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)
+        cache : Optional[ResultCache], optional
+            结果缓存，命中的计算不再运行
+        root : Path, optional
+            漏斗目录，默认为 funnel/
+        """
+        self.inputs = [Path(f) for f in inputs]
+        self.levels = list(levels)
+        self.ncores = ncores
+        self.scheduler = LocalScheduler(total_cores, orca_cmd, staging=staging)
+        self.cache = cache
+        self.root = Path(root)
+        self.level_records = []
+        self.structures = {f.stem: {"input": str(f), "levels": {}} for f in self.inputs}
+
+    def run_level(self, index: int, level: Dict[str, Any], candidates: List[Path]) -> List[Path]:
+        """
+        计算一个层级并返回晋级到下一层级的结构文件
+        """
+        start = time.perf_counter()
+        level_dir = self.root / f"{index}_{level['name']}"
+        workflow_class = getattr(importlib.import_module(f"task.{level['task']}"), f"{level['task']}Workflow")
+        settings = level_settings(level["keywords"])
+        ncores = level["ncores"] or self.ncores
+
+        workflows, inputs, errors = {}, [], {}
+        for f in candidates:
+            # 结构无法读取或关键词被拒绝时只记录该结构失败
+            try:
+                workflow = workflow_class(basename=f.stem, working_dir=level_dir)
+                workflow.setup_structure(xyz_file=f)
+                workflow.setup_calculator(ncores=ncores)
+                workflow.set_level(**settings)
+                if self.cache is not None:
+                    workflow.attach_cache(self.cache)
+                getattr(workflow, f"pre_{level['task']}")()
+            except Exception as e:
+                errors[f.stem] = f"{type(e).__name__}: {e}"
+                continue
+            workflows[f.stem] = workflow
+            if not workflow.cache_hit:
+                inputs.append(level_dir / f"{f.stem}.inp")
+
+        jobs = self.scheduler.run(inputs) if inputs else []
+
+        energies, failed = {}, list(errors)
+        for name, workflow in workflows.items():
+            result = extract(level_dir, name, fields=("terminated", "scf_converged", "opt_converged", "final_energy"))
+            ok = result["terminated"] and result["scf_converged"] and result["final_energy"] is not None
+            if level["task"] == "opt":
+                ok = ok and result["opt_converged"]
+            if ok:
+                energies[name] = result["final_energy"]
+                workflow.record_success()
+            else:
+                failed.append(name)
+
+        ranked = sorted(energies, key=energies.get)
+        e_min = energies[ranked[0]] if ranked else 0.0
+        promoted = [n for n in ranked
+                    if level["window"] is None or (energies[n] - e_min) * HARTREE_TO_KCAL <= level["window"]]
+        if level["top"] is not None:
+            promoted = promoted[:level["top"]]
+
+        for rank, name in enumerate(ranked, 1):
+            self.structures[name]["levels"][level["name"]] = {
+                "energy": energies[name],
+                "relative": (energies[name] - e_min) * HARTREE_TO_KCAL,
+                "rank": rank,
+                "promoted": name in promoted,
+            }
+        for name in failed:
+            self.structures[name]["levels"][level["name"]] = {"energy": None, "status": "failed",
+                                                              "error": errors.get(name)}
+
+        # opt 层级的优化结构作为下一层级的输入，与ORCA写出的最终结构同名
+        next_inputs = []
+        for name in promoted:
+            if level["task"] == "opt":
+                frame = read_last_frame(level_dir / f"{name}_trj.xyz")
+                if frame is not None:
+                    # 命中缓存时 <name>.xyz 是从缓存恢复的文件，先删除再写入
+                    (level_dir / f"{name}.xyz").unlink(missing_ok=True)
+                    (level_dir / f"{name}.xyz").write_text(frame)
+                    next_inputs.append(level_dir / f"{name}.xyz")
+                    continue
+            next_inputs.append(next(f for f in candidates if f.stem == name))
+
+        self.level_records.append({
+            "level": level["name"],
+            "directory": str(level_dir),
+            "n_in": len(candidates),
+            "n_failed": len(failed),
+            "n_promoted": len(promoted),
+            "rejection_rate": 1 - len(promoted) / len(candidates) if candidates else 0.0,
+            "wall_time": time.perf_counter() - start,
+            "core_hours": sum((j.wall_time or 0.0) * j.ncores for j in jobs) / 3600,
+            "cache_hits": len(workflows) - len(inputs),
+        })
+        return next_inputs
+
+    def run(self) -> Dict[str, Any]:
+        """
+        依次运行所有层级，结果写入 <root>/funnel.json
+
+        返回
+        ----------
+        Dict[str, Any]
+            levels (每个层级的统计) / structures (每个结构在各层级的能量和排名) / final (最终排序)
+        """
+        candidates = self.inputs
+        for index, level in enumerate(self.levels, 1):
+            if not candidates:
+                break
+            candidates = self.run_level(index, level, candidates)
+
+        last = self.levels[-1]["name"]
+        final = sorted((name for name, s in self.structures.items()
+                        if s["levels"].get(last, {}).get("energy") is not None),
+                       key=lambda name: self.structures[name]["levels"][last]["energy"])
+        summary = {"levels": self.level_records, "structures": self.structures, "final": final}
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / "funnel.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+        return summary
+
+
+def report(summary: Dict[str, Any], show: int = 10) -> None:
+    """打印每个层级的耗时和淘汰率，以及最终排序"""
+    levels = summary["levels"]
+    print(f"{'层级':<28}{'输入':>6}{'失败':>6}{'晋级':>6}{'淘汰率':>8}{'墙钟时间(s)':>14}{'核时':>10}")
+    for r in levels:
+        print(f"{r['level']:<28}{r['n_in']:>6}{r['n_failed']:>6}{r['n_promoted']:>6}"
+              f"{r['rejection_rate']:>8.0%}{r['wall_time']:>14.2f}{r['core_hours']:>10.3f}")
+
+    if levels and levels[-1]["n_in"]:
+        # 全部结构直接用最后一层级计算时的核时(按最后一层级每个结构的平均核时估计)
+        last = levels[-1]
+        direct = last["core_hours"] / last["n_in"] * levels[0]["n_in"]
+        used = sum(r["core_hours"] for r in levels)
+        if used > 0:
+            print(f"漏斗总核时 {used:.3f}，全部结构直接用 {last['level']} 计算约 {direct:.3f} 核时 "
+                  f"({direct / used:.1f}x)")
+
+    if summary["final"]:
+        last = levels[-1]["level"]
+        print(f"最终排序 ({last}，相对能量 kcal/mol):")
+        for name in summary["final"][:show]:
+            entry = summary["structures"][name]["levels"][last]
+            print(f"  {entry['rank']:>3}. {name:<24}{entry['relative']:>10.2f}")
@@ -0,0 +1,169 @@
+"""
+批量任务日志 - 记录每个结构的状态，重新运行批量任务时只处理未完成的部分
+
+状态: prepared (已写入输入) → running (ORCA运行中) → finished (ORCA正常结束)
+→ done (post 成功) / failed
+失败或中断(停留在 prepared/running 且输出未正常结束，如作业数组超时)的优化任务
+从 <basename>_trj.xyz 的最后一帧和 <basename>.gbw 重新开始，保留已完成的几何优化步。
+"""
+import os
+import json
+import time
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+from core.extract import extract, read_last_frame
+
+PREPARED = "prepared"
+RUNNING = "running"
+FINISHED = "finished"
+DONE = "done"
+FAILED = "failed"
+
+# 各阶段需要跳过的状态(prepared/running 中已中断的计算见 needs_restart)
+SKIP_STATES = {
+    "pre": {PREPARED, RUNNING, FINISHED, DONE},
+    "run": {RUNNING, FINISHED, DONE, FAILED},
+    "post": {DONE},
+}
+
+
+def needs_restart(state: Optional[str], working_dir: Path, basename: str) -> bool:
+    """
+    pre 阶段是否需要重新准备该结构(优化任务从轨迹最后一帧重启)
+
+    failed 总是重启；prepared/running 在ORCA已开始运行但输出未正常结束时重启
+    (进程被杀、作业数组任务超时等不会写入 failed 的情况)。
+
+    参数
+    ----------
+    state : Optional[str]
+        日志中的最新状态
+    working_dir : Path
+        计算所在目录
+    basename : str
+        计算的基本名称
+    """
+    if state == FAILED:
+        return True
+    if state not in (PREPARED, RUNNING):
+        return False
+    if not (Path(working_dir) / f"{basename}.out").exists():
+        return False
+    return not extract(working_dir, basename, fields=("terminated",))["terminated"]
+
+
+class Journal:
+    """
+    追加写入的 JSON Lines 状态日志，每行记录一次状态变化，以最后一条为准
+    """
+    def __init__(self, path: Path):
+        """
+        参数
+        ----------
+        path : Path
+            日志文件路径，不存在时自动创建
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def record(self, task: str, input_file: str, state: str, error: Optional[str] = None) -> None:
+        """追加一条状态记录；单行小于 PIPE_BUF，O_APPEND 写入在多进程下不会交错"""
+        entry = {
+            "task": task,
+            "input": str(Path(input_file).resolve()),
+            "state": state,
+            "time": time.time(),
+        }
+        if error:
+            entry["error"] = error
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def states(self, task: str) -> Dict[str, Dict[str, Any]]:
+        """
+        返回指定任务类型下每个结构的最新状态
+
+        返回
+        ----------
+        Dict[str, Dict[str, Any]]
+            结构文件绝对路径 -> 最新记录
+        """
+        latest = {}
+        if not self.path.exists():
+            return latest
+        with open(self.path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # 进程被杀时可能留下不完整的最后一行
+                    continue
+                if entry.get("task") == task:
+                    latest[entry["input"]] = entry
+        return latest
+
+    def pending(self, task: str, process: str, inputs: Iterable[Path],
+                working_dir: Optional[Path] = None) -> List[Path]:
+        """
+        过滤出在该阶段仍需处理的结构
+
+        参数
+        ----------
+        working_dir : Optional[Path], optional
+            计算所在目录，默认为 <task>/；pre 阶段据此检查已中断的计算
+        """
+        states = self.states(task)
+        skip = SKIP_STATES.get(process, set())
+        working_dir = Path(working_dir or task)
+        pending = []
+        for f in inputs:
+            entry = states.get(str(Path(f).resolve()))
+            if entry is None or entry["state"] not in skip:
+                pending.append(Path(f))
+            elif process == "pre" and needs_restart(entry["state"], working_dir, Path(f).stem):
+                pending.append(Path(f))
+        return pending
+
+    def summary(self, task: str) -> Dict[str, int]:
+        """统计各状态的结构数"""
+        counts = {}
+        for entry in self.states(task).values():
+            counts[entry["state"]] = counts.get(entry["state"], 0) + 1
+        return counts
+
+
+def restart_input(working_dir: Path, basename: str) -> Optional[Path]:
+    """
+    从中断的优化计算生成重启结构
+
+    将 <basename>_trj.xyz 的最后一帧写入 <working_dir>/restart/<basename>.xyz
+    (保持 basename 不变)，并把旧的 .out / _trj.xyz 归档为 restart/<basename>.<n>.*。
+
+    返回
+    ----------
+    Optional[Path]
+        重启结构文件；没有可用轨迹时返回None
+    """
+    working_dir = Path(working_dir)
+    trj_file = working_dir / f"{basename}_trj.xyz"
+    frame = read_last_frame(trj_file)
+    if frame is None:
+        return None
+
+    restart_dir = working_dir / "restart"
+    restart_dir.mkdir(exist_ok=True)
+    attempt = len(list(restart_dir.glob(f"{basename}.*_trj.xyz"))) + 1
+    for suffix in (".out", "_trj.xyz"):
+        src = working_dir / f"{basename}{suffix}"
+        if src.exists():
+            shutil.copy2(src, restart_dir / f"{basename}.{attempt}{suffix}")
+
+    restart_file = restart_dir / f"{basename}.xyz"
+    restart_file.write_text(frame)
+    return restart_file
@@ -0,0 +1,353 @@
+"""
+运行中ORCA计算的实时监控 - 增量读取 <basename>.out / _trj.xyz，发散或停滞时提前终止
+
+单个进程内用 asyncio 事件循环同时监控数百个计算；Linux 上通过 inotify 获得
+文件修改通知，其他平台退化为定时检查。
+"""
+import os
+import re
+import signal
+import struct
+import asyncio
+import threading
+import ctypes
+import ctypes.util
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+SCF_HEADER_RE = re.compile(r"^Iteration\s+Energy \(Eh\)")
+SCF_ITER_RE = re.compile(r"^\s*(\d+)\s+(-?\d+\.\d+)\s+-?\d+\.\d+e[-+]\d+")
+SCF_END_RE = re.compile(r"SCF (NOT )?CONVERGED")
+FINAL_ENERGY_RE = re.compile(r"^FINAL SINGLE POINT ENERGY\s+(-?\d+\.\d+)")
+MAX_GRADIENT_RE = re.compile(r"^\s+MAX gradient\s+(\d+\.\d+)\s+\d+\.\d+\s+(YES|NO)")
+TRJ_ENERGY_RE = re.compile(r"\bE\s+(-?\d+\.\d+)")
+TERMINATED_RE = re.compile(r"ORCA TERMINATED NORMALLY|ORCA finished by error termination")
+
+
+class FileTail:
+    """
+    增量读取文本文件：记录已读偏移量，每次只读取新增的完整行
+    """
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.offset = 0
+        self._partial = b""
+
+    def read_lines(self) -> List[str]:
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(self.offset)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        self.offset += len(data)
+        data = self._partial + data
+        lines = data.split(b"\n")
+        self._partial = lines.pop()
+        return [line.decode(errors="replace") for line in lines]
+
+
+class JobState:
+    """
+    单个计算的流式状态：当前SCF各迭代能量、各优化步能量和最大梯度
+    """
+    def __init__(self, name: str, out_file: Path, pid: Optional[int] = None,
+                 on_abort: Optional[Callable[["JobState", str], None]] = None):
+        self.name = name
+        self.out_file = Path(out_file)
+        self.trj_file = self.out_file.with_name(f"{self.out_file.stem}_trj.xyz")
+        self.pid = pid
+        self.on_abort = on_abort
+
+        self.scf_energies = []      # 当前SCF的逐次迭代能量
+        self.scf_cycles = []        # 已结束SCF的迭代次数
+        self.opt_energies = []      # 每个构型的最终单点能
+        self.max_gradients = []     # 每个优化步的最大梯度
+        self.gradient_converged = False
+        self.trj_energies = []      # _trj.xyz 中每帧的能量
+        self.finished = False
+        self.aborted = None
+
+        self._out = FileTail(self.out_file)
+        self._trj = FileTail(self.trj_file)
+        self._in_scf = False
+
+    def update(self) -> None:
+        """读取新增内容并更新状态"""
+        for line in self._out.read_lines():
+            if SCF_HEADER_RE.match(line):
+                self._in_scf = True
+            elif self._in_scf and (m := SCF_ITER_RE.match(line)):
+                if int(m.group(1)) == 1:
+                    self.scf_energies = []
+                self.scf_energies.append(float(m.group(2)))
+            elif SCF_END_RE.search(line):
+                if self._in_scf:
+                    self.scf_cycles.append(len(self.scf_energies))
+                self._in_scf = False
+            elif m := FINAL_ENERGY_RE.match(line):
+                self.opt_energies.append(float(m.group(1)))
+            elif m := MAX_GRADIENT_RE.match(line):
+                self.max_gradients.append(float(m.group(1)))
+                self.gradient_converged = m.group(2) == "YES"
+            elif TERMINATED_RE.search(line):
+                self.finished = True
+
+        for line in self._trj.read_lines():
+            if m := TRJ_ENERGY_RE.search(line):
+                self.trj_energies.append(float(m.group(1)))
+
+    def abort(self, reason: str) -> None:
+        """终止该计算(向进程发送 SIGTERM)并记录原因"""
+        self.aborted = reason
+        self.finished = True
+        if self.pid is not None:
+            try:
+                os.kill(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        if self.on_abort:
+            self.on_abort(self, reason)
+
+
+class ScfDivergence:
+    """
+    SCF发散规则：单次SCF迭代次数超过上限，或能量比已达到的最低值升高超过阈值
+    """
+    def __init__(self, max_cycles: int = 150, energy_rise: float = 0.5):
+        self.max_cycles = max_cycles
+        self.energy_rise = energy_rise
+
+    def check(self, state: JobState) -> Optional[str]:
+        energies = state.scf_energies
+        if len(energies) > self.max_cycles:
+            return f"SCF迭代超过 {self.max_cycles} 次仍未收敛"
+        if energies and energies[-1] - min(energies) > self.energy_rise:
+            return f"SCF能量升高 {energies[-1] - min(energies):.3f} Eh，判定为发散"
+        return None
+
+
+class OptStagnation:
+    """
+    优化停滞规则：连续 window 步能量变化小于 min_drop 且梯度仍未收敛，
+    或最大梯度连续 rise_steps 步上升、比上升前增大 growth 倍以上且超过 min_gradient
+
+    接近收敛时梯度在 1e-5 ~ 1e-4 之间振荡是正常的，只有持续且幅度大的上升才判定为发散。
+    """
+    def __init__(self, window: int = 20, min_drop: float = 1e-6, growth: float = 20.0,
+                 rise_steps: int = 5, min_gradient: float = 1e-2):
+        self.window = window
+        self.min_drop = min_drop
+        self.growth = growth
+        self.rise_steps = rise_steps
+        self.min_gradient = min_gradient
+
+    def check(self, state: JobState) -> Optional[str]:
+        energies = state.opt_energies
+        if len(energies) > self.window and not state.gradient_converged:
+            recent = energies[-self.window:]
+            if max(recent) - min(recent) < self.min_drop:
+                return f"最近 {self.window} 步能量变化小于 {self.min_drop:g} Eh，优化停滞"
+        grads = state.max_gradients
+        if len(grads) > self.rise_steps:
+            recent = grads[-self.rise_steps - 1:]
+            rising = all(b > a for a, b in zip(recent, recent[1:]))
+            if rising and grads[-1] > self.min_gradient and grads[-1] > self.growth * recent[0]:
+                return (f"最大梯度连续 {self.rise_steps} 步上升至 {grads[-1]:.3e}，"
+                        f"为上升前的 {grads[-1] / recent[0]:.0f} 倍，优化发散")
+        return None
+
+
+DEFAULT_RULES = [ScfDivergence(), OptStagnation()]
+
+
+class _Inotify:
+    """基于 ctypes 的最小 inotify 封装，只关注目录中文件的修改和创建"""
+    IN_MODIFY = 0x00000002
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    EVENT = struct.Struct("iIII")
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.dirs = {}
+
+    def watch_dir(self, path: Path) -> None:
+        path = str(Path(path).resolve())
+        if path in self.dirs.values():
+            return
+        mask = self.IN_MODIFY | self.IN_CLOSE_WRITE | self.IN_MOVED_TO | self.IN_CREATE
+        wd = self._libc.inotify_add_watch(self.fd, path.encode(), mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"无法监控目录 {path}")
+        self.dirs[wd] = path
+
+    def read_events(self) -> List[Path]:
+        """返回发生变化的文件路径"""
+        changed = []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+        i = 0
+        while i < len(data):
+            wd, mask, cookie, length = self.EVENT.unpack_from(data, i)
+            name = data[i + self.EVENT.size:i + self.EVENT.size + length].rstrip(b"\0").decode()
+            i += self.EVENT.size + length
+            if wd in self.dirs and name:
+                changed.append(Path(self.dirs[wd]) / name)
+        return changed
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class Monitor:
+    """
+    同时监控多个运行中的ORCA计算，规则触发时终止对应计算
+    """
+    def __init__(self, rules: Sequence = DEFAULT_RULES, interval: float = 5.0, verbose: bool = True):
+        """
+        参数
+        ----------
+        rules : Sequence, optional
+            规则列表，每个规则实现 check(state) -> Optional[str]，返回终止原因
+        interval : float, optional
+            无 inotify 时的检查间隔(秒)，有 inotify 时作为兜底超时
+        verbose : bool, optional
+            是否打印每个SCF周期/优化步的能量
+        """
+        self.rules = list(rules)
+        self.interval = interval
+        self.verbose = verbose
+        self.jobs: Dict[Path, JobState] = {}
+        self._loop = None
+        self._wakeup = None
+        self._inotify = None
+        self._dirty = set()
+        self._thread = None
+        self._started = threading.Event()
+        self._stopping = False
+
+    def watch(self, name: str, out_file: Path, pid: Optional[int] = None,
+              on_abort: Optional[Callable[[JobState, str], None]] = None) -> JobState:
+        """开始监控一个计算；可在其他线程中调用"""
+        state = JobState(name, out_file, pid=pid, on_abort=on_abort)
+        if self._loop is not None and threading.current_thread() is not self._thread:
+            self._loop.call_soon_threadsafe(self._add, state)
+        else:
+            self._add(state)
+        return state
+
+    def watch_job(self, job) -> JobState:
+        """监控 core.scheduler.OrcaJob，可直接用作 LocalScheduler 的 on_start 回调"""
+        return self.watch(job.basename, job.out_file, pid=job.proc.pid)
+
+    def unwatch(self, out_file: Path) -> None:
+        """做最后一次检查后停止监控(计算进程已退出时调用)；可在其他线程中调用"""
+        def _remove():
+            state = self.jobs.pop(Path(out_file).resolve(), None)
+            if state is not None and not state.finished:
+                state.pid = None
+                self._check(state)
+        if self._loop is not None and threading.current_thread() is not self._thread:
+            self._loop.call_soon_threadsafe(_remove)
+        else:
+            _remove()
+
+    def unwatch_job(self, job) -> None:
+        """可直接用作 LocalScheduler 的 on_finish 回调"""
+        self.unwatch(job.out_file)
+
+    def _add(self, state: JobState) -> None:
+        self.jobs[state.out_file.resolve()] = state
+        if self._inotify is not None:
+            self._inotify.watch_dir(state.out_file.parent)
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _check(self, state: JobState) -> None:
+        n_scf, n_opt = len(state.scf_cycles), len(state.opt_energies)
+        state.update()
+        if self.verbose:
+            for cycles in state.scf_cycles[n_scf:]:
+                print(f"[{state.name}] SCF 收敛，迭代 {cycles} 次")
+            for igeom, energy in enumerate(state.opt_energies[n_opt:], start=n_opt + 1):
+                grad = state.max_gradients[igeom - 1] if len(state.max_gradients) >= igeom else None
+                grad_str = f"  MAX gradient {grad:.3e}" if grad is not None else ""
+                print(f"[{state.name}] 构型 {igeom}: E = {energy:.8f} Eh{grad_str}")
+
+        for rule in self.rules:
+            reason = rule.check(state)
+            if reason:
+                print(f"[{state.name}] 提前终止: {reason}")
+                state.abort(reason)
+                break
+
+    def _on_inotify(self) -> None:
+        for path in self._inotify.read_events():
+            state = self.jobs.get(path.resolve())
+            if state is None and path.name.endswith("_trj.xyz"):
+                state = self.jobs.get(path.with_name(path.name[:-len("_trj.xyz")] + ".out").resolve())
+            if state is not None:
+                self._dirty.add(state.out_file.resolve())
+        self._wakeup.set()
+
+    async def run(self) -> None:
+        """事件循环：直到 stop() 被调用且所有计算结束"""
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        try:
+            self._inotify = _Inotify()
+            for state in self.jobs.values():
+                self._inotify.watch_dir(state.out_file.parent)
+            self._loop.add_reader(self._inotify.fd, self._on_inotify)
+        except (OSError, AttributeError):
+            self._inotify = None
+        self._started.set()
+
+        try:
+            while not (self._stopping and not self.jobs):
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+                # inotify 只检查有变化的文件，超时兜底时检查全部
+                keys = self._dirty or set(self.jobs)
+                self._dirty = set()
+                for key in keys:
+                    state = self.jobs.get(key)
+                    if state is None:
+                        continue
+                    self._check(state)
+                    if state.finished:
+                        del self.jobs[key]
+        finally:
+            if self._inotify is not None:
+                self._loop.remove_reader(self._inotify.fd)
+                self._inotify.close()
+                self._inotify = None
+
+    def start_in_thread(self) -> "Monitor":
+        """在后台线程中运行事件循环，便于与阻塞式调度器配合"""
+        self._thread = threading.Thread(target=asyncio.run, args=(self.run(),), daemon=True)
+        self._thread.start()
+        self._started.wait()
+        return self
+
+    def stop(self) -> None:
+        """所有已登记的计算结束后退出事件循环"""
+        def _stop():
+            self._stopping = True
+            self._wakeup.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(_stop)
+            if getattr(self, "_thread", None) is not None:
+                self._thread.join()
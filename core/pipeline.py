@@ -0,0 +1,166 @@
+"""
+多阶段流水线 - opt → sp → tddft 自动串联，并以上一阶段的 .gbw 作为初始猜测(MORead)
+"""
+import re
+import sys
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.task_manager import create_workflow
+from core.scheduler import OrcaJob, find_orca
+
+DEFAULT_STAGES = ["opt", "sp", "tddft"]
+
+SCF_CYCLES_RE = re.compile(r"SCF CONVERGED AFTER\s+(\d+)\s+CYCLES")
+
+
+def scf_iterations(out_file: Path) -> List[int]:
+    """
+    读取ORCA输出中每次SCF的迭代次数(优化任务每个构型一次)
+    """
+    out_file = Path(out_file)
+    if not out_file.exists():
+        return []
+    return [int(n) for n in SCF_CYCLES_RE.findall(out_file.read_text(errors="replace"))]
+
+
+def write_structure(structure: Any, xyz_file: Path) -> Path:
+    """将 opi 结构对象写为XYZ文件，缺少原子数/注释行时补齐"""
+    block = structure.to_xyz_block().strip("\n")
+    lines = block.splitlines()
+    if not lines[0].strip().isdigit():
+        lines = [str(len(lines)), ""] + lines
+    xyz_file.write_text("\n".join(lines) + "\n")
+    return xyz_file
+
+
+class Pipeline:
+    """
+    单个结构的多阶段计算流水线
+
+    每个阶段在 <阶段名>/ 目录下完成 pre → ORCA → post，后一阶段只有在前一阶段
+    正常结束后才启动；opt 之后的阶段使用优化后的结构，并读入前一阶段的 .gbw。
+    """
+    def __init__(self, input_file: Path, stages: Sequence[str] = DEFAULT_STAGES,
+                 ncores: int = 1, orca_cmd: Optional[str] = None, moread: bool = True,
+                 staging: Optional[Any] = None):
+        """
+        参数
+        ----------
+        input_file : Path
+            初始结构(XYZ)
+        stages : Sequence[str], optional
+            依次执行的任务类型，默认为 opt, sp, tddft
+        ncores : int, optional
+            每个阶段使用的核数
+        orca_cmd : Optional[str], optional
+            ORCA可执行文件，默认见 core.scheduler.find_orca
+        moread : bool, optional
+            是否以前一阶段的 .gbw 作为初始猜测，默认为True
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)；给定时各阶段的ORCA在节点本地暂存目录中运行
+        """
+        self.input_file = Path(input_file)
+        self.stages = list(stages)
+        self.ncores = ncores
+        self.orca_cmd = find_orca(orca_cmd)
+        self.moread = moread
+        self.staging = staging
+        self.records = []
+
+    def run(self) -> List[Dict[str, Any]]:
+        """
+        依次执行所有阶段，某一阶段失败时停止
+
+        返回
+        ----------
+        List[Dict[str, Any]]
+            每个阶段的记录：stage / status / guess / scf_iterations / wall_time / error
+        """
+        structure_file = self.input_file
+        prev_gbw = None
+
+        for stage in self.stages:
+            record = {
+                "input": str(self.input_file),
+                "stage": stage,
+                "status": "ok",
+                "guess": None,
+                "scf_iterations": [],
+                "wall_time": None,
+                "error": None,
+            }
+            self.records.append(record)
+            try:
+                workflow = create_workflow(stage, structure_file, self.ncores)
+                if self.moread and prev_gbw is not None and prev_gbw.exists():
+                    workflow.set_guess(prev_gbw)
+                    record["guess"] = str(prev_gbw)
+                getattr(workflow, f"pre_{stage}")()
+
+                runner = getattr(workflow, f"run_{stage}", None)
+                if not workflow.cache_hit and runner is not None:
+                    # 由多个独立计算组成的阶段(如数值频率)自行调度
+                    record["wall_time"] = runner(self.ncores, self.orca_cmd, staging=self.staging)
+                elif not workflow.cache_hit:
+                    job = OrcaJob(workflow.working_dir / f"{workflow.basename}.inp", ncores=self.ncores,
+                                  staging=self.staging)
+                    job.launch(self.orca_cmd)
+                    job.wait()
+                    record["wall_time"] = job.wall_time
+                    if not job.succeeded:
+                        raise RuntimeError(job.failure)
+
+                record["scf_iterations"] = scf_iterations(workflow.working_dir / f"{workflow.basename}.out")
+                getattr(workflow, f"post_{stage}")()
+            except SystemExit as e:
+                record["status"] = "failed"
+                record["error"] = f"退出码 {e.code}"
+                break
+            except Exception as e:
+                record["status"] = "failed"
+                record["error"] = f"{type(e).__name__}: {e}"
+                break
+
+            prev_gbw = workflow.working_dir / f"{workflow.basename}.gbw"
+            if getattr(workflow, "optimized", None) is not None:
+                # 与ORCA写出的最终结构同名，后续阶段保持相同的 basename
+                structure_file = write_structure(
+                    workflow.optimized, workflow.working_dir / f"{workflow.basename}.xyz"
+                )
+
+        return self.records
+
+
+def run_pipelines(inputs: Sequence[Path], stages: Sequence[str] = DEFAULT_STAGES, ncores: int = 1,
+                  total_cores: int = 1, moread: bool = True,
+                  staging: Optional[Any] = None) -> List[Dict[str, Any]]:
+    """
+    并发执行多个结构的流水线，同时运行的流水线数为 total_cores // ncores
+
+    返回
+    ----------
+    List[Dict[str, Any]]
+        所有结构所有阶段的记录
+    """
+    workers = max(1, total_cores // ncores)
+    pipelines = [Pipeline(f, stages, ncores=ncores, moread=moread, staging=staging) for f in inputs]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda p: p.run(), pipelines))
+    return [r for records in results for r in records]
+
+
+def report(records: List[Dict[str, Any]]) -> None:
+    """打印每个阶段的SCF迭代次数和墙钟时间，便于比较MORead带来的加速"""
+    print(f"{'结构':<24}{'阶段':<8}{'初始猜测':<10}{'SCF次数':>8}{'SCF迭代':>10}{'墙钟时间(s)':>14}  状态")
+    for r in records:
+        name = Path(r["input"]).stem
+        guess = "MORead" if r["guess"] else "-"
+        wall = f"{r['wall_time']:.2f}" if r["wall_time"] is not None else "-"
+        status = r["status"] if r["error"] is None else f"{r['status']} ({r['error']})"
+        print(f"{name:<24}{r['stage']:<8}{guess:<10}{len(r['scf_iterations']):>8}"
+              f"{sum(r['scf_iterations']):>10}{wall:>14}  {status}")
@@ -0,0 +1,239 @@
+"""
+能量轨迹绘图 - 使用 matplotlib 的 Agg 面向对象接口(Figure + FigureCanvasAgg)，不经过
+pyplot 的全局状态，可在进程池中并行绘制，每个计算写入各自的 <basename>_energy_trajectory.png
+
+对整个批次还可以绘制一张汇总图:
+    overlay  所有轨迹叠加，纵轴为相对最终能量的 kcal/mol
+    grid     每个计算一个小图(最多 max_panels 个)
+
+用法:
+    python -m core.plotting opt/ -j 16
+    python -m core.plotting opt/ -j 16 --dpi 100 --summary opt/campaign.png --mode overlay
+"""
+import os
+import sys
+import math
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+HARTREE_TO_KCAL = 627.509474
+
+DEFAULT_DPI = 300
+SUMMARY_MODES = ("overlay", "grid")
+
+
+def trajectory_path(working_dir: Path, basename: str) -> Path:
+    """计算的能量轨迹图路径"""
+    return Path(working_dir) / f"{basename}_energy_trajectory.png"
+
+
+def _canvas_figure(figsize):
+    """创建不注册到 pyplot 的图，绘制完成后随对象一起释放"""
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig
+
+
+def render_trajectory(energy_data: Sequence[float], save_path: Path, dpi: int = DEFAULT_DPI,
+                      title: str = "Geometry Optimization Energy Trajectory",
+                      xlabel: str = "Geometry Index", ylabel: str = "Energy (Hartree)") -> Path:
+    """
+    绘制一条能量轨迹并保存
+
+    参数
+    ----------
+    energy_data : Sequence[float]
+        每个构型的能量(Hartree)
+    save_path : Path
+        图片路径
+    dpi : int, optional
+        分辨率，默认为300
+
+    返回
+    ----------
+    Path
+        图片路径
+    """
+    from matplotlib.ticker import FormatStrFormatter, MaxNLocator
+
+    fig = _canvas_figure((10, 6))
+    ax = fig.add_subplot()
+    x_indices = list(range(1, len(energy_data) + 1))  # 从1开始计数
+    ax.plot(x_indices, energy_data, 'b-o', linewidth=2, markersize=4, label='SCF Energy')
+
+    final_energy = energy_data[-1]
+    ax.axhline(y=final_energy, color='r', linestyle='--', alpha=0.7,
+               label=f'Final Energy: {final_energy:.6f} Hartree')
+
+    ax.set_title(title, fontsize=14, fontweight='bold')
+    ax.set_xlabel(xlabel, fontsize=12)
+    ax.set_ylabel(ylabel, fontsize=12)
+    ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+    ax.xaxis.set_major_formatter(FormatStrFormatter('%d'))
+    ax.yaxis.set_major_formatter(FormatStrFormatter('%.6f'))
+    ax.grid(True, alpha=0.3)
+    ax.legend()
+
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=dpi, bbox_inches='tight')
+    return Path(save_path)
+
+
+def read_energies(working_dir: Path, basename: str) -> List[float]:
+    """从 .property.json(或 .out) 中读取每个构型的能量，不做完整解析"""
+    from core.extract import extract
+    return extract(working_dir, basename, fields=("energies",))["energies"] or []
+
+
+def _plot_job(working_dir: str, basename: str, dpi: int) -> Dict[str, Any]:
+    """进程池中绘制一个计算的能量轨迹"""
+    record = {"basename": basename, "path": None, "energies": [], "error": None}
+    try:
+        record["energies"] = read_energies(Path(working_dir), basename)
+        if record["energies"]:
+            record["path"] = str(render_trajectory(record["energies"], trajectory_path(working_dir, basename), dpi))
+        else:
+            record["error"] = "无能量数据"
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+
+def plot_batch(working_dir: Path, basenames: Sequence[str], workers: Optional[int] = None,
+               dpi: int = DEFAULT_DPI) -> List[Dict[str, Any]]:
+    """
+    通过进程池为一批计算绘制能量轨迹
+
+    参数
+    ----------
+    working_dir : Path
+        任务目录
+    basenames : Sequence[str]
+        计算名称
+    workers : Optional[int], optional
+        进程池大小，默认为CPU核数；为1时在当前进程内顺序绘制
+    dpi : int, optional
+        分辨率，默认为300
+
+    返回
+    ----------
+    List[Dict[str, Any]]
+        与 basenames 顺序一致的 basename / path / energies / error
+    """
+    workers = workers or os.cpu_count() or 1
+    args = [(str(working_dir), name, dpi) for name in basenames]
+    if workers == 1 or len(args) <= 1:
+        return [_plot_job(*a) for a in args]
+
+    from concurrent.futures import ProcessPoolExecutor
+    chunksize = max(1, len(args) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_plot_job, *zip(*args), chunksize=chunksize))
+
+
+def plot_summary(trajectories: Dict[str, Sequence[float]], save_path: Path, mode: str = "overlay",
+                 dpi: int = 150, max_panels: int = 100) -> Optional[Path]:
+    """
+    绘制整个批次的能量轨迹汇总图
+
+    参数
+    ----------
+    trajectories : Dict[str, Sequence[float]]
+        计算名称 -> 每个构型的能量(Hartree)
+    save_path : Path
+        图片路径
+    mode : str, optional
+        overlay (叠加，相对最终能量的 kcal/mol) 或 grid (每个计算一个小图)
+    dpi : int, optional
+        分辨率，默认为150
+    max_panels : int, optional
+        grid 模式最多绘制的计算数，按优化步数从多到少选取
+
+    返回
+    ----------
+    Optional[Path]
+        图片路径，没有可绘制的轨迹时为None
+    """
+    trajectories = {name: e for name, e in trajectories.items() if e}
+    if not trajectories:
+        return None
+    if mode not in SUMMARY_MODES:
+        raise ValueError(f"不支持的汇总图模式: {mode}")
+
+    if mode == "overlay":
+        from matplotlib.collections import LineCollection
+        from matplotlib.ticker import MaxNLocator
+
+        fig = _canvas_figure((10, 6))
+        ax = fig.add_subplot()
+        # 数千条轨迹作为一个 LineCollection 绘制
+        lines = [[(i, (e - energies[-1]) * HARTREE_TO_KCAL) for i, e in enumerate(energies, 1)]
+                 for energies in trajectories.values()]
+        alpha = max(0.05, min(0.8, 20 / len(lines)))
+        ax.add_collection(LineCollection(lines, linewidths=0.8, colors='b', alpha=alpha))
+        ax.autoscale()
+        ax.xaxis.set_major_locator(MaxNLocator(integer=True))
+        ax.set_title(f'Energy Trajectories ({len(lines)} optimizations)', fontsize=14, fontweight='bold')
+        ax.set_xlabel('Geometry Index', fontsize=12)
+        ax.set_ylabel('E - E(final) (kcal/mol)', fontsize=12)
+        ax.grid(True, alpha=0.3)
+    else:
+        names = sorted(trajectories, key=lambda n: -len(trajectories[n]))[:max_panels]
+        ncols = math.ceil(math.sqrt(len(names)))
+        nrows = math.ceil(len(names) / ncols)
+        fig = _canvas_figure((2.5 * ncols, 2 * nrows))
+        axes = fig.subplots(nrows, ncols, squeeze=False)
+        for ax, name in zip(axes.flat, names):
+            energies = trajectories[name]
+            ax.plot(range(1, len(energies) + 1), [(e - energies[-1]) * HARTREE_TO_KCAL for e in energies],
+                    'b-', linewidth=1)
+            ax.set_title(name, fontsize=8)
+            ax.tick_params(labelsize=6)
+        for ax in axes.flat[len(names):]:
+            ax.set_axis_off()
+
+    fig.tight_layout()
+    fig.savefig(save_path, dpi=dpi)
+    return Path(save_path)
+
+
+def collect_trajectories(working_dir: Path, basenames: Iterable[str]) -> Dict[str, List[float]]:
+    """读取一批计算的能量轨迹"""
+    return {name: read_energies(working_dir, name) for name in basenames}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="并行绘制优化能量轨迹")
+    parser.add_argument("directory", help="任务目录(如 opt/)")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="进程池大小，默认为CPU核数")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_DPI, help=f"每个轨迹图的分辨率，默认为{DEFAULT_DPI}")
+    parser.add_argument("--summary", default=None, help="同时绘制整个批次的汇总图到该文件")
+    parser.add_argument("--mode", choices=SUMMARY_MODES, default="overlay", help="汇总图模式，默认为overlay")
+    parser.add_argument("--no-individual", action="store_true", help="只绘制汇总图")
+    args = parser.parse_args(argv)
+
+    working_dir = Path(args.directory)
+    basenames = sorted(f.name[:-len(".property.json")] for f in working_dir.glob("*.property.json"))
+    if args.no_individual:
+        trajectories = collect_trajectories(working_dir, basenames)
+    else:
+        records = plot_batch(working_dir, basenames, args.workers, args.dpi)
+        failed = [r for r in records if r["error"]]
+        print(f"已绘制 {len(records) - len(failed)} 个能量轨迹图，失败 {len(failed)}")
+        for r in failed:
+            print(f"  {r['basename']}: {r['error']}")
+        trajectories = {r["basename"]: r["energies"] for r in records}
+    if args.summary:
+        path = plot_summary(trajectories, Path(args.summary), args.mode)
+        print(f"汇总图: {path}" if path else "没有可绘制的能量轨迹")
+
+
+if __name__ == "__main__":
+    main()
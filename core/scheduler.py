@@ -0,0 +1,213 @@
+"""
+本地调度器 - 在一个节点的核数预算内并发运行多个小规模ORCA计算
+"""
+import os
+import re
+import time
+import queue
+import shutil
+import threading
+import subprocess
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+NPROCS_RE = re.compile(r"%pal\s+nprocs\s+(\d+)", re.IGNORECASE)
+PAL_KEYWORD_RE = re.compile(r"^\s*!.*\bpal(\d+)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def read_nprocs(inp_file: Path) -> int:
+    """
+    从ORCA输入文件读取请求的核数(%pal nprocs 或 !PALn)，未指定时为1
+    """
+    text = Path(inp_file).read_text()
+    match = NPROCS_RE.search(text) or PAL_KEYWORD_RE.search(text)
+    return int(match.group(1)) if match else 1
+
+
+def find_orca(orca_cmd: Optional[str] = None) -> str:
+    """
+    定位ORCA可执行文件：显式参数 > 环境变量 ORCA_BIN > PATH 中的 orca
+
+    ORCA并行运行时要求以绝对路径调用。
+    """
+    orca_cmd = orca_cmd or os.environ.get("ORCA_BIN") or shutil.which("orca")
+    if not orca_cmd:
+        raise FileNotFoundError("未找到ORCA可执行文件，请设置 ORCA_BIN 环境变量")
+    return str(Path(orca_cmd).resolve())
+
+
+class OrcaJob:
+    """
+    单个ORCA计算任务
+    """
+    def __init__(self, inp_file: Path, ncores: Optional[int] = None, staging=None):
+        """
+        参数
+        ----------
+        inp_file : Path
+            已准备好的ORCA输入文件
+        ncores : Optional[int], optional
+            占用核数，默认从输入文件的 %pal 块读取
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)；给定时ORCA在节点本地暂存目录中运行
+        """
+        self.inp_file = Path(inp_file)
+        self.ncores = ncores or read_nprocs(self.inp_file)
+        self.out_file = self.inp_file.with_suffix(".out")
+        self.staging = staging
+        self.scratch_dir = None
+        self.io = None
+        self.proc = None
+        self.returncode = None
+        self.error = None
+        self.start_time = None
+        self.end_time = None
+
+    @property
+    def basename(self) -> str:
+        return self.inp_file.stem
+
+    @property
+    def wall_time(self) -> Optional[float]:
+        if self.start_time is None or self.end_time is None:
+            return None
+        return self.end_time - self.start_time
+
+    @property
+    def succeeded(self) -> bool:
+        return self.returncode == 0 and self.error is None
+
+    @property
+    def failure(self) -> Optional[str]:
+        """失败原因，成功时为None"""
+        if self.error is not None:
+            return self.error
+        return None if self.returncode == 0 else f"ORCA返回码 {self.returncode}"
+
+    def launch(self, orca_cmd: str) -> None:
+        """以子进程方式启动ORCA，标准输出写入 <basename>.out"""
+        self.start_time = time.perf_counter()
+        if self.staging is not None:
+            self.scratch_dir, self.io = self.staging.stage_in(self.inp_file)
+        # 先删除旧输出，不通过硬链接写入其他位置(如结果缓存或 .gbw 仓库)的文件
+        self.out_file.unlink(missing_ok=True)
+        with open(self.out_file, "w") as out:
+            self.proc = subprocess.Popen(
+                [orca_cmd, self.inp_file.name],
+                cwd=self.scratch_dir or self.inp_file.parent,
+                stdout=out,
+                stderr=subprocess.STDOUT,
+            )
+
+    def wait(self) -> int:
+        self.returncode = self.proc.wait()
+        if self.staging is not None:
+            self.io = self.staging.stage_out(self.inp_file, self.scratch_dir, self.io)
+        self.end_time = time.perf_counter()
+        return self.returncode
+
+
+class LocalScheduler:
+    """
+    按核数装箱的本地并发执行器
+
+    任务按请求核数从大到小排序(first-fit decreasing)，只要剩余核数足够就启动，
+    任一任务结束后释放其核数并继续装入等待中的任务。
+    """
+    def __init__(self, total_cores: int, orca_cmd: Optional[str] = None, staging=None):
+        """
+        参数
+        ----------
+        total_cores : int
+            可用的总核数预算
+        orca_cmd : Optional[str], optional
+            ORCA可执行文件路径，默认见 find_orca
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)，用于由输入文件创建的任务
+        """
+        self.total_cores = total_cores
+        self.orca_cmd = find_orca(orca_cmd)
+        self.staging = staging
+
+    def run(self, inputs: Sequence, on_start=None, on_finish=None) -> List[OrcaJob]:
+        """
+        运行一组ORCA输入文件，直到全部结束
+
+        参数
+        ----------
+        inputs : Sequence[Path | OrcaJob]
+            输入文件或任务列表
+        on_start, on_finish : callable, optional
+            任务启动/结束时的回调，参数为 OrcaJob
+
+        返回
+        ----------
+        List[OrcaJob]
+            与输入顺序一致的任务列表(含返回码和墙钟时间)
+        """
+        jobs = [j if isinstance(j, OrcaJob) else OrcaJob(j, staging=self.staging) for j in inputs]
+        for job in jobs:
+            if job.ncores > self.total_cores:
+                raise ValueError(
+                    f"任务 '{job.basename}' 请求 {job.ncores} 核，超过总核数预算 {self.total_cores}"
+                )
+
+        pending = sorted(jobs, key=lambda j: j.ncores, reverse=True)
+        finished = queue.Queue()
+        free = self.total_cores
+        running = 0
+
+        def _wait(job):
+            # 等待或取回产物出错时也必须放入 finished，否则主循环永远等待
+            try:
+                job.wait()
+            except Exception as e:
+                job.error = f"{type(e).__name__}: {e}"
+            finally:
+                if job.end_time is None:
+                    job.end_time = time.perf_counter()
+                finished.put(job)
+
+        while pending or running:
+            # 装入所有放得下的任务
+            for job in list(pending):
+                if job.ncores <= free:
+                    pending.remove(job)
+                    free -= job.ncores
+                    running += 1
+                    # 找不到ORCA、无权限或暂存目录写满时只记录该任务失败，继续等待已启动的任务
+                    try:
+                        job.launch(self.orca_cmd)
+                    except Exception as e:
+                        job.error = f"{type(e).__name__}: {e}"
+                        job.end_time = time.perf_counter()
+                        if job.scratch_dir is not None:
+                            shutil.rmtree(job.scratch_dir, ignore_errors=True)
+                        finished.put(job)
+                        continue
+                    threading.Thread(target=_wait, args=(job,), daemon=True).start()
+                    if on_start:
+                        on_start(job)
+
+            job = finished.get()
+            free += job.ncores
+            running -= 1
+            if on_finish:
+                on_finish(job)
+
+        return jobs
+
+
+def report(jobs: List[OrcaJob]) -> None:
+    """打印每个任务的核数、返回码与墙钟时间"""
+    print(f"{'任务':<30}{'核数':>6}{'返回码':>8}{'墙钟时间(s)':>14}")
+    for job in jobs:
+        wall = f"{job.wall_time:.2f}" if job.wall_time is not None else "-"
+        print(f"{job.basename:<30}{job.ncores:>6}{str(job.returncode):>8}{wall:>14}")
+        if job.error is not None:
+            print(f"  错误: {job.error}")
+    failed = sum(1 for j in jobs if not j.succeeded)
+    print(f"共 {len(jobs)} 个任务，失败 {failed}")
+    if any(j.io is not None for j in jobs):
+        from core.scratch import report as report_io
+        report_io(j.io for j in jobs)
@@ -0,0 +1,300 @@
+"""
+暂存目录管理 - ORCA 在节点本地的暂存目录中运行，结束后只将白名单内的产物复制回工作目录
+
+ORCA 的主要 I/O (.gbw/.densities/.tmp 等) 都发生在暂存目录；标准输出仍直接写入
+工作目录的 <basename>.out，监控器照常读取。复制回工作目录时:
+
+- 白名单(KEEP_SUFFIXES)内的文件原样保留，.densities、.tar、.bibtex 等直接丢弃
+- COMPRESS_SUFFIXES 内的文件以 gzip 压缩保存为 <文件名>.gz
+- 指定 GbwStore 时 .gbw 按内容哈希存放，工作目录中只保留硬链接，相同内容只存一份
+
+每个任务移动的字节数写入 <basename>.staging.json。
+
+用法:
+    python -m core.scratch run opt/water.inp --orca $ORCA_BIN --gbw-store gbw_store > opt/water.out
+    python -m core.scratch report opt/
+"""
+import os
+import sys
+import json
+import gzip
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# 复制回工作目录的产物后缀，post 阶段、结果缓存和重启需要这些文件
+KEEP_SUFFIXES = (
+    ".gbw", ".json", ".property.json", ".xyz", "_trj.xyz", ".engrad", ".opt", ".hess",
+)
+# 保留但压缩存放的产物后缀
+COMPRESS_SUFFIXES = (".property.txt",)
+
+# ORCA 输入中以引号给出的文件名(%moinp、InHessName 等)和 "* xyzfile" 坐标文件
+QUOTED_NAME = '"'
+XYZFILE_PREFIX = "* xyzfile"
+
+
+def default_scratch_root() -> Path:
+    """节点本地暂存根目录: $ORCA_SCRATCH > $TMPDIR > 系统临时目录"""
+    return Path(os.environ.get("ORCA_SCRATCH") or os.environ.get("TMPDIR") or tempfile.gettempdir())
+
+
+def referenced_files(inp_file: Path) -> Iterable[Path]:
+    """
+    ORCA 输入文件引用的、位于输入目录中的其他输入文件(初始猜测 .gbw、坐标文件等)
+    """
+    inp_file = Path(inp_file)
+    for line in inp_file.read_text().splitlines():
+        names = line.split(QUOTED_NAME)[1::2]
+        if line.strip().lower().startswith(XYZFILE_PREFIX):
+            names += line.split()[-1:]
+        for name in names:
+            path = inp_file.parent / name
+            if name and path.is_file():
+                yield path
+
+
+def _copy(src: Path, dst: Path) -> int:
+    """复制文件(跟随符号链接)，返回字节数"""
+    shutil.copyfile(src, dst)
+    return dst.stat().st_size
+
+
+class GbwStore:
+    """
+    内容寻址的 .gbw 存储
+
+    目录结构: <root>/<sha256[:2]>/<sha256>.gbw，文件设为只读，工作目录中的
+    <basename>.gbw 为其硬链接(跨文件系统时复制)。
+    """
+    def __init__(self, root: Path):
+        """
+        参数
+        ----------
+        root : Path
+            存储根目录，应与工作目录位于同一文件系统以便硬链接
+        """
+        self.root = Path(root).resolve()
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def digest(path: Path, chunk_size: int = 1 << 20) -> str:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(chunk_size), b""):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def put(self, src: Path, dst: Path) -> Tuple[str, bool]:
+        """
+        将 src 存入仓库并在 dst 处建立链接
+
+        返回
+        ----------
+        Tuple[str, bool]
+            内容哈希，以及仓库中是否已有相同内容(即本次未写入)
+        """
+        key = self.digest(src)
+        entry = self.root / key[:2] / f"{key}.gbw"
+        existed = entry.exists()
+        if not existed:
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            # 临时文件名在进程和线程之间唯一(同一进程的多个任务可能同时取回相同内容)
+            fd, tmp = tempfile.mkstemp(prefix=f".{key}.", dir=entry.parent)
+            os.close(fd)
+            tmp = Path(tmp)
+            try:
+                shutil.copyfile(src, tmp)
+                tmp.chmod(0o444)
+                # 其他任务同时写入相同内容时 rename 覆盖同样的文件
+                tmp.rename(entry)
+            except OSError:
+                tmp.unlink(missing_ok=True)
+                if not entry.exists():
+                    raise
+
+        if dst.exists() or dst.is_symlink():
+            dst.unlink()
+        try:
+            os.link(entry, dst)
+        except OSError:
+            shutil.copy2(entry, dst)
+        return key, existed
+
+
+class ScratchStaging:
+    """
+    ORCA 任务的暂存目录: stage_in 复制输入，stage_out 按白名单取回产物并删除暂存目录
+    """
+    def __init__(self, root: Optional[Path] = None, keep: Sequence[str] = KEEP_SUFFIXES,
+                 compress: Sequence[str] = COMPRESS_SUFFIXES, gbw_store: Optional[GbwStore] = None):
+        """
+        参数
+        ----------
+        root : Optional[Path], optional
+            暂存根目录，默认见 default_scratch_root(在运行ORCA的节点上解析)
+        keep : Sequence[str], optional
+            原样复制回工作目录的产物后缀，默认为 KEEP_SUFFIXES
+        compress : Sequence[str], optional
+            压缩后复制回工作目录的产物后缀，默认为 COMPRESS_SUFFIXES
+        gbw_store : Optional[GbwStore], optional
+            内容寻址的 .gbw 存储，默认直接复制 .gbw
+        """
+        self.root = Path(root).resolve() if root else None
+        self.keep = tuple(keep)
+        self.compress = tuple(compress)
+        self.gbw_store = gbw_store
+
+    def stage_in(self, inp_file: Path) -> Tuple[Path, Dict[str, Any]]:
+        """
+        创建暂存目录并复制输入文件及其引用的文件
+
+        返回
+        ----------
+        Tuple[Path, Dict[str, Any]]
+            暂存目录，以及传给 stage_out 的 I/O 统计
+        """
+        start = time.perf_counter()
+        inp_file = Path(inp_file)
+        root = self.root or default_scratch_root()
+        root.mkdir(parents=True, exist_ok=True)
+        scratch_dir = Path(tempfile.mkdtemp(prefix=f"{inp_file.stem}.", dir=root))
+
+        staged = [inp_file] + [f for f in referenced_files(inp_file) if f.name != inp_file.name]
+        bytes_in = sum(_copy(f, scratch_dir / f.name) for f in staged)
+        io = {
+            "scratch_dir": str(scratch_dir),
+            "staged_in": [f.name for f in staged],
+            "bytes_in": bytes_in,
+            "bytes_out": 0,
+            "bytes_compressed_saved": 0,
+            "bytes_deduplicated": 0,
+            "bytes_dropped": 0,
+            "dropped": [],
+            "stage_in_time": time.perf_counter() - start,
+            "stage_out_time": None,
+        }
+        return scratch_dir, io
+
+    def _suffix(self, name: str, stem: str, suffixes: Sequence[str]) -> Optional[str]:
+        return next((s for s in suffixes if name == f"{stem}{s}"), None)
+
+    def stage_out(self, inp_file: Path, scratch_dir: Path, io: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        按白名单将产物复制回工作目录，删除暂存目录，并写入 <basename>.staging.json
+
+        ORCA 失败时同样取回产物，便于查看输出和从轨迹重启。
+
+        返回
+        ----------
+        Dict[str, Any]
+            本任务的 I/O 统计(字节数和耗时)
+        """
+        start = time.perf_counter()
+        inp_file = Path(inp_file)
+        working_dir = inp_file.parent
+        stem = inp_file.stem
+        staged_in = set(io["staged_in"])
+
+        for f in sorted(scratch_dir.iterdir()):
+            if not f.is_file() or f.name in staged_in:
+                continue
+            size = f.stat().st_size
+            if self._suffix(f.name, stem, self.keep):
+                if f.name == f"{stem}.gbw" and self.gbw_store is not None:
+                    _, existed = self.gbw_store.put(f, working_dir / f.name)
+                    io["bytes_deduplicated" if existed else "bytes_out"] += size
+                else:
+                    io["bytes_out"] += _copy(f, working_dir / f.name)
+            elif self._suffix(f.name, stem, self.compress):
+                dst = working_dir / f"{f.name}.gz"
+                with open(f, "rb") as src, gzip.open(dst, "wb") as out:
+                    shutil.copyfileobj(src, out)
+                compressed = dst.stat().st_size
+                io["bytes_out"] += compressed
+                io["bytes_compressed_saved"] += size - compressed
+            else:
+                io["bytes_dropped"] += size
+                io["dropped"].append(f.name)
+
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+        io["stage_out_time"] = time.perf_counter() - start
+        (working_dir / f"{stem}.staging.json").write_text(json.dumps(io, indent=2))
+        return io
+
+
+def open_staging(args: Any) -> Optional[ScratchStaging]:
+    """根据命令行参数创建暂存配置，未指定 --scratch 时返回None"""
+    if not getattr(args, "scratch", False):
+        return None
+    store = GbwStore(args.gbw_store) if getattr(args, "gbw_store", None) else None
+    return ScratchStaging(getattr(args, "scratch_dir", None), gbw_store=store)
+
+
+def summarize(stats: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总多个任务的 I/O 统计"""
+    total = {"jobs": 0, "bytes_in": 0, "bytes_out": 0, "bytes_compressed_saved": 0,
+             "bytes_deduplicated": 0, "bytes_dropped": 0}
+    for io in stats:
+        if io is None:
+            continue
+        total["jobs"] += 1
+        for key in total:
+            if key != "jobs":
+                total[key] += io.get(key, 0)
+    return total
+
+
+def report(stats: Iterable[Dict[str, Any]]) -> None:
+    """打印暂存 I/O 汇总"""
+    total = summarize(stats)
+    if not total["jobs"]:
+        return
+    mb = 1024 ** 2
+    print(f"暂存 I/O ({total['jobs']} 个任务): 复制到暂存 {total['bytes_in'] / mb:.2f} MB，"
+          f"复制回工作目录 {total['bytes_out'] / mb:.2f} MB，丢弃 {total['bytes_dropped'] / mb:.2f} MB，"
+          f"压缩节省 {total['bytes_compressed_saved'] / mb:.2f} MB，"
+          f".gbw 去重节省 {total['bytes_deduplicated'] / mb:.2f} MB")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="在节点本地暂存目录中运行ORCA")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="暂存、运行ORCA并取回产物(标准输出为ORCA输出)")
+    run.add_argument("input", help="ORCA输入文件")
+    run.add_argument("--orca", default=None, help="ORCA可执行文件，默认见 core.scheduler.find_orca")
+    run.add_argument("--scratch-dir", default=None, help="暂存根目录，默认为 $ORCA_SCRATCH、$TMPDIR 或 /tmp")
+    run.add_argument("--gbw-store", default=None, help="内容寻址的 .gbw 存储目录")
+
+    rep = sub.add_parser("report", help="汇总目录中的 .staging.json")
+    rep.add_argument("directory", help="任务目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        report(json.loads(f.read_text()) for f in Path(args.directory).rglob("*.staging.json"))
+        return
+
+    from core.scheduler import find_orca
+    orca_cmd = find_orca(args.orca)
+    args.scratch = True
+    staging = open_staging(args)
+    inp_file = Path(args.input).resolve()
+    scratch_dir, io = staging.stage_in(inp_file)
+    try:
+        returncode = subprocess.run([orca_cmd, inp_file.name], cwd=scratch_dir).returncode
+    finally:
+        staging.stage_out(inp_file, scratch_dir, io)
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""
+优化轨迹逐步数据的紧凑二进制存储 - 每个优化步一条记录(结构化 numpy 数组)，写入
+<basename>.steps.npy，代替在标准输出中打印每一步的电荷等大量数据
+
+记录字段:
+    energy          最终单点能 (Hartree)
+    scf_converged   SCF是否收敛
+    gradient_norm   梯度范数
+    coords          坐标 (Å)，形状 (natoms, 3)
+    gradient        核梯度 (Hartree/bohr)，形状 (natoms, 3)
+    charges         Mulliken电荷，形状 (natoms,)，未计算时为NaN
+
+写入时逐条追加，内存占用与构型数无关；读取时使用内存映射:
+    steps = load_steps("opt/water.steps.npy")
+    steps["energy"], steps["charges"][-1]
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+STEPS_SUFFIX = ".steps.npy"
+
+BOHR_TO_ANGSTROM = 0.529177210903
+
+
+def step_dtype(natoms: int) -> np.dtype:
+    """natoms 个原子的逐步记录类型"""
+    return np.dtype([
+        ("energy", "f8"),
+        ("scf_converged", "?"),
+        ("gradient_norm", "f8"),
+        ("coords", "f8", (natoms, 3)),
+        ("gradient", "f8", (natoms, 3)),
+        ("charges", "f8", (natoms,)),
+    ])
+
+
+def geometry_record(geometry: Dict[str, Any], dtype: np.dtype) -> np.ndarray:
+    """
+    将 .property.json 中的一个构型转换为一条记录
+
+    参数
+    ----------
+    geometry : Dict[str, Any]
+        "Geometries" 数组的一个元素
+    dtype : np.dtype
+        step_dtype 返回的记录类型
+    """
+    record = np.zeros(1, dtype=dtype)
+    spd = geometry.get("Single_Point_Data") or {}
+    record["energy"] = spd.get("FinalEnergy", np.nan)
+    record["scf_converged"] = bool(spd.get("Converged", False))
+
+    cartesians = geometry["Geometry"]["Coordinates"]["Cartesians"]
+    record["coords"][0] = [[x * BOHR_TO_ANGSTROM, y * BOHR_TO_ANGSTROM, z * BOHR_TO_ANGSTROM]
+                           for _, x, y, z in cartesians]
+
+    grads = geometry.get("Nuclear_Gradient") or [{}]
+    grad = grads[0].get("grad")
+    record["gradient_norm"] = grads[0].get("gradNorm", np.nan)
+    if grad:
+        record["gradient"][0] = np.asarray(grad, dtype="f8").reshape(-1, 3)
+    else:
+        record["gradient"] = np.nan
+
+    mulliken = geometry.get("Mulliken_Population_Analysis") or [{}]
+    charges = mulliken[0].get("AtomicCharges")
+    if charges:
+        record["charges"][0] = [c[0] if isinstance(c, list) else c for c in charges]
+    else:
+        record["charges"] = np.nan
+    return record
+
+
+class StepWriter:
+    """
+    逐条追加写入 .steps.npy
+
+    记录先写入 <文件名>.part，关闭时在前面加上 .npy 文件头(此时才知道记录数)。
+    """
+    def __init__(self, path: Path):
+        """
+        参数
+        ----------
+        path : Path
+            输出文件，通常为 <working_dir>/<basename>.steps.npy
+        """
+        self.path = Path(path)
+        self.part = self.path.with_name(self.path.name + ".part")
+        self.dtype = None
+        self.count = 0
+        self._f = None
+
+    def append(self, geometry: Dict[str, Any]) -> None:
+        """追加一个构型，原子数由第一个构型确定"""
+        if self.dtype is None:
+            self.dtype = step_dtype(len(geometry["Geometry"]["Coordinates"]["Cartesians"]))
+            self._f = open(self.part, "wb")
+        geometry_record(geometry, self.dtype).tofile(self._f)
+        self.count += 1
+
+    def close(self) -> Optional[Path]:
+        """
+        写出最终的 .npy 文件
+
+        返回
+        ----------
+        Optional[Path]
+            输出文件，没有任何构型时为None
+        """
+        if self._f is None:
+            return None
+        self._f.close()
+        self._f = None
+        header = {"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                  "shape": (self.count,)}
+        with open(self.path, "wb") as out, open(self.part, "rb") as body:
+            np.lib.format.write_array_header_1_0(out, header)
+            shutil.copyfileobj(body, out)
+        os.unlink(self.part)
+        return self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._f is not None:
+            self._f.close()
+            os.unlink(self.part)
+
+
+def load_steps(path: Path) -> np.ndarray:
+    """以内存映射方式读取 .steps.npy"""
+    return np.load(path, mmap_mode="r")
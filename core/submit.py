@@ -0,0 +1,357 @@
+"""
+Slurm 提交脚本生成器 - 以作业数组或"每个分配打包N个输入"的方式批量提交ORCA计算
+"""
+import os
+import sys
+import json
+import shlex
+import subprocess
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+SCRIPT_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node={ntasks_per_node}
+#SBATCH --output={log_dir}/%x_%A_%a.log
+#SBATCH --partition={partition}
+#SBATCH --array=0-{last_index}{array_limit}
+{extra}
+# load the environment
+module purge
+{env_line}
+# ORCA并行运行时要求以绝对路径调用
+ORCA=$(command -v {orca_bin})
+
+cd {work_dir}
+# 数组下标 -> 结构映射见 {mapping_name}
+mapfile -t inputs < <(sed -n "$((SLURM_ARRAY_TASK_ID + 1))p" {list_name} | tr '\\t' '\\n')
+
+cd {task_dir}
+for input in "${{inputs[@]}}"; do
+    name=$(basename "$input" .xyz)
+    {orca_line} > "$name.out" &
+done
+wait
+{post_block}"""
+
+POST_TEMPLATE = """
+# post 阶段
+cd {work_dir}
+for input in "${{inputs[@]}}"; do
+    {python} {main_py} -t {task} -p post -i "$input"{post_args}
+done
+"""
+
+
+QUEUE_SCRIPT_TEMPLATE = """#!/bin/bash
+#SBATCH --job-name={job_name}
+#SBATCH --nodes=1
+#SBATCH --ntasks-per-node={ntasks_per_node}
+#SBATCH --output={log_dir}/%x_%A_%a.log
+#SBATCH --partition={partition}
+#SBATCH --array=0-{last_index}{array_limit}
+{extra}
+# load the environment
+module purge
+{env_line}
+# ORCA并行运行时要求以绝对路径调用
+export ORCA_BIN=$(command -v {orca_bin})
+
+# 每个数组任务是一个队列工作进程，从共享队列领取计算直到队列为空
+{python} {workqueue_py} work {queue_dir} -j {slots}{work_args}
+"""
+
+
+def post_arguments(args: Any) -> List[str]:
+    """
+    根据提交命令的参数生成作业内 post 阶段需要的命令行参数
+    (--cache / --db / --fast / --stream / --trace)，路径转换为绝对路径
+    """
+    post_args = []
+    if getattr(args, "cache", None):
+        post_args += ["--cache", str(Path(args.cache).resolve()), "--cache-size", str(args.cache_size)]
+    if getattr(args, "db", None):
+        post_args += ["--db", str(Path(args.db).resolve())]
+    for flag in ("fast", "stream", "trace"):
+        if getattr(args, flag, False):
+            post_args.append(f"--{flag}")
+    return post_args
+
+
+def cores_per_job(ntasks_per_node: int, pack: int) -> int:
+    """
+    计算每个子任务的核数，使一个分配内的 pack 个任务正好占满 --ntasks-per-node
+
+    参数
+    ----------
+    ntasks_per_node : int
+        每个节点的任务数(核数)
+    pack : int
+        每个分配打包的输入数
+    """
+    if pack < 1 or pack > ntasks_per_node:
+        raise ValueError(f"每个分配打包的输入数必须在 1 到 {ntasks_per_node} 之间")
+    return ntasks_per_node // pack
+
+
+class SlurmSubmitter:
+    """
+    生成并提交 Slurm 作业数组脚本
+
+    每个数组下标对应一组(pack个)结构，组内的ORCA计算在同一分配中并发运行。
+    """
+    def __init__(self, task_type: str, ntasks_per_node: int = 16, partition: str = "sdicnormal",
+                 env_script: Optional[str] = None, orca_bin: Optional[str] = None,
+                 work_dir: Optional[Path] = None, run_post: bool = True,
+                 array_limit: Optional[int] = None, extra_directives: Sequence[str] = (),
+                 journal: Optional[Path] = None, scratch: bool = False,
+                 scratch_dir: Optional[str] = None, gbw_store: Optional[Path] = None,
+                 post_args: Sequence[str] = ()):
+        """
+        参数
+        ----------
+        task_type : str
+            任务类型，输入文件位于 <work_dir>/<task_type>
+        ntasks_per_node : int, optional
+            每个节点的任务数，默认为16
+        partition : str, optional
+            Slurm 分区，默认为 sdicnormal
+        env_script : Optional[str], optional
+            ORCA环境脚本(env.sh)路径
+        orca_bin : Optional[str], optional
+            ORCA可执行文件，默认为环境变量 ORCA_BIN 或 orca
+        work_dir : Optional[Path], optional
+            提交目录，默认为当前目录
+        run_post : bool, optional
+            ORCA结束后是否在作业内执行 post 阶段，默认为True
+        array_limit : Optional[int], optional
+            同时运行的数组任务上限(%N)
+        extra_directives : Sequence[str], optional
+            额外的 #SBATCH 参数，如 "--time=24:00:00"
+        journal : Optional[Path], optional
+            批量状态日志，作业内的 post 阶段将结果写入该日志
+        scratch : bool, optional
+            是否通过 core.scratch 在计算节点本地暂存目录中运行ORCA，默认为False
+        scratch_dir : Optional[str], optional
+            暂存根目录，默认在计算节点上取 $ORCA_SCRATCH、$TMPDIR 或 /tmp
+        gbw_store : Optional[Path], optional
+            内容寻址的 .gbw 存储目录
+        post_args : Sequence[str], optional
+            作业内 post 阶段的其他命令行参数，见 post_arguments
+        """
+        self.task_type = task_type
+        self.ntasks_per_node = ntasks_per_node
+        self.partition = partition
+        self.env_script = env_script
+        self.orca_bin = orca_bin or os.environ.get("ORCA_BIN", "orca")
+        self.work_dir = Path(work_dir or Path.cwd()).resolve()
+        self.task_dir = self.work_dir / task_type
+        self.run_post = run_post
+        self.array_limit = array_limit
+        self.extra_directives = list(extra_directives)
+        self.journal = Path(journal).resolve() if journal else None
+        self.scratch = scratch
+        self.scratch_dir = scratch_dir
+        self.gbw_store = Path(gbw_store).resolve() if gbw_store else None
+        self.post_args = list(post_args)
+
+    def post_command_args(self) -> List[str]:
+        """作业内 post 阶段的命令行参数"""
+        journal = ["--journal", str(self.journal)] if self.journal else []
+        return journal + self.post_args
+
+    def orca_line(self) -> str:
+        """作业脚本中运行一个输入的命令(不含输出重定向)"""
+        if not self.scratch:
+            return '"$ORCA" "$name.inp"'
+        args = [shlex.quote(sys.executable), shlex.quote(str(PROJECT_ROOT / "core" / "scratch.py")),
+                "run", '"$name.inp"', '--orca "$ORCA"']
+        if self.scratch_dir:
+            args.append(f"--scratch-dir {shlex.quote(self.scratch_dir)}")
+        if self.gbw_store:
+            args.append(f"--gbw-store {shlex.quote(str(self.gbw_store))}")
+        return " ".join(args)
+
+    def write(self, inputs: Sequence[Path], pack: int = 1, job_name: Optional[str] = None) -> Path:
+        """
+        生成作业数组脚本、下标列表文件和映射文件
+
+        参数
+        ----------
+        inputs : Sequence[Path]
+            已完成 pre 阶段的结构文件(XYZ)
+        pack : int, optional
+            每个分配打包的输入数，默认为1(纯作业数组)
+        job_name : Optional[str], optional
+            作业名，默认为 orca_<task_type>
+
+        返回
+        ----------
+        Path
+            生成的 .slurm 脚本路径
+        """
+        cores_per_job(self.ntasks_per_node, pack)
+        if self.task_type == "freq":
+            raise ValueError("数值频率的位移计算请使用 run 阶段，作业数组只处理单个输入的任务")
+        if not inputs:
+            raise ValueError("没有需要提交的结构")
+
+        job_name = job_name or f"orca_{self.task_type}"
+        inputs = [Path(f).resolve() for f in inputs]
+        groups = [inputs[i:i + pack] for i in range(0, len(inputs), pack)]
+
+        self.task_dir.mkdir(parents=True, exist_ok=True)
+        log_dir = self.task_dir / "logs"
+        log_dir.mkdir(exist_ok=True)
+
+        list_file = self.task_dir / f"{job_name}.list"
+        list_file.write_text("".join("\t".join(str(f) for f in g) + "\n" for g in groups))
+
+        mapping_file = self.task_dir / f"{job_name}.map.json"
+        mapping = {
+            "task": self.task_type,
+            "pack": pack,
+            "ncores": self.ntasks_per_node // pack,
+            "array": {str(i): [str(f) for f in g] for i, g in enumerate(groups)},
+        }
+        mapping_file.write_text(json.dumps(mapping, indent=2, ensure_ascii=False))
+
+        post_block = ""
+        if self.run_post:
+            post_block = POST_TEMPLATE.format(
+                work_dir=shlex.quote(str(self.work_dir)),
+                python=shlex.quote(sys.executable),
+                main_py=shlex.quote(str(PROJECT_ROOT / "main.py")),
+                task=self.task_type,
+                post_args="".join(f" {shlex.quote(a)}" for a in self.post_command_args()),
+            )
+
+        script = SCRIPT_TEMPLATE.format(
+            job_name=job_name,
+            ntasks_per_node=self.ntasks_per_node,
+            log_dir=log_dir,
+            partition=self.partition,
+            last_index=len(groups) - 1,
+            array_limit=f"%{self.array_limit}" if self.array_limit else "",
+            extra="".join(f"#SBATCH {d}\n" for d in self.extra_directives),
+            env_line=f"source {shlex.quote(self.env_script)}" if self.env_script else "",
+            orca_bin=shlex.quote(self.orca_bin),
+            work_dir=shlex.quote(str(self.work_dir)),
+            mapping_name=mapping_file.name,
+            list_name=shlex.quote(str(list_file)),
+            task_dir=shlex.quote(str(self.task_dir)),
+            orca_line=self.orca_line(),
+            post_block=post_block,
+        )
+        script_file = self.task_dir / f"{job_name}.slurm"
+        script_file.write_text(script)
+        return script_file
+
+    def write_workers(self, queue_dir: Path, nworkers: int, pack: int = 1,
+                      job_name: Optional[str] = None) -> Path:
+        """
+        生成队列工作进程的作业数组脚本(core.workqueue)，输入文件需已加入队列
+
+        参数
+        ----------
+        queue_dir : Path
+            共享队列目录
+        nworkers : int
+            数组任务数(同时从队列领取计算的节点数)
+        pack : int, optional
+            每个工作进程同时运行的计算数，默认为1
+        job_name : Optional[str], optional
+            作业名，默认为 orca_<task_type>_queue
+
+        返回
+        ----------
+        Path
+            生成的 .slurm 脚本路径
+        """
+        cores_per_job(self.ntasks_per_node, pack)
+        job_name = job_name or f"orca_{self.task_type}_queue"
+        self.task_dir.mkdir(parents=True, exist_ok=True)
+        log_dir = self.task_dir / "logs"
+        log_dir.mkdir(exist_ok=True)
+
+        work_args = ""
+        if self.journal:
+            work_args += f" --journal {shlex.quote(str(self.journal))}"
+        if self.scratch:
+            work_args += " --scratch"
+            if self.scratch_dir:
+                work_args += f" --scratch-dir {shlex.quote(self.scratch_dir)}"
+            if self.gbw_store:
+                work_args += f" --gbw-store {shlex.quote(str(self.gbw_store))}"
+
+        script = QUEUE_SCRIPT_TEMPLATE.format(
+            job_name=job_name,
+            ntasks_per_node=self.ntasks_per_node,
+            log_dir=log_dir,
+            partition=self.partition,
+            last_index=max(1, nworkers) - 1,
+            array_limit=f"%{self.array_limit}" if self.array_limit else "",
+            extra="".join(f"#SBATCH {d}\n" for d in self.extra_directives),
+            env_line=f"source {shlex.quote(self.env_script)}" if self.env_script else "",
+            orca_bin=shlex.quote(self.orca_bin),
+            python=shlex.quote(sys.executable),
+            workqueue_py=shlex.quote(str(PROJECT_ROOT / "core" / "workqueue.py")),
+            queue_dir=shlex.quote(str(Path(queue_dir).resolve())),
+            slots=pack,
+            work_args=work_args,
+        )
+        script_file = self.task_dir / f"{job_name}.slurm"
+        script_file.write_text(script)
+        return script_file
+
+    def submit(self, script_file: Path) -> str:
+        """
+        通过 sbatch 提交脚本(可用环境变量 SBATCH 指定替身命令)，返回作业号
+        """
+        sbatch = os.environ.get("SBATCH", "sbatch")
+        result = subprocess.run(
+            [sbatch, "--parsable", str(script_file)],
+            capture_output=True, text=True, check=True,
+        )
+        job_id = result.stdout.strip().split(";")[0]
+
+        # 队列工作进程脚本没有映射文件
+        mapping_file = script_file.with_suffix(".map.json")
+        if mapping_file.exists():
+            mapping = json.loads(mapping_file.read_text())
+            mapping["job_id"] = job_id
+            mapping_file.write_text(json.dumps(mapping, indent=2, ensure_ascii=False))
+        return job_id
+
+
+def load_mapping(mapping_file: Path) -> Dict[int, List[Path]]:
+    """
+    读取数组下标 -> 结构文件的映射，供 post 阶段使用
+    """
+    mapping = json.loads(Path(mapping_file).read_text())
+    return {int(i): [Path(f) for f in files] for i, files in mapping["array"].items()}
+
+
+def job_status(job_id: str) -> Dict[int, str]:
+    """
+    通过 squeue 查询作业数组各下标的状态(可用环境变量 SQUEUE 指定替身命令)
+
+    返回
+    ----------
+    Dict[int, str]
+        数组下标 -> 状态(PENDING / RUNNING ...)；已结束的下标不在结果中
+    """
+    squeue = os.environ.get("SQUEUE", "squeue")
+    result = subprocess.run(
+        [squeue, "-h", "-r", "-j", str(job_id), "-o", "%i %T"],
+        capture_output=True, text=True, check=True,
+    )
+    status = {}
+    for line in result.stdout.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and "_" in fields[0]:
+            status[int(fields[0].rsplit("_", 1)[1])] = fields[1]
+    return status
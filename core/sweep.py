@@ -0,0 +1,300 @@
+"""
+方法/基组参数扫描 - 将方法 × 基组 × 色散校正的网格展开为每个结构的计算，
+汇总为各层级之间的能量对比表
+
+同一方法和色散校正的层级按基组大小排序: 较小基组的 .gbw 通过 MORead 投影作为
+较大基组的初始猜测(opt 任务同时使用较小基组优化后的结构)，因此计算分批进行，
+第 k 批包含每组中第 k 小的基组；同一批内相同层级的计算连续提交。每个输入结构
+只读取一次，各层级共用。
+
+目录结构: sweep/<方法>_<基组>_<色散校正>/<basename>.*，结果写入 sweep/sweep.json
+和 sweep/sweep.csv。
+
+用法:
+    python main.py -t sp -p sweep -i conformers/ --methods B3LYP PBE0 --basis-sets def2-SVP def2-TZVP --dispersions D3BJ D4
+"""
+import re
+import sys
+import csv
+import json
+import time
+import itertools
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.extract import extract, read_last_frame
+from core.funnel import HARTREE_TO_KCAL
+from core.scheduler import LocalScheduler
+
+# 可扫描的任务类型(每个结构得到一个可比较的能量)
+SWEEP_TASKS = ("sp", "opt")
+
+# 基组名称中的 zeta 标记，按从大到小的顺序匹配
+ZETA_PATTERNS = (("5z", 5), ("qz", 4), ("tz", 3), ("6-311", 3), ("sv", 2), ("dz", 2), ("6-31", 2))
+
+
+def basis_rank(basis: str) -> Tuple[int, int]:
+    """
+    按基组名称估计大小，用于排序: (zeta, 极化/弥散函数数)
+
+    例如 def2-SVP < def2-TZVP < def2-TZVPP < ma-def2-TZVPP < def2-QZVP；
+    "none"(复合方法)排在最前，无法识别的基组视为最小基组。
+    """
+    b = basis.lower()
+    if b == "none":
+        return (0, 0)
+    zeta = next((z for pattern, z in ZETA_PATTERNS if pattern in b), 1)
+    extra = int(b.endswith("pp")) + int(b.startswith(("aug-", "ma-")) or b.endswith("d"))
+    return (zeta, extra)
+
+
+def expand_grid(methods: Sequence[str], basis_sets: Sequence[str],
+                dispersions: Sequence[str]) -> List[List[Dict[str, Any]]]:
+    """
+    展开扫描网格
+
+    返回
+    ----------
+    List[List[Dict[str, Any]]]
+        按方法和色散校正分组的层级，组内按基组从小到大排列；
+        每个层级为 name / method / basis_set / dispersion / seed (作为初始猜测的层级名)
+    """
+    groups = []
+    for method, dispersion in itertools.product(methods, dispersions):
+        chain, prev = [], None
+        for basis in sorted(basis_sets, key=basis_rank):
+            name = "_".join(re.sub(r"[^a-z0-9.+-]", "_", s.lower()) for s in (method, basis, dispersion))
+            # 复合方法(基组为 none)自带基组，不作为投影的起点
+            seed = prev["name"] if prev is not None and prev["basis_set"].lower() != "none" else None
+            level = {"name": name, "method": method, "basis_set": basis, "dispersion": dispersion, "seed": seed}
+            chain.append(level)
+            prev = level
+        groups.append(chain)
+    return groups
+
+
+class Sweep:
+    """
+    对一组结构运行方法/基组扫描
+    """
+    def __init__(self, task: str, inputs: Sequence[Path], methods: Sequence[str], basis_sets: Sequence[str],
+                 dispersions: Sequence[str], ncores: int = 1, total_cores: int = 1,
+                 orca_cmd: Optional[str] = None, staging: Optional[Any] = None, cache: Optional[Any] = None,
+                 moread: bool = True, root: Path = Path("sweep")):
+        """
+        参数
+        ----------
+        task : str
+            sp 或 opt
+        inputs : Sequence[Path]
+            结构(XYZ)
+        methods / basis_sets / dispersions : Sequence[str]
+            扫描的方法、基组和色散校正；基组或色散校正为 "none" 时不写该关键词
+        ncores : int, optional
+            每个计算的核数
+        total_cores : int, optional
+            并发运行ORCA的总核数预算
+        orca_cmd : Optional[str], optional
+            ORCA可执行文件，默认见 core.scheduler.find_orca
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)
+        cache : Optional[ResultCache], optional
+            结果缓存，命中的计算不再运行
+        moread : bool, optional
+            是否以较小基组的 .gbw 作为较大基组的初始猜测，默认为True
+        root : Path, optional
+            扫描目录，默认为 sweep/
+        """
+        if task not in SWEEP_TASKS:
+            raise ValueError(f"参数扫描只支持 {'/'.join(SWEEP_TASKS)} 任务: {task}")
+        self.task = task
+        self.inputs = [Path(f) for f in inputs]
+        self.groups = expand_grid(methods, basis_sets, dispersions)
+        self.levels = {level["name"]: level for chain in self.groups for level in chain}
+        self.ncores = ncores
+        self.scheduler = LocalScheduler(total_cores, orca_cmd, staging=staging)
+        self.cache = cache
+        self.moread = moread
+        self.root = Path(root)
+        self.results = {f.stem: {} for f in self.inputs}
+        self.level_stats = {}
+        self._structures = {}
+        self._workflows = {}
+
+    def _structure(self, xyz_file: Path) -> Any:
+        """读取结构，同一文件只解析一次"""
+        from opi.input.structures.structure import Structure
+        key = str(xyz_file)
+        if key not in self._structures:
+            self._structures[key] = Structure.from_xyz(xyz_file)
+        return self._structures[key]
+
+    def _seed(self, level: Dict[str, Any], name: str) -> Tuple[Optional[Path], Optional[Path]]:
+        """初始猜测的 .gbw 和起始结构(opt)，种子层级失败时为None"""
+        if level["seed"] is None or self.results[name].get(level["seed"], {}).get("energy") is None:
+            return None, None
+        seed_dir = self.root / level["seed"]
+        gbw = seed_dir / f"{name}.gbw"
+        xyz = seed_dir / f"{name}.xyz" if self.task == "opt" else None
+        return (gbw if self.moread and gbw.exists() else None), (xyz if xyz and xyz.exists() else None)
+
+    def prepare(self, level: Dict[str, Any]) -> List[Path]:
+        """写入一个层级所有结构的输入文件，返回需要运行的输入"""
+        from importlib import import_module
+        workflow_class = getattr(import_module(f"task.{self.task}"), f"{self.task}Workflow")
+        level_dir = self.root / level["name"]
+
+        inputs = []
+        for f in self.inputs:
+            guess, xyz = self._seed(level, f.stem)
+            # 结构无法读取或关键词被拒绝时只记录该结构在该层级失败
+            try:
+                workflow = workflow_class(basename=f.stem, working_dir=level_dir)
+                workflow.structure = self._structure(xyz or f)
+                workflow.setup_calculator(ncores=self.ncores)
+                workflow.set_level(level["method"], level["basis_set"], level["dispersion"])
+                if self.cache is not None:
+                    workflow.attach_cache(self.cache)
+                if guess is not None and not workflow.cache_hit:
+                    workflow.set_guess(guess)
+                getattr(workflow, f"pre_{self.task}")()
+            except Exception as e:
+                self.results[f.stem][level["name"]] = {
+                    "seeded": False, "cache_hit": False, "energy": None, "wall_time": None,
+                    "error": f"{type(e).__name__}: {e}",
+                }
+                continue
+            self._workflows[(level["name"], f.stem)] = workflow
+            self.results[f.stem][level["name"]] = {"seeded": guess is not None, "cache_hit": workflow.cache_hit}
+            if not workflow.cache_hit:
+                inputs.append(level_dir / f"{f.stem}.inp")
+        return inputs
+
+    def collect(self, level: Dict[str, Any], jobs: Dict[str, Any]) -> None:
+        """读取一个层级的能量，opt 任务的优化结构写入 <basename>.xyz 供下一个基组使用"""
+        level_dir = self.root / level["name"]
+        for f in self.inputs:
+            workflow = self._workflows.pop((level["name"], f.stem), None)
+            if workflow is None:
+                continue
+            result = extract(level_dir, f.stem, fields=("terminated", "scf_converged", "opt_converged", "final_energy"))
+            ok = result["terminated"] and result["scf_converged"] and result["final_energy"] is not None
+            if self.task == "opt":
+                ok = ok and result["opt_converged"]
+            record = self.results[f.stem][level["name"]]
+            record["energy"] = result["final_energy"] if ok else None
+            job = jobs.get(f.stem)
+            record["wall_time"] = job.wall_time if job is not None else None
+            if ok and self.task == "opt":
+                frame = read_last_frame(level_dir / f"{f.stem}_trj.xyz")
+                if frame is not None:
+                    # 命中缓存时 <basename>.xyz 是从缓存恢复的文件，先删除再写入
+                    (level_dir / f"{f.stem}.xyz").unlink(missing_ok=True)
+                    (level_dir / f"{f.stem}.xyz").write_text(frame)
+            if ok:
+                workflow.record_success()
+
+    def run(self) -> Dict[str, Any]:
+        """
+        分批运行所有层级，结果写入 <root>/sweep.json 和 <root>/sweep.csv
+
+        返回
+        ----------
+        Dict[str, Any]
+            levels (层级设置与统计) / order (层级顺序) / results (每个结构在各层级的能量)
+        """
+        order = []
+        for wave in itertools.zip_longest(*self.groups):
+            wave = [level for level in wave if level is not None]
+            start = time.perf_counter()
+            # 同一层级的计算连续提交
+            inputs = {level["name"]: self.prepare(level) for level in wave}
+            queued = [inp for level in wave for inp in inputs[level["name"]]]
+            jobs = self.scheduler.run(queued) if queued else []
+            by_level = {}
+            for job in jobs:
+                by_level.setdefault(job.inp_file.parent.name, {})[job.inp_file.stem] = job
+            for level in wave:
+                level_jobs = by_level.get(level["name"], {})
+                self.collect(level, level_jobs)
+                energies = [r[level["name"]]["energy"] for r in self.results.values()]
+                self.level_stats[level["name"]] = {
+                    "n_ok": sum(e is not None for e in energies),
+                    "n_failed": sum(e is None for e in energies),
+                    "n_seeded": sum(r[level["name"]]["seeded"] for r in self.results.values()),
+                    "core_hours": sum((j.wall_time or 0.0) * j.ncores for j in level_jobs.values()) / 3600,
+                    "mean_wall_time": (sum(j.wall_time or 0.0 for j in level_jobs.values()) / len(level_jobs)
+                                       if level_jobs else None),
+                }
+                order.append(level["name"])
+            print(f"已完成 {len(wave)} 个层级: {', '.join(level['name'] for level in wave)} "
+                  f"({time.perf_counter() - start:.1f} s)")
+
+        summary = {
+            "task": self.task,
+            "levels": {name: {**self.levels[name], **self.level_stats[name]} for name in order},
+            "order": order,
+            "results": self.results,
+        }
+        self.root.mkdir(parents=True, exist_ok=True)
+        (self.root / "sweep.json").write_text(json.dumps(summary, indent=2, ensure_ascii=False))
+        with open(self.root / "sweep.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["structure"] + order)
+            for name, levels in self.results.items():
+                writer.writerow([name] + [levels.get(level, {}).get("energy") for level in order])
+        return summary
+
+
+def relative_energies(summary: Dict[str, Any], level: str) -> Dict[str, float]:
+    """一个层级中各结构相对最低能量结构的能量(kcal/mol)"""
+    energies = {name: r[level]["energy"] for name, r in summary["results"].items()
+                if r.get(level, {}).get("energy") is not None}
+    if not energies:
+        return {}
+    e_min = min(energies.values())
+    return {name: (e - e_min) * HARTREE_TO_KCAL for name, e in energies.items()}
+
+
+def report(summary: Dict[str, Any], reference: Optional[str] = None) -> None:
+    """
+    打印层级对比表: 每个层级的耗时、初始猜测数，以及相对能量与参考层级的平均绝对偏差
+
+    reference 默认为最后运行的层级(最大基组)
+    """
+    order = summary["order"]
+    if not order:
+        return
+    reference = reference or order[-1]
+    ref = relative_energies(summary, reference)
+    multi = len(summary["results"]) > 1
+
+    print(f"{'层级':<36}{'成功':>6}{'失败':>6}{'MORead':>8}{'平均耗时(s)':>14}{'核时':>10}"
+          + (f"{'MAD(kcal/mol)':>16}" if multi else ""))
+    for name in order:
+        stats = summary["levels"][name]
+        wall = f"{stats['mean_wall_time']:.2f}" if stats["mean_wall_time"] is not None else "-"
+        line = (f"{name:<36}{stats['n_ok']:>6}{stats['n_failed']:>6}{stats['n_seeded']:>8}"
+                f"{wall:>14}{stats['core_hours']:>10.3f}")
+        if multi:
+            rel = relative_energies(summary, name)
+            common = [n for n in rel if n in ref]
+            mad = sum(abs(rel[n] - ref[n]) for n in common) / len(common) if common else None
+            line += f"{mad:>16.2f}" if mad is not None else f"{'-':>16}"
+        print(line)
+
+    # 结构 × 层级: 多个结构时为相对能量(kcal/mol)，单个结构时为绝对能量(Hartree)
+    print(f"\n{'相对能量 (kcal/mol)' if multi else '能量 (Hartree)'}，MAD 参考层级: {reference}")
+    print(f"{'结构':<24}" + "".join(f"{i:>14}" for i in range(1, len(order) + 1)))
+    rel = {name: relative_energies(summary, name) for name in order}
+    for structure, levels in summary["results"].items():
+        cells = []
+        for name in order:
+            value = rel[name].get(structure) if multi else levels.get(name, {}).get("energy")
+            cells.append(f"{value:>14.2f}" if multi and value is not None
+                         else f"{value:>14.6f}" if value is not None else f"{'-':>14}")
+        print(f"{structure:<24}" + "".join(cells))
+    print("列: " + "  ".join(f"{i}={name}" for i, name in enumerate(order, 1)))
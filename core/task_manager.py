@@ -9,23 +9,76 @@ from typing import Any, Optional
 # 添加项目根目录到Python路径
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
+def open_cache(args: Any) -> Optional[Any]:
+    """根据命令行参数打开结果缓存，未指定 --cache 时返回None"""
+    if not getattr(args, "cache", None):
+        return None
+    from core.cache import ResultCache
+    return ResultCache(args.cache, max_bytes=int(args.cache_size * 1024**3))
+
+def open_warehouse(args: Any) -> Optional[Any]:
+    """根据命令行参数打开结果仓库，未指定 --db 时返回None"""
+    if not getattr(args, "db", None):
+        return None
+    from core.warehouse import Warehouse
+    return Warehouse(args.db)
+
+def open_cost_model(args: Any) -> Optional[Any]:
+    """根据命令行参数加载耗时模型，未指定 --cost-model 时返回None"""
+    if not getattr(args, "cost_model", None):
+        return None
+    from core.cost_model import CostModel
+    return CostModel.load(args.cost_model)
+
+def open_dedup(args: Any) -> Optional[Any]:
+    """根据命令行参数创建(或读取)结构去重索引，未指定 --dedup 时返回None"""
+    if not getattr(args, "dedup", None):
+        return None
+    from core.dedup import DedupIndex
+    if getattr(args, "dedup_index", None):
+        return DedupIndex.load(args.dedup_index, args.dedup)
+    return DedupIndex(args.dedup)
+
+def stage_kwargs(args: Any) -> dict:
+    """根据命令行参数生成传给 pre_*/post_* 方法的关键字参数"""
+    kwargs = {}
+    if args.process == "post" and args.task in ("sp", "opt") and getattr(args, "fast", False):
+        kwargs["fast"] = True
+    if args.process == "post" and args.task == "opt" and getattr(args, "stream", False):
+        kwargs["stream"] = True
+    return kwargs
+
 def run_task(args: Any) -> Optional[Any]:
     """执行指定任务"""
     try:
-        workflow = create_workflow(args.task, args.input, args.ncores)
+        workflow = create_workflow(args.task, args.input, args.ncores, cache=open_cache(args),
+                                   warehouse=open_warehouse(args), cost_model=open_cost_model(args),
+                                   trace=getattr(args, "trace", False))
         method = getattr(workflow, f"{args.process}_{args.task}")
-        return method()
+        try:
+            with workflow.span(f"{args.process}_{args.task}"):
+                return method(**stage_kwargs(args))
+        finally:
+            workflow.save_trace(orca_timings=args.process == "post")
     except Exception as e:
         print(f"任务执行失败: {e}")
         return None
 
-def create_workflow(task_type: str, input_file: str, ncores: int = 1) -> Any:
+def create_workflow(task_type: str, input_file: str, ncores: int = 1, cache: Optional[Any] = None,
+                    warehouse: Optional[Any] = None, cost_model: Optional[Any] = None,
+                    trace: bool = False) -> Any:
     """创建工作流实例
     
     命名规则说明：
     - task目录下的.py文件必须命名为对应的任务类型（如sp.py、opt.py）
     - 每个.py文件中必须包含一个名为"{任务类型}Workflow"的类
     - 例如：sp.py中必须定义spWorkflow类，opt.py中必须定义optWorkflow类
+
+    若给定结果缓存(core.cache.ResultCache)，在写入输入文件之前检查缓存，
+    命中时将已有计算结果链接到工作目录，pre 阶段跳过写入。
+    若给定结果仓库(core.warehouse.Warehouse)，post 阶段成功后写入结构化记录。
+    若给定耗时模型(core.cost_model.CostModel)，ncores 作为上限，由模型为每个结构选择核数。
+    trace 为True时开启计时插桩(core.trace)，结构读取和计算器设置也计入。
     """
     module = importlib.import_module(f"task.{task_type}")
     workflow_class = getattr(module, f"{task_type}Workflow")
@@ -34,9 +87,15 @@ def create_workflow(task_type: str, input_file: str, ncores: int = 1) -> Any:
         basename=Path(input_file).stem,
         working_dir=Path(task_type)
     )
+    if trace:
+        workflow.enable_tracing()
     
     workflow.setup_structure(xyz_file=input_file)
-    workflow.setup_calculator(ncores=ncores)
+    workflow.setup_calculator(ncores=ncores, cost_model=cost_model)
+
+    if cache is not None:
+        workflow.attach_cache(cache)
+    workflow.warehouse = warehouse
     
     return workflow
 
@@ -0,0 +1,134 @@
+"""
+模板化批量输入写入 - pre 阶段不为每个结构创建 opi Calculator
+
+同一任务类型的输入文件只有 "* xyz" 坐标块不同。第一个结构仍走 Calculator 路径
+生成输入，以其关键词、%pal、%output 等部分作为模板，其余结构只格式化坐标行，
+格式与 opi 的 Atom.format_orca 一致；写入前用第一个结构校验模板输出与
+Calculator 输出逐字节相同。
+"""
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.task_manager import create_workflow
+
+try:
+    from opi.input.structures.atom import FMT_COORD
+except ImportError:
+    FMT_COORD = "30.16f"
+
+
+def read_xyz_atoms(xyz_file: Path) -> List[Tuple[str, float, float, float]]:
+    """读取单帧XYZ文件的原子行"""
+    lines = Path(xyz_file).read_text().splitlines()
+    natoms = int(lines[0].split()[0])
+    atoms = []
+    for line in lines[2:2 + natoms]:
+        el, x, y, z = line.split()[:4]
+        atoms.append((el.capitalize(), float(x), float(y), float(z)))
+    return atoms
+
+
+class InputTemplate:
+    """
+    ORCA 输入文件模板: 坐标块之前和之后的文本固定，只替换原子行
+    """
+    def __init__(self, head: str, tail: str):
+        """
+        参数
+        ----------
+        head : str
+            直到并包含 "* xyz <charge> <mult>" 行的文本
+        tail : str
+            从坐标块结束的 "*" 行开始到文件末尾的文本
+        """
+        self.head = head
+        self.tail = tail
+
+    @classmethod
+    def from_input(cls, text: str) -> "InputTemplate":
+        """从一个已写好的输入文件拆分出模板"""
+        lines = text.splitlines(keepends=True)
+        start = next(i for i, line in enumerate(lines) if line.lstrip().lower().startswith("* xyz"))
+        end = next(i for i in range(start + 1, len(lines)) if lines[i].strip() == "*")
+        return cls("".join(lines[:start + 1]), "".join(lines[end:]))
+
+    def render(self, atoms: Sequence[Tuple[str, float, float, float]]) -> str:
+        """生成一个结构的完整输入文本"""
+        body = "".join(
+            f"{el} {x:{FMT_COORD}} {y:{FMT_COORD}} {z:{FMT_COORD}}\n" for el, x, y, z in atoms
+        )
+        return self.head + body + self.tail
+
+
+def build_template(task_type: str, prototype: Path, ncores: int = 1,
+                   kwargs: Optional[Dict[str, Any]] = None) -> InputTemplate:
+    """
+    用 Calculator 路径为第一个结构写入输入，并从中得到模板
+
+    参数
+    ----------
+    task_type : str
+        任务类型，如 sp / opt
+    prototype : Path
+        第一个结构的XYZ文件，其输入文件由 pre_<task> 正常写入
+    ncores : int, optional
+        每个计算的核数
+    kwargs : Optional[Dict[str, Any]], optional
+        传给 pre_<task> 的关键字参数
+
+    异常
+    ----------
+    RuntimeError
+        模板输出与 Calculator 输出不一致时
+    """
+    workflow = create_workflow(task_type, prototype, ncores)
+    getattr(workflow, f"pre_{task_type}")(**(kwargs or {}))
+    text = (workflow.working_dir / f"{workflow.basename}.inp").read_text()
+
+    template = InputTemplate.from_input(text)
+    if template.render(read_xyz_atoms(prototype)) != text:
+        raise RuntimeError(f"模板输出与 Calculator 输出不一致: {prototype}")
+    return template
+
+
+def write_inputs(task_type: str, inputs: Sequence[Path], ncores: int = 1,
+                 kwargs: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    批量写入输入文件，返回与 core.batch.run_structure 相同格式的记录
+
+    参数
+    ----------
+    task_type : str
+        任务类型，如 sp / opt
+    inputs : Sequence[Path]
+        单帧XYZ文件列表
+    ncores : int, optional
+        每个计算的核数
+    kwargs : Optional[Dict[str, Any]], optional
+        传给 pre_<task> 的关键字参数，只用于生成模板
+    """
+    records = []
+    if not inputs:
+        return records
+
+    working_dir = Path(task_type)
+    template = None
+    for i, f in enumerate(inputs):
+        record = {
+            "input": str(f), "basename": Path(f).stem, "status": "ok", "result": None,
+            "error": None, "cache_hit": False, "cost_plan": None,
+        }
+        try:
+            if template is None:
+                template = build_template(task_type, Path(f), ncores, kwargs)
+            else:
+                (working_dir / f"{Path(f).stem}.inp").write_text(template.render(read_xyz_atoms(f)))
+        except (OSError, ValueError, IndexError) as e:
+            record["status"] = "failed"
+            record["error"] = f"{type(e).__name__}: {e}"
+        records.append(record)
+    return records
@@ -0,0 +1,279 @@
+"""
+工作流计时与资源插桩 - 记录每个工作流步骤的耗时、CPU时间和内存，并合并ORCA
+自身的 Calculation_Timings (GTOINT/SCF/SCFGRAD/GSTEP/PROP)
+
+每个步骤是一个 span(上下文管理器)，同一计算各阶段(pre/run/post 可能在不同进程
+中执行)的 span 追加写入 <working_dir>/<basename>.trace.jsonl；可转换为 Chrome
+trace (chrome://tracing 或 Perfetto 打开)，或对一批计算按分子大小汇总。
+
+用法:
+    python main.py -t opt -p pre -i conformers/ --trace
+    python main.py -t opt -p run -i conformers/ --trace
+    python main.py -t opt -p post -i conformers/ --trace
+    python -m core.trace report opt/
+    python -m core.trace chrome opt/water.trace.jsonl
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import contextlib
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ORCA_PHASES = ("GTOINT", "SCF", "SCFGRAD", "GSTEP", "PROP")
+ORCA_SPAN = "orca"
+
+# 汇总时的分子大小分组(原子数上限)
+SIZE_BINS = (10, 25, 50, 100, 200)
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024**2 if hasattr(os, "sysconf") else None
+
+
+def rss_mb() -> float:
+    """当前进程的常驻内存(MB)，无法读取 /proc 时为峰值常驻内存"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, TypeError, IndexError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+class Tracer:
+    """
+    一个计算的 span 记录器
+    """
+    def __init__(self, job: str):
+        """
+        参数
+        ----------
+        job : str
+            计算名称(通常为 basename)
+        """
+        self.job = job
+        self.spans = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attrs):
+        """
+        记录一个步骤的墙钟时间、进程CPU时间和结束时的常驻内存
+
+        参数
+        ----------
+        name : str
+            步骤名称，如 setup_structure / write_input / parse
+        **attrs
+            附加信息，如原子数
+        """
+        record = {"job": self.job, "name": name, "parent": self._stack[-1] if self._stack else None,
+                  "start": time.time(), "attrs": attrs, "pid": os.getpid()}
+        self._stack.append(name)
+        cpu, start = _cpu(), time.perf_counter()
+        try:
+            yield record["attrs"]
+        finally:
+            record["duration"] = time.perf_counter() - start
+            record["cpu"] = _cpu() - cpu
+            record["rss_mb"] = round(rss_mb(), 1)
+            self._stack.pop()
+            self.spans.append(record)
+
+    def record(self, name: str, start: float, duration: float, parent: Optional[str] = None,
+               **attrs) -> None:
+        """记录一个在别处计时的 span (如调度器中运行的ORCA进程)"""
+        self.spans.append({"job": self.job, "name": name, "parent": parent, "start": start,
+                           "duration": duration, "cpu": None, "rss_mb": None, "attrs": attrs,
+                           "pid": os.getpid()})
+
+    def add_orca_timings(self, working_dir: Path, basename: str) -> bool:
+        """
+        读取 <basename>.property.json 中的 Calculation_Timings 和 Calculation_Info，
+        作为 orca span 的子 span 记录(起始时间在导出时按 orca span 排列)
+
+        返回
+        ----------
+        bool
+            是否找到ORCA计时
+        """
+        from core.extract import read_sections
+
+        sections = read_sections(Path(working_dir) / f"{basename}.property.json",
+                                 ("Calculation_Timings", "Calculation_Info"))
+        timings = sections["Calculation_Timings"] or {}
+        info = sections["Calculation_Info"] or {}
+        if not timings:
+            return False
+        size = {"natoms": info.get("NumOfAtoms"), "nbasis": info.get("NumOfBasisFuncts")}
+        for phase in ORCA_PHASES:
+            if phase in timings:
+                self.record(phase, None, float(timings[phase]), parent=ORCA_SPAN, category="orca", **size)
+        return True
+
+    def save(self, path: Path) -> None:
+        """将本进程记录的 span 追加写入 JSON Lines 文件，并清空"""
+        with open(path, "a") as f:
+            for span in self.spans:
+                f.write(json.dumps(span, ensure_ascii=False) + "\n")
+        self.spans = []
+
+
+def record_job(job: Any) -> Path:
+    """
+    将调度器中已结束的ORCA任务(core.scheduler.OrcaJob)作为 orca span 追加到
+    <输入文件名>.trace.jsonl，ORCA内部各阶段在 post 阶段合并到该 span 内
+
+    返回
+    ----------
+    Path
+        计时文件
+    """
+    tracer = Tracer(job.inp_file.stem)
+    # OrcaJob 以 perf_counter 计时，换算为墙钟时间
+    start = time.time() - (time.perf_counter() - job.start_time)
+    tracer.record(ORCA_SPAN, start, job.wall_time or 0.0, ncores=job.ncores, returncode=job.returncode)
+    trace_file = job.inp_file.with_suffix(".trace.jsonl")
+    tracer.save(trace_file)
+    return trace_file
+
+
+def load(path: Path) -> List[Dict[str, Any]]:
+    """读取一个 .trace.jsonl 文件"""
+    spans = []
+    with open(path) as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                continue
+    return spans
+
+
+def to_chrome(spans: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    转换为 Chrome trace 事件格式 (ph="X" 完整事件，时间单位 μs)
+
+    ORCA内部阶段没有起始时间，依次排列在最后一个 orca span 内；没有 orca span 时
+    排列在第一个之前记录的 span 之前。
+    """
+    spans = list(spans)
+    orca_start = max((s["start"] for s in spans if s["name"] == ORCA_SPAN and s["start"]), default=None)
+    timed = [s["start"] for s in spans if s["start"]]
+    phases_total = sum(s["duration"] for s in spans if s["start"] is None)
+    cursor = orca_start if orca_start is not None else (min(timed) if timed else 0.0) - phases_total
+
+    events = []
+    for s in spans:
+        start = s["start"]
+        if start is None:
+            start, cursor = cursor, cursor + s["duration"]
+        args = {k: v for k, v in (s.get("attrs") or {}).items() if v is not None}
+        if s.get("cpu") is not None:
+            args["cpu_s"] = round(s["cpu"], 6)
+        if s.get("rss_mb") is not None:
+            args["rss_mb"] = s["rss_mb"]
+        events.append({
+            "name": s["name"],
+            "cat": "orca" if s["start"] is None or s["name"] == ORCA_SPAN else "workflow",
+            "ph": "X",
+            "ts": start * 1e6,
+            "dur": s["duration"] * 1e6,
+            "pid": s["job"],
+            "tid": "orca" if s["start"] is None or s["name"] == ORCA_SPAN else s.get("pid", 0),
+            "args": args,
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def size_bin(natoms: Optional[int]) -> str:
+    """原子数所在的分组，如 "11-25" """
+    if natoms is None:
+        return "?"
+    lower = 1
+    for upper in SIZE_BINS:
+        if natoms <= upper:
+            return f"{lower}-{upper}"
+        lower = upper + 1
+    return f">{SIZE_BINS[-1]}"
+
+
+def aggregate(files: Iterable[Path]) -> Dict[str, Dict[str, Any]]:
+    """
+    按分子大小汇总一批计算的 span
+
+    返回
+    ----------
+    Dict[str, Dict[str, Any]]
+        分组 -> {jobs: 计算数, spans: {名称: {count, total, mean, max}}, dominant: 耗时最多的ORCA阶段}
+    """
+    groups = {}
+    for path in files:
+        spans = load(path)
+        natoms = next((s["attrs"].get("natoms") for s in spans if s.get("attrs", {}).get("natoms")), None)
+        group = groups.setdefault(size_bin(natoms), {"jobs": 0, "spans": {}})
+        group["jobs"] += 1
+        for s in spans:
+            stats = group["spans"].setdefault(s["name"], {"count": 0, "total": 0.0, "max": 0.0})
+            stats["count"] += 1
+            stats["total"] += s["duration"]
+            stats["max"] = max(stats["max"], s["duration"])
+
+    for group in groups.values():
+        for stats in group["spans"].values():
+            stats["mean"] = stats["total"] / stats["count"]
+        phases = {name: group["spans"][name]["total"] for name in ORCA_PHASES if name in group["spans"]}
+        group["dominant"] = max(phases, key=phases.get) if phases else None
+    return groups
+
+
+def report(groups: Dict[str, Dict[str, Any]]) -> None:
+    """打印每个分子大小分组中各步骤的平均耗时"""
+    def order(key):
+        return (key.startswith(">"), int(key.split("-")[0].lstrip(">")) if key != "?" else 1 << 30)
+
+    for key in sorted(groups, key=order):
+        group = groups[key]
+        print(f"原子数 {key}: {group['jobs']} 个计算，ORCA耗时最多的阶段: {group['dominant'] or '-'}")
+        print(f"  {'步骤':<24}{'次数':>6}{'平均(s)':>12}{'最大(s)':>12}{'合计(s)':>12}")
+        for name, stats in sorted(group["spans"].items(), key=lambda kv: -kv[1]["total"]):
+            print(f"  {name:<24}{stats['count']:>6}{stats['mean']:>12.4f}{stats['max']:>12.4f}{stats['total']:>12.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="工作流计时记录的汇总与导出")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rep = sub.add_parser("report", help="按分子大小汇总目录中的 .trace.jsonl")
+    rep.add_argument("directory", help="任务目录")
+    rep.add_argument("--json", default=None, help="同时将汇总结果写入该JSON文件")
+    chrome = sub.add_parser("chrome", help="转换为 Chrome trace (.trace.json)")
+    chrome.add_argument("traces", nargs="+", help=".trace.jsonl 文件或目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "report":
+        groups = aggregate(sorted(Path(args.directory).rglob("*.trace.jsonl")))
+        report(groups)
+        if args.json:
+            Path(args.json).write_text(json.dumps(groups, indent=2, ensure_ascii=False))
+        return
+
+    for target in args.traces:
+        target = Path(target)
+        files = sorted(target.rglob("*.trace.jsonl")) if target.is_dir() else [target]
+        for path in files:
+            out = path.with_name(path.name[:-len(".jsonl")] + ".json")
+            out.write_text(json.dumps(to_chrome(load(path))))
+            print(f"Chrome trace: {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+优化轨迹批量分析 - 将大量 <basename>_trj.xyz 读入连续的 NumPy 数组，批量计算
+每步RMSD、最大原子位移、能量变化和收敛速度，用于在整个计算批次中找出异常的优化
+
+数组布局(所有轨迹首尾相接):
+    coords        (总原子帧数, 3)   每帧每个原子一行，单位 Å
+    energies      (总帧数,)         每帧能量，单位 Eh
+    frame_offsets (轨迹数 + 1,)     第 i 条轨迹的帧为 [frame_offsets[i], frame_offsets[i+1])
+    natoms        (轨迹数,)         每条轨迹的原子数
+
+用法:
+    python -m core.trajectory opt --cache .trajectory_cache
+"""
+import re
+import sys
+import json
+import hashlib
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+ENERGY_RE = re.compile(r"\bE\s+(-?\d+\.\d+)")
+ARRAYS = ("coords", "energies", "frame_offsets", "natoms")
+
+
+def load_trajectory(trj_file: Path):
+    """
+    读取单个 _trj.xyz
+
+    返回
+    ----------
+    Tuple[List[str], np.ndarray, np.ndarray]
+        元素列表、坐标 (帧数, 原子数, 3) 和每帧能量 (帧数,)，注释行没有能量时为 nan
+    """
+    lines = Path(trj_file).read_text().splitlines()
+    while lines and not lines[-1].strip():
+        lines.pop()
+    if not lines:
+        return [], np.empty((0, 0, 3)), np.empty(0)
+
+    natoms = int(lines[0])
+    nframes = len(lines) // (natoms + 2)
+    frames = np.array(lines[:nframes * (natoms + 2)], dtype=object).reshape(nframes, natoms + 2)
+
+    atoms = np.array(" ".join(frames[:, 2:].ravel()).split()).reshape(nframes, natoms, 4)
+    energies = np.array([float(m.group(1)) if m else np.nan
+                         for m in map(ENERGY_RE.search, frames[:, 1])])
+    return atoms[0, :, 0].tolist(), atoms[:, :, 1:].astype(float), energies
+
+
+def _signature(files: Sequence[Path]) -> str:
+    """由文件路径、修改时间和大小计算缓存签名"""
+    h = hashlib.sha256()
+    for f in files:
+        st = f.stat()
+        h.update(f"{f.resolve()}\0{st.st_mtime_ns}\0{st.st_size}\n".encode())
+    return h.hexdigest()
+
+
+class TrajectorySet:
+    """
+    一批优化轨迹的连续数组表示
+    """
+    def __init__(self, names: List[str], coords: np.ndarray, energies: np.ndarray,
+                 frame_offsets: np.ndarray, natoms: np.ndarray):
+        self.names = names
+        self.coords = coords
+        self.energies = energies
+        self.frame_offsets = frame_offsets
+        self.natoms = natoms
+
+    @classmethod
+    def from_files(cls, files: Iterable[Path]) -> "TrajectorySet":
+        """读取多个 _trj.xyz 并拼接为连续数组，空文件会被跳过"""
+        names, coords, energies, nframes, natoms = [], [], [], [], []
+        for f in files:
+            elements, xyz, e = load_trajectory(f)
+            if not len(e):
+                continue
+            names.append(str(f))
+            coords.append(xyz.reshape(-1, 3))
+            energies.append(e)
+            nframes.append(len(e))
+            natoms.append(len(elements))
+        return cls(
+            names,
+            np.concatenate(coords) if coords else np.empty((0, 3)),
+            np.concatenate(energies) if energies else np.empty(0),
+            np.concatenate([[0], np.cumsum(nframes)]).astype(np.int64),
+            np.array(natoms, dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, files: Sequence[Path], cache_dir: Optional[Path] = None) -> "TrajectorySet":
+        """
+        读取轨迹，给定缓存目录时以 .npy 保存数组并在文件未变化时内存映射读取
+
+        参数
+        ----------
+        files : Sequence[Path]
+            _trj.xyz 文件列表
+        cache_dir : Optional[Path], optional
+            数组缓存目录，默认不缓存
+        """
+        files = sorted(Path(f) for f in files)
+        if cache_dir is None:
+            return cls.from_files(files)
+
+        cache_dir = Path(cache_dir)
+        manifest = cache_dir / "manifest.json"
+        signature = _signature(files)
+        if manifest.exists():
+            meta = json.loads(manifest.read_text())
+            if meta.get("signature") == signature:
+                arrays = {name: np.load(cache_dir / f"{name}.npy", mmap_mode="r") for name in ARRAYS}
+                return cls(meta["names"], **arrays)
+
+        trajs = cls.from_files(files)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        for name in ARRAYS:
+            np.save(cache_dir / f"{name}.npy", getattr(trajs, name))
+        # 清单最后写入，中断时不会留下与数组不一致的缓存
+        manifest.write_text(json.dumps({"signature": signature, "names": trajs.names}))
+        return trajs
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def nframes(self) -> np.ndarray:
+        """每条轨迹的帧数"""
+        return np.diff(self.frame_offsets)
+
+    def _step_rows(self):
+        """
+        相邻两帧对应原子行的索引
+
+        返回
+        ----------
+        Tuple[np.ndarray, np.ndarray, np.ndarray]
+            当前帧的原子行、下一帧对应的原子行，以及每个步的第一行在前两者中的位置
+        """
+        frame_natoms = np.repeat(self.natoms, self.nframes)
+        row_start = np.concatenate([[0], np.cumsum(frame_natoms)[:-1]])
+        # 每条轨迹最后一帧没有下一帧
+        is_step = np.ones(len(frame_natoms), dtype=bool)
+        is_step[self.frame_offsets[1:] - 1] = False
+        step_natoms = frame_natoms[is_step]
+        step_start = row_start[is_step]
+
+        rows = np.repeat(step_start, step_natoms) + (
+            np.arange(step_natoms.sum()) - np.repeat(np.cumsum(step_natoms) - step_natoms, step_natoms)
+        )
+        return rows, rows + np.repeat(step_natoms, step_natoms), np.cumsum(step_natoms) - step_natoms
+
+    def step_metrics(self) -> Dict[str, np.ndarray]:
+        """
+        每个优化步(相邻两帧)的几何和能量变化
+
+        返回
+        ----------
+        Dict[str, np.ndarray]
+            rmsd / max_displacement (Å) / delta_e (Eh)，按轨迹顺序排列；
+            traj 为每步所属轨迹的索引
+        """
+        steps_per_traj = np.maximum(self.nframes - 1, 0)
+        if steps_per_traj.sum() == 0:
+            empty = np.empty(0)
+            return {"traj": empty.astype(np.int64), "rmsd": empty, "max_displacement": empty, "delta_e": empty}
+
+        rows, next_rows, starts = self._step_rows()
+        d = self.coords[next_rows] - self.coords[rows]
+        sq = np.einsum("ij,ij->i", d, d)
+        traj = np.repeat(np.arange(len(self)), steps_per_traj)
+        natoms = self.natoms[traj]
+
+        e = np.asarray(self.energies)
+        last = self.frame_offsets[1:] - 1
+        delta = np.delete(np.diff(e), last[:-1]) if len(e) > 1 else np.empty(0)
+        return {
+            "traj": traj,
+            "rmsd": np.sqrt(np.add.reduceat(sq, starts) / natoms),
+            "max_displacement": np.sqrt(np.maximum.reduceat(sq, starts)),
+            "delta_e": delta,
+        }
+
+    def convergence_stats(self) -> Dict[str, np.ndarray]:
+        """
+        每条轨迹的收敛统计
+
+        返回
+        ----------
+        Dict[str, np.ndarray]
+            nsteps / total_de (Eh) / final_de (Eh) / final_rmsd (Å) / max_step (Å) /
+            energy_rises (能量上升的步数) / rate (|ΔE| 的平均收敛比，>1 表示发散)
+        """
+        steps = self.step_metrics()
+        n = len(self)
+        nsteps = np.maximum(self.nframes - 1, 0)
+        e = np.asarray(self.energies)
+
+        has_steps = nsteps > 0
+        step_end = np.cumsum(nsteps) - 1
+        final_de = np.full(n, np.nan)
+        final_rmsd = np.full(n, np.nan)
+        final_de[has_steps] = steps["delta_e"][step_end[has_steps]]
+        final_rmsd[has_steps] = steps["rmsd"][step_end[has_steps]]
+
+        traj = steps["traj"]
+        max_step = np.zeros(n)
+        np.maximum.at(max_step, traj, steps["max_displacement"])
+        rises = np.bincount(traj, weights=steps["delta_e"] > 0, minlength=n)
+
+        # 相邻两步 |ΔE| 比值的几何平均，衡量线性收敛速度
+        log_de = np.log(np.abs(steps["delta_e"]) + 1e-14)
+        same = traj[1:] == traj[:-1]
+        ratios = np.diff(log_de)[same]
+        ratio_traj = traj[1:][same]
+        counts = np.bincount(ratio_traj, minlength=n)
+        rate = np.full(n, np.nan)
+        sums = np.bincount(ratio_traj, weights=ratios, minlength=n)
+        rate[counts > 0] = np.exp(sums[counts > 0] / counts[counts > 0])
+
+        return {
+            "nsteps": nsteps,
+            "total_de": e[self.frame_offsets[1:] - 1] - e[self.frame_offsets[:-1]],
+            "final_de": final_de,
+            "final_rmsd": final_rmsd,
+            "max_step": max_step,
+            "energy_rises": rises.astype(np.int64),
+            "rate": rate,
+        }
+
+    def pathological(self, max_steps: int = 100, max_rises: int = 3, max_rate: float = 0.95,
+                     max_step: float = 0.5) -> List[Dict[str, Any]]:
+        """
+        找出异常的优化: 步数过多、能量反复上升、收敛过慢或单步位移过大
+
+        返回
+        ----------
+        List[Dict[str, Any]]
+            每条异常轨迹的名称、统计量和触发的规则
+        """
+        stats = self.convergence_stats()
+        rules = {
+            "步数过多": stats["nsteps"] > max_steps,
+            "能量反复上升": stats["energy_rises"] > max_rises,
+            "收敛过慢": np.nan_to_num(stats["rate"]) > max_rate,
+            "单步位移过大": stats["max_step"] > max_step,
+        }
+        flagged = []
+        for i in np.flatnonzero(np.any(list(rules.values()), axis=0)):
+            record = {"name": self.names[i], **{k: v[i].item() for k, v in stats.items()}}
+            record["reasons"] = [name for name, mask in rules.items() if mask[i]]
+            flagged.append(record)
+        return flagged
+
+
+def find_trajectories(roots: Iterable[Path]) -> List[Path]:
+    """递归查找目录中的所有 _trj.xyz"""
+    files = []
+    for root in roots:
+        root = Path(root)
+        files.extend([root] if root.is_file() else root.rglob("*_trj.xyz"))
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ORCA 优化轨迹批量分析")
+    parser.add_argument("roots", nargs="+", help="_trj.xyz 文件或结果目录")
+    parser.add_argument("--cache", default=None, help="数组缓存目录，文件未变化时直接内存映射读取")
+    parser.add_argument("--max-steps", type=int, default=100, help="步数上限，默认为100")
+    parser.add_argument("--max-rises", type=int, default=3, help="能量上升步数上限，默认为3")
+    parser.add_argument("--max-rate", type=float, default=0.95, help="|ΔE| 平均收敛比上限，默认为0.95")
+    args = parser.parse_args(argv)
+
+    trajs = TrajectorySet.load(find_trajectories(args.roots), args.cache)
+    stats = trajs.convergence_stats()
+    print(f"共 {len(trajs)} 条轨迹，{int(trajs.nframes.sum())} 帧，"
+          f"平均步数 {stats['nsteps'].mean() if len(trajs) else 0:.1f}")
+
+    flagged = trajs.pathological(args.max_steps, args.max_rises, args.max_rate)
+    print(f"异常优化 {len(flagged)} 条")
+    for r in flagged:
+        print(f"  {r['name']}: 步数 {r['nsteps']}，ΔE {r['total_de']:.6f} Eh，能量上升 {r['energy_rises']} 次，"
+              f"收敛比 {r['rate']:.2f}，最大位移 {r['max_step']:.3f} Å -> {'、'.join(r['reasons'])}")
+
+
+if __name__ == "__main__":
+    main()
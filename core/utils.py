@@ -1,7 +1,5 @@
 import os
 import sys
 import shutil
-import subprocess
-import imaplib
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Union
\ No newline at end of file
@@ -0,0 +1,307 @@
+"""
+结果仓库 - 将各次计算的能量、电荷、计时和结构写入带索引的 SQLite 数据库
+
+用法:
+    python -m core.warehouse ingest demo/opt --db results.db     # 批量导入已有结果目录
+    python -m core.warehouse query "SELECT basename, final_energy FROM calculations" --db results.db
+"""
+import re
+import sys
+import json
+import time
+import array
+import hashlib
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.cache import xyz_fingerprint
+from core.extract import extract, iter_geometries, read_last_frame, read_sections
+
+BOHR_TO_ANGSTROM = 0.529177210903
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS calculations (
+    id              INTEGER PRIMARY KEY,
+    path            TEXT UNIQUE NOT NULL,
+    basename        TEXT NOT NULL,
+    task            TEXT,
+    structure_hash  TEXT,
+    keywords        TEXT,
+    charge          INTEGER,
+    mult            INTEGER,
+    natoms          INTEGER,
+    nbasis          INTEGER,
+    nelectrons      INTEGER,
+    status          TEXT,
+    scf_converged   INTEGER,
+    opt_converged   INTEGER,
+    final_energy    REAL,
+    nsteps          INTEGER,
+    t_sum           REAL,
+    t_gtoint        REAL,
+    t_scf           REAL,
+    t_scfgrad       REAL,
+    t_gstep         REAL,
+    t_prop          REAL,
+    timings         TEXT,
+    final_geometry  TEXT,
+    ingested_at     REAL
+);
+CREATE TABLE IF NOT EXISTS steps (
+    calc_id         INTEGER NOT NULL REFERENCES calculations(id) ON DELETE CASCADE,
+    step            INTEGER NOT NULL,
+    energy          REAL,
+    grad_norm       REAL,
+    charges         BLOB,
+    PRIMARY KEY (calc_id, step)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_calc_structure ON calculations(structure_hash);
+CREATE INDEX IF NOT EXISTS idx_calc_keywords ON calculations(keywords, structure_hash);
+CREATE INDEX IF NOT EXISTS idx_calc_task ON calculations(task);
+CREATE INDEX IF NOT EXISTS idx_calc_energy ON calculations(final_energy);
+CREATE INDEX IF NOT EXISTS idx_calc_nbasis ON calculations(nbasis);
+"""
+
+XYZ_HEADER_RE = re.compile(r"^\*\s*xyz\s+(-?\d+)\s+(\d+)", re.IGNORECASE | re.MULTILINE)
+TASK_KEYWORDS = {"sp", "opt", "freq", "numfreq", "engrad", "copt", "zopt", "optts"}
+
+
+def parse_input(inp_file: Path) -> Dict[str, Any]:
+    """
+    从ORCA输入文件读取简单关键词、电荷、自旋多重度和初始结构
+    """
+    text = Path(inp_file).read_text()
+    keywords = []
+    for line in text.splitlines():
+        if line.lstrip().startswith("!"):
+            keywords.extend(k.lower() for k in line.lstrip()[1:].split())
+
+    info = {"keywords": keywords, "charge": None, "mult": None, "xyz": None}
+    match = XYZ_HEADER_RE.search(text)
+    if match:
+        info["charge"], info["mult"] = int(match.group(1)), int(match.group(2))
+        block = text[match.end():].split("\n*", 1)[0]
+        info["xyz"] = block.strip()
+    return info
+
+
+def pack_array(values: Optional[Iterable[float]]) -> Optional[bytes]:
+    """将浮点数组压缩为 float64 字节串，用于 steps.charges 列"""
+    if values is None:
+        return None
+    return array.array("d", values).tobytes()
+
+
+def unpack_array(blob: Optional[bytes]) -> Optional[List[float]]:
+    """pack_array 的逆操作"""
+    if blob is None:
+        return None
+    return array.array("d", blob).tolist()
+
+
+def build_record(working_dir: Path, basename: str) -> Dict[str, Any]:
+    """
+    从计算目录构造一条记录(calculations 行和 steps 行)
+
+    参数
+    ----------
+    working_dir : Path
+        计算所在目录
+    basename : str
+        计算的基本名称
+    """
+    working_dir = Path(working_dir)
+    prop_file = working_dir / f"{basename}.property.json"
+    inp_file = working_dir / f"{basename}.inp"
+    # 不载入完整JSON: 顶层字段单独解码，构型逐个解析
+    sections = read_sections(prop_file, ("Calculation_Info", "Calculation_Timings", "Calculation_Status"))
+    info = sections["Calculation_Info"] or {}
+    timings = sections["Calculation_Timings"] or {}
+    status = sections["Calculation_Status"] or {}
+    quick = extract(working_dir, basename)
+
+    inp = parse_input(inp_file) if inp_file.exists() else {"keywords": [], "charge": None, "mult": None, "xyz": None}
+    charge = info.get("Charge", inp["charge"])
+    mult = info.get("Mult", inp["mult"])
+    structure_hash = None
+    if inp["xyz"]:
+        fingerprint = xyz_fingerprint(inp["xyz"], charge or 0, mult or 1)
+        structure_hash = hashlib.sha256(fingerprint.encode()).hexdigest()
+    task = next((k for k in inp["keywords"] if k in TASK_KEYWORDS), None)
+
+    steps = []
+    cartesians = None
+    for istep, geom in enumerate(iter_geometries(prop_file)):
+        spd = geom.get("Single_Point_Data", {})
+        grads = geom.get("Nuclear_Gradient") or [{}]
+        mulliken = geom.get("Mulliken_Population_Analysis") or [{}]
+        charges = mulliken[0].get("AtomicCharges")
+        if charges:
+            charges = [c[0] if isinstance(c, list) else c for c in charges]
+        steps.append((istep, spd.get("FinalEnergy"), grads[0].get("gradNorm"), pack_array(charges)))
+        cartesians = geom["Geometry"]["Coordinates"]["Cartesians"]
+
+    final_geometry = read_last_frame(working_dir / f"{basename}_trj.xyz")
+    if final_geometry is None and cartesians is not None:
+        final_geometry = f"{len(cartesians)}\n\n" + "".join(
+            f"{el} {x * BOHR_TO_ANGSTROM:.8f} {y * BOHR_TO_ANGSTROM:.8f} {z * BOHR_TO_ANGSTROM:.8f}\n"
+            for el, x, y, z in cartesians
+        )
+
+    calc = {
+        "path": str((working_dir / basename).resolve()),
+        "basename": basename,
+        "task": task,
+        "structure_hash": structure_hash,
+        "keywords": " ".join(sorted(inp["keywords"])),
+        "charge": charge,
+        "mult": mult,
+        "natoms": info.get("NumOfAtoms"),
+        "nbasis": info.get("NumOfBasisFuncts"),
+        "nelectrons": info.get("NumOfElectrons"),
+        "status": status.get("Status"),
+        "scf_converged": int(quick["scf_converged"]),
+        "opt_converged": int(quick["opt_converged"]),
+        "final_energy": quick["final_energy"],
+        "nsteps": len(steps),
+        "t_sum": timings.get("SUM"),
+        "t_gtoint": timings.get("GTOINT"),
+        "t_scf": timings.get("SCF"),
+        "t_scfgrad": timings.get("SCFGRAD"),
+        "t_gstep": timings.get("GSTEP"),
+        "t_prop": timings.get("PROP"),
+        "timings": json.dumps(timings),
+        "final_geometry": final_geometry,
+        "ingested_at": time.time(),
+    }
+    return {"calculation": calc, "steps": steps}
+
+
+class Warehouse:
+    """
+    SQLite 结果仓库；连接按需打开，对象可被 pickle 传入进程池
+    """
+    def __init__(self, db_path: Path):
+        """
+        参数
+        ----------
+        db_path : Path
+            数据库文件路径，不存在时自动创建
+        """
+        self.db_path = Path(db_path)
+        self._conn = None
+
+    def __getstate__(self):
+        return {"db_path": self.db_path, "_conn": None}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=60)
+            # WAL 模式允许多个进程并发写入 post 结果时读者不被阻塞
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA foreign_keys=ON")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def add(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        在一个事务中写入多条记录，相同路径的旧记录会被替换
+
+        返回
+        ----------
+        int
+            写入的记录数
+        """
+        count = 0
+        with self.conn:
+            for record in records:
+                calc = record["calculation"]
+                self.conn.execute("DELETE FROM calculations WHERE path = ?", (calc["path"],))
+                columns = ", ".join(calc)
+                placeholders = ", ".join("?" for _ in calc)
+                cur = self.conn.execute(
+                    f"INSERT INTO calculations ({columns}) VALUES ({placeholders})", list(calc.values())
+                )
+                self.conn.executemany(
+                    "INSERT INTO steps (calc_id, step, energy, grad_norm, charges) VALUES (?, ?, ?, ?, ?)",
+                    [(cur.lastrowid, *step) for step in record["steps"]],
+                )
+                count += 1
+        return count
+
+    def ingest(self, working_dir: Path, basename: str) -> int:
+        """导入单个计算"""
+        return self.add([build_record(working_dir, basename)])
+
+    def ingest_tree(self, root: Path, batch_size: int = 500) -> int:
+        """
+        递归导入目录下所有含 .property.json 或 .out 的计算
+
+        参数
+        ----------
+        root : Path
+            结果根目录，如 demo/opt
+        batch_size : int, optional
+            每个事务写入的记录数，默认为500
+        """
+        seen = set()
+        for pattern in ("*.property.json", "*.out"):
+            for f in Path(root).rglob(pattern):
+                basename = f.name[:-len(pattern) + 1]
+                seen.add((f.parent, basename))
+
+        total = 0
+        batch = []
+        for working_dir, basename in sorted(seen):
+            try:
+                batch.append(build_record(working_dir, basename))
+            except (OSError, ValueError, KeyError) as e:
+                print(f"跳过 {working_dir / basename}: {e}")
+                continue
+            if len(batch) >= batch_size:
+                total += self.add(batch)
+                batch = []
+        total += self.add(batch)
+        return total
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        """执行只读查询"""
+        self.conn.row_factory = sqlite3.Row
+        return self.conn.execute(sql, tuple(params)).fetchall()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ORCA 结果仓库")
+    parser.add_argument("command", choices=["ingest", "query"], help="ingest (导入结果目录), query (执行SQL查询)")
+    parser.add_argument("target", help="结果目录(ingest) 或 SQL语句(query)")
+    parser.add_argument("--db", default="orca_results.db", help="数据库文件路径，默认为 orca_results.db")
+    args = parser.parse_args(argv)
+
+    warehouse = Warehouse(args.db)
+    if args.command == "ingest":
+        start = time.perf_counter()
+        n = warehouse.ingest_tree(Path(args.target))
+        print(f"已导入 {n} 个计算，用时 {time.perf_counter() - start:.2f} s")
+    else:
+        rows = warehouse.query(args.target)
+        if rows:
+            print("\t".join(rows[0].keys()))
+        for row in rows:
+            print("\t".join(str(v) for v in row))
+    warehouse.close()
+
+
+if __name__ == "__main__":
+    main()
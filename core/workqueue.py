@@ -0,0 +1,392 @@
+"""
+共享文件系统上的任务队列 - 多个节点上的任意数量工作进程从同一目录领取已完成 pre 的
+计算，运行ORCA和 post 阶段，不需要中心服务器或消息代理
+
+目录结构:
+    <queue>/queue.json                     队列元数据(提交目录)
+    <queue>/pending/<key>.<attempt>.json   等待领取
+    <queue>/claimed/<key>.<attempt>.<worker>.json
+    <queue>/done/<key>.json, <queue>/failed/<key>.json
+
+领取任务是一次 rename(pending → claimed)，同一文件只有一个进程能成功；工作进程
+在计算期间定时更新 claimed 文件的修改时间作为租约。租约过期(工作进程崩溃或节点
+失联)的任务被任意工作进程改名回 pending 并增加尝试次数，超过上限时移入 failed。
+原工作进程在下一次续约时发现文件已不存在，终止自己的ORCA进程。租约时长应远大于
+各节点之间的时钟偏差。
+
+用法:
+    python main.py -t opt -p pre -i conformers/
+    python -m core.workqueue enqueue queue/ -t opt -i conformers/
+    python -m core.workqueue work queue/ -j 4      # 在每个节点上运行任意多个
+    python -m core.workqueue status queue/
+    python -m core.workqueue enqueue queue/ -t opt -i conformers/ --retry-failed   # 重新计算失败的结构
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 添加项目根目录到Python路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+PENDING = "pending"
+CLAIMED = "claimed"
+DONE = "done"
+FAILED = "failed"
+
+DEFAULT_LEASE = 600.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+
+def worker_id() -> str:
+    """<主机名>-<进程号>，文件名中的点号替换为下划线"""
+    return f"{socket.gethostname()}-{os.getpid()}".replace(".", "_")
+
+
+def _write_atomic(path: Path, data: Dict[str, Any]) -> None:
+    tmp = path.with_name(f".{path.name}.{worker_id()}")
+    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False))
+    os.rename(tmp, path)
+
+
+class Claim:
+    """
+    一个已领取的任务: 定时续约，直到完成或发现租约已被收回
+    """
+    def __init__(self, queue: "WorkQueue", path: Path, key: str, attempt: int, task: Dict[str, Any]):
+        self.queue = queue
+        self.path = path
+        self.key = key
+        self.attempt = attempt
+        self.task = task
+        self.lost = threading.Event()
+        self.on_lost = None
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._heartbeat, daemon=True)
+        self._thread.start()
+
+    def _heartbeat(self) -> None:
+        while not self._stop.wait(self.queue.lease / 4):
+            try:
+                os.utime(self.path)
+            except FileNotFoundError:
+                # 租约已过期并被其他工作进程收回
+                self.lost.set()
+                if self.on_lost is not None:
+                    self.on_lost()
+                return
+
+    def finish(self, state: str, record: Dict[str, Any]) -> bool:
+        """
+        将任务移入 done/failed 并写入结果记录
+
+        返回
+        ----------
+        bool
+            是否仍持有该任务(租约被收回时结果丢弃，由重新领取的进程计算)
+        """
+        self._stop.set()
+        self._thread.join()
+        target = self.queue.root / state / f"{self.key}.json"
+        try:
+            os.rename(self.path, target)
+        except FileNotFoundError:
+            return False
+        _write_atomic(target, {**self.task, **record, "attempt": self.attempt, "worker": worker_id()})
+        return True
+
+
+class WorkQueue:
+    """
+    基于原子 rename 的共享目录任务队列
+    """
+    def __init__(self, root: Path, lease: float = DEFAULT_LEASE, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        """
+        参数
+        ----------
+        root : Path
+            队列目录，应位于所有节点可见的共享文件系统上
+        lease : float, optional
+            租约时长(秒)，默认为600；工作进程每 lease/4 秒续约一次
+        max_attempts : int, optional
+            租约过期后重新排队的最大尝试次数，默认为3
+        """
+        self.root = Path(root).resolve()
+        self.lease = lease
+        self.max_attempts = max_attempts
+        for state in (PENDING, CLAIMED, DONE, FAILED):
+            (self.root / state).mkdir(parents=True, exist_ok=True)
+
+    @property
+    def work_dir(self) -> Path:
+        """提交目录，工作进程在该目录下执行 post 阶段"""
+        meta = self.root / "queue.json"
+        return Path(json.loads(meta.read_text())["work_dir"]) if meta.exists() else Path.cwd()
+
+    def enqueue(self, task: str, inputs: Sequence[Path], kwargs: Optional[Dict[str, Any]] = None,
+                retry_failed: bool = False) -> int:
+        """
+        将已完成 pre 阶段的结构加入队列，已在队列中的结构跳过
+
+        参数
+        ----------
+        task : str
+            任务类型，输入文件位于 <提交目录>/<task>/<basename>.inp
+        inputs : Sequence[Path]
+            结构文件(XYZ)
+        kwargs : Optional[Dict[str, Any]], optional
+            传给 post_<task> 的关键字参数
+        retry_failed : bool, optional
+            重新加入已失败的结构(删除其失败记录，尝试次数从零开始)，默认为False，
+            即失败的结构与等待、运行中、已完成的结构一样跳过
+
+        返回
+        ----------
+        int
+            新加入的任务数
+        """
+        if task == "freq":
+            raise ValueError("数值频率的位移计算请使用 run 阶段，队列只处理单个输入的任务")
+        meta = self.root / "queue.json"
+        if not meta.exists():
+            _write_atomic(meta, {"work_dir": str(Path.cwd().resolve()), "created": time.time()})
+
+        states = (PENDING, CLAIMED, DONE) if retry_failed else (PENDING, CLAIMED, DONE, FAILED)
+        queued = {name.split(".")[0] for state in states for name in os.listdir(self.root / state)}
+        added = 0
+        for f in inputs:
+            # 键中不含点号，文件名按点号拆分出尝试次数和工作进程
+            key = f"{task}-{Path(f).stem}".replace(".", "_")
+            if key in queued:
+                continue
+            inp_file = Path(task) / f"{Path(f).stem}.inp"
+            if not inp_file.exists():
+                raise FileNotFoundError(f"未找到输入文件，请先运行 pre 阶段: {inp_file}")
+            if retry_failed:
+                (self.root / FAILED / f"{key}.json").unlink(missing_ok=True)
+            _write_atomic(self.root / PENDING / f"{key}.0.json", {
+                "task": task,
+                "input": str(Path(f).resolve()),
+                "inp": str(inp_file.resolve()),
+                "kwargs": kwargs or {},
+                "queued": time.time(),
+            })
+            queued.add(key)
+            added += 1
+        return added
+
+    def _parse(self, name: str) -> Tuple[str, int]:
+        key, attempt = name.split(".")[:2]
+        return key, int(attempt)
+
+    def reap(self) -> int:
+        """
+        收回租约过期的任务: 尝试次数未达上限时重新排队，否则移入 failed
+
+        返回
+        ----------
+        int
+            收回的任务数
+        """
+        reaped = 0
+        now = time.time()
+        for name in os.listdir(self.root / CLAIMED):
+            path = self.root / CLAIMED / name
+            try:
+                expired = now - path.stat().st_mtime > self.lease
+            except FileNotFoundError:
+                continue
+            if not expired:
+                continue
+            key, attempt = self._parse(name)
+            if attempt + 1 < self.max_attempts:
+                target = self.root / PENDING / f"{key}.{attempt + 1}.json"
+            else:
+                target = self.root / FAILED / f"{key}.json"
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                # 其他工作进程已收回，或原进程刚好完成
+                continue
+            if target.parent.name == FAILED:
+                task = json.loads(target.read_text())
+                _write_atomic(target, {**task, "status": "failed", "attempt": attempt,
+                                       "error": f"租约过期 {attempt + 1} 次"})
+            reaped += 1
+        return reaped
+
+    def claim(self) -> Optional[Claim]:
+        """领取下一个任务，队列为空时返回None"""
+        for name in sorted(os.listdir(self.root / PENDING)):
+            if name.startswith("."):
+                continue
+            key, attempt = self._parse(name)
+            source = self.root / PENDING / name
+            path = self.root / CLAIMED / f"{key}.{attempt}.{worker_id()}.json"
+            try:
+                # rename 保留修改时间，先更新，避免刚领取的任务被视为租约过期
+                os.utime(source)
+                os.rename(source, path)
+            except FileNotFoundError:
+                # 被其他工作进程抢先领取
+                continue
+            return Claim(self, path, key, attempt, json.loads(path.read_text()))
+        return None
+
+    def counts(self) -> Dict[str, int]:
+        """各状态的任务数"""
+        return {state: sum(1 for n in os.listdir(self.root / state) if not n.startswith("."))
+                for state in (PENDING, CLAIMED, DONE, FAILED)}
+
+    def records(self, state: str = DONE) -> List[Dict[str, Any]]:
+        """done/failed 中的结果记录"""
+        return [json.loads(p.read_text()) for p in sorted((self.root / state).glob("*.json"))]
+
+
+def process_claim(claim: Claim, orca_cmd: str, staging: Optional[Any] = None,
+                  journal: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    运行一个已领取任务的ORCA计算和 post 阶段，并标记为 done/failed
+    """
+    from core.batch import run_structure
+    from core.journal import DONE as JOURNAL_DONE, FAILED as JOURNAL_FAILED, RUNNING
+    from core.scheduler import OrcaJob
+
+    task = claim.task
+    job = OrcaJob(Path(task["inp"]), staging=staging)
+    record = {"status": "failed", "returncode": None, "wall_time": None, "error": None}
+    # 日志、暂存或 post 中的任何异常都只使该任务失败，不能终止槽位线程
+    # (否则心跳线程会一直续租，任务永远不会被重新领取)
+    try:
+        if journal is not None:
+            journal.record(task["task"], task["input"], RUNNING)
+        job.launch(orca_cmd)
+        claim.on_lost = job.proc.terminate
+        job.wait()
+        record.update(returncode=job.returncode, wall_time=job.wall_time)
+
+        if claim.lost.is_set():
+            record["error"] = "租约已被收回"
+        elif not job.succeeded:
+            record["error"] = job.failure
+        else:
+            post = run_structure(task["task"], "post", task["input"], kwargs=task["kwargs"])
+            record["status"] = post["status"]
+            record["error"] = post["error"]
+    except Exception as e:
+        if job.proc is not None and job.proc.poll() is None:
+            job.proc.kill()
+        record["status"] = "failed"
+        record["error"] = f"{type(e).__name__}: {e}"
+
+    state = DONE if record["status"] == "ok" else FAILED
+    if claim.finish(state, record) and journal is not None:
+        try:
+            journal.record(task["task"], task["input"], JOURNAL_DONE if state == DONE else JOURNAL_FAILED,
+                           record["error"])
+        except Exception as e:
+            print(f"警告: 无法写入任务日志 {journal.path}: {e}", flush=True)
+    return record
+
+
+def work(queue: WorkQueue, slots: int = 1, orca_cmd: Optional[str] = None, staging: Optional[Any] = None,
+         journal: Optional[Any] = None, poll: float = 5.0) -> List[Dict[str, Any]]:
+    """
+    以 slots 个并发槽位从队列领取并处理任务
+
+    队列中没有等待的任务时，只要还有其他进程持有的任务(其租约可能过期)就继续等待；
+    全部任务结束后返回。
+
+    返回
+    ----------
+    List[Dict[str, Any]]
+        本进程处理的任务记录
+    """
+    from core.scheduler import find_orca
+    orca_cmd = find_orca(orca_cmd)
+    os.chdir(queue.work_dir)
+    results = []
+    lock = threading.Lock()
+
+    def _loop():
+        while True:
+            queue.reap()
+            claim = queue.claim()
+            if claim is None:
+                if not queue.counts()[CLAIMED]:
+                    return
+                time.sleep(poll)
+                continue
+            record = process_claim(claim, orca_cmd, staging, journal)
+            with lock:
+                results.append({"key": claim.key, **record})
+                print(f"{claim.key}: {record['status']}"
+                      + (f" ({record['error']})" if record["error"] else ""), flush=True)
+
+    threads = [threading.Thread(target=_loop) for _ in range(slots)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return results
+
+
+def report(queue: WorkQueue) -> None:
+    """打印队列各状态的任务数和失败原因"""
+    counts = queue.counts()
+    print(f"等待 {counts[PENDING]}，运行中 {counts[CLAIMED]}，完成 {counts[DONE]}，失败 {counts[FAILED]}")
+    for r in queue.records(FAILED):
+        print(f"  {Path(r['input']).stem}: {r.get('error')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="共享文件系统任务队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    enq = sub.add_parser("enqueue", help="将已完成 pre 阶段的结构加入队列")
+    enq.add_argument("queue", help="队列目录")
+    enq.add_argument("-t", "--task", required=True, help="任务类型")
+    enq.add_argument("-i", "--input", required=True, help="目录、通配符或多帧XYZ文件")
+    enq.add_argument("--fast", action="store_true", help="post 阶段使用轻量级提取")
+    enq.add_argument("--retry-failed", action="store_true", help="重新加入已失败的结构")
+
+    wrk = sub.add_parser("work", help="从队列领取并处理任务，直到队列为空")
+    wrk.add_argument("queue", help="队列目录")
+    wrk.add_argument("-j", "--slots", type=int, default=1, help="本进程同时运行的任务数，默认为1")
+    wrk.add_argument("--lease", type=float, default=DEFAULT_LEASE, help="租约时长(秒)，默认为600")
+    wrk.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS, help="最大尝试次数，默认为3")
+    wrk.add_argument("--poll", type=float, default=5.0, help="等待其他进程的任务时的轮询间隔(秒)")
+    wrk.add_argument("--journal", default=None, help="批量状态日志文件")
+    wrk.add_argument("--scratch", action="store_true", help="在节点本地暂存目录中运行ORCA")
+    wrk.add_argument("--scratch-dir", default=None, help="暂存根目录")
+    wrk.add_argument("--gbw-store", default=None, help="内容寻址的 .gbw 存储目录")
+
+    sta = sub.add_parser("status", help="显示队列状态")
+    sta.add_argument("queue", help="队列目录")
+    args = parser.parse_args(argv)
+
+    if args.command == "enqueue":
+        from core.batch import collect_inputs
+        queue = WorkQueue(args.queue)
+        added = queue.enqueue(args.task, collect_inputs(args.input), {"fast": True} if args.fast else None,
+                              retry_failed=args.retry_failed)
+        print(f"加入队列 {added} 个任务")
+        report(queue)
+    elif args.command == "work":
+        from core.journal import Journal
+        from core.scratch import open_staging
+        queue = WorkQueue(args.queue, lease=args.lease, max_attempts=args.max_attempts)
+        journal = Journal(Path(args.journal).resolve()) if args.journal else None
+        results = work(queue, args.slots, staging=open_staging(args), journal=journal, poll=args.poll)
+        print(f"{worker_id()} 处理 {len(results)} 个任务")
+    else:
+        report(WorkQueue(args.queue))
+
+
+if __name__ == "__main__":
+    main()
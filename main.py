@@ -2,10 +2,11 @@
 # -*- coding: utf-8 -*-
 
 import argparse
-from ntpath import basename
+import glob
+import os
 import sys
 from pathlib import Path
-from core.task_manager import run_task
+# core.* 模块在各阶段分支内按需导入，--help 和参数检查不加载 opi/concurrent/asyncio 等依赖
 
 
 sys.path.insert(0, str(Path(__file__).parent))
@@ -21,16 +22,77 @@ def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="ORCA Workflow 主程序")
     
     # Task 类型参数
-    parser.add_argument("-t", "--task", choices=['sp', 'opt', 'tddft'], required=True, help="任务类型: sp (单点计算), opt (结构优化), tddft (TDDFT计算)")
+    parser.add_argument("-t", "--task", choices=['sp', 'opt', 'tddft', 'freq'], required=True, help="任务类型: sp (单点计算), opt (结构优化), tddft (TDDFT计算), freq (数值频率，输入为优化后的结构)")
 
     
-    parser.add_argument("-p", "--process", choices=['pre', 'post'], required=True, help="阶段类型: pre (预处理), post (后处理)")
+    parser.add_argument("-p", "--process", choices=['pre', 'run', 'submit', 'post', 'pipeline', 'funnel', 'sweep'], required=True, help="阶段类型: pre (预处理), run (本地并发运行ORCA), submit (生成并提交Slurm作业数组), post (后处理), pipeline (从该任务开始的多阶段流水线), funnel (廉价方法逐层筛选，只对排名靠前的结构运行该任务), sweep (方法/基组/色散校正参数扫描)")
     
     # 结构参数
     parser.add_argument("-i", "--input", required=True, help="输入文件路径")
     
     # 核数参数
     parser.add_argument("-n", "--ncores", type=int, default=32, help="设置计算所用的核数，默认为32")
+    parser.add_argument("--cost-model", default=None, help="耗时模型文件(python -m core.cost_model fit 生成)，指定后 -n 作为上限，按结构大小自动选择核数和内存")
+
+    # 批量模式参数
+    parser.add_argument("-j", "--workers", type=int, default=None, help="批量模式下的进程池大小，默认为CPU核数")
+
+    # 后处理参数
+    parser.add_argument("--fast", action="store_true", help="sp/opt 任务 post 阶段只提取能量/收敛标志/电荷，不做完整JSON解析")
+    parser.add_argument("--stream", action="store_true", help="opt 任务 post 阶段逐个构型流式读取，内存占用与优化步数无关，逐步的坐标、梯度和电荷写入 <basename>.steps.npy")
+    parser.add_argument("--db", default=None, help="post 阶段将结构化结果写入该 SQLite 结果仓库")
+    parser.add_argument("--plot-summary", default=None, help="批量 post 阶段绘制全部优化能量轨迹的汇总图到该文件(core.plotting)")
+    parser.add_argument("--plot-mode", choices=["overlay", "grid"], default="overlay", help="汇总图模式: overlay (叠加) 或 grid (每个计算一个小图)，默认为overlay")
+
+    # 计时插桩参数
+    parser.add_argument("--trace", action="store_true", help="记录每个计算各步骤(结构读取、计算器设置、写入输入、ORCA运行、解析、绘图)的耗时、CPU时间和内存，写入 <basename>.trace.jsonl，post 阶段合并ORCA各阶段耗时并按分子大小汇总(core.trace)")
+
+    # 模板化写入参数
+    parser.add_argument("--bulk", action="store_true", help="pre 阶段以第一个结构的输入为模板批量写入，不为每个结构创建 Calculator")
+
+    # 结构去重参数
+    parser.add_argument("--dedup", type=float, default=None, help="pre 阶段跳过与已有结构RMSD小于该值(Å)的结构")
+    parser.add_argument("--dedup-index", default=None, help="结构去重索引文件，跨批次记录已计算的结构")
+
+    # 断点续算参数
+    parser.add_argument("--journal", default=None, help="批量状态日志文件，指定后重新运行时只处理未完成的结构，失败的优化从轨迹最后一帧重启")
+
+    # 结果缓存参数
+    parser.add_argument("--cache", default=None, help="结果缓存目录，指定后相同结构和关键词的计算不再重复运行")
+    parser.add_argument("--cache-size", type=float, default=20.0, help="结果缓存容量上限(GB)，默认为20")
+
+    # 本地调度参数
+    parser.add_argument("--total-cores", type=int, default=os.cpu_count(), help="run 阶段可用的总核数，默认为本机CPU核数")
+    parser.add_argument("--monitor", action="store_true", help="run 阶段实时监控输出，SCF发散或优化停滞时提前终止")
+    parser.add_argument("--max-scf-cycles", type=int, default=150, help="监控规则: 单次SCF迭代次数上限，默认为150")
+    parser.add_argument("--stagnation-window", type=int, default=20, help="监控规则: 能量无下降的连续优化步数，默认为20")
+
+    # Slurm 提交参数
+    parser.add_argument("--pack", type=int, default=1, help="submit 阶段每个分配打包的输入数，默认为1(纯作业数组)")
+    parser.add_argument("--ntasks-per-node", type=int, default=16, help="submit 阶段每个节点的任务数，默认为16")
+    parser.add_argument("--partition", default="sdicnormal", help="Slurm 分区，默认为sdicnormal")
+    parser.add_argument("--orca-env", default=None, help="ORCA环境脚本(env.sh)路径")
+    parser.add_argument("--dry-run", action="store_true", help="只生成提交脚本，不调用sbatch")
+    parser.add_argument("--queue", default=None, help="submit 阶段将输入加入该共享队列目录，作业数组的每个任务作为队列工作进程领取计算(core.workqueue)")
+    parser.add_argument("--queue-workers", type=int, default=4, help="--queue 时的数组任务(工作进程)数，默认为4")
+    parser.add_argument("--retry-failed", action="store_true", help="--queue 时重新加入队列中已失败的结构")
+
+    # 暂存目录参数
+    parser.add_argument("--scratch", action="store_true", help="run/submit/pipeline 阶段在节点本地暂存目录中运行ORCA，只将白名单内的产物复制回工作目录")
+    parser.add_argument("--scratch-dir", default=None, help="暂存根目录，默认为运行ORCA的节点上的 $ORCA_SCRATCH、$TMPDIR 或 /tmp")
+    parser.add_argument("--gbw-store", default=None, help="内容寻址的 .gbw 存储目录，相同内容的 .gbw 只存一份(需与工作目录同一文件系统)")
+
+    # 流水线参数
+    parser.add_argument("--stages", default=None, help="pipeline 阶段列表，以逗号分隔，默认为从 -t 开始的 opt,sp,tddft")
+    parser.add_argument("--no-moread", action="store_true", help="pipeline 各阶段不读入前一阶段的 .gbw；sweep 较大基组不读入较小基组的 .gbw")
+
+    # 筛选漏斗参数
+    parser.add_argument("--levels", nargs="+", default=None, help="funnel 层级，每个为 \"任务:关键词:规则\"，如 \"opt:XTB2:window=6\" \"sp:R2SCAN-3C:top=10\" \"sp\"；默认为 xTB 优化 → r2SCAN-3c 单点 → -t 任务")
+
+    # 参数扫描参数
+    parser.add_argument("--methods", nargs="+", default=["B3LYP"], help="sweep 扫描的方法，默认为B3LYP")
+    parser.add_argument("--basis-sets", nargs="+", default=["def2-TZVP"], help="sweep 扫描的基组，较小基组的 .gbw 作为较大基组的初始猜测；复合方法用 none，默认为def2-TZVP")
+    parser.add_argument("--dispersions", nargs="+", default=["D3"], help="sweep 扫描的色散校正，none 表示不使用，默认为D3")
     
     args = parser.parse_args(argv)
     return args 
@@ -38,12 +100,187 @@ def parse_args(argv=None):
 def main(args):
     # 检查输入文件是否存在
     input_file = Path(args.input)
-    if not input_file.exists():
+    if not input_file.exists() and not glob.glob(args.input):
         sys.exit(f"错误: 输入文件 '{input_file}' 不存在")
 
     task_type = args.task
     process_type = args.process
+    # 在本地按核数预算并发运行已准备好的输入文件
+    if process_type == "run":
+        from core.batch import collect_inputs, skip_cache_hits, skip_duplicates
+        from core.journal import FAILED, FINISHED, RUNNING, Journal
+        from core.scheduler import LocalScheduler, report
+        from core.scratch import open_staging
+        from core.trace import record_job
+
+        inputs = collect_inputs(args.input)
+        journal = Journal(args.journal) if args.journal else None
+        if journal is not None:
+            inputs = journal.pending(task_type, "run", inputs)
+        inputs, duplicates = skip_duplicates(Path(task_type), inputs)
+        if duplicates:
+            print(f"跳过 {len(duplicates)} 个重复结构(pre 阶段去重)")
+        inputs, hits = skip_cache_hits(Path(task_type), inputs)
+        if hits:
+            print(f"跳过 {len(hits)} 个命中结果缓存的结构")
+        if task_type == "freq":
+            # 数值频率的每个位移是独立的ORCA计算
+            from task.freq import displacement_inputs
+            sources = {inp.resolve(): f for f in inputs for inp in displacement_inputs(Path(task_type), f.stem)}
+        else:
+            sources = {(Path(task_type) / f"{f.stem}.inp").resolve(): f for f in inputs}
+        failed_sources = set()
+        monitor = None
+        if args.monitor:
+            from core.monitor import Monitor, OptStagnation, ScfDivergence
+            monitor = Monitor([ScfDivergence(max_cycles=args.max_scf_cycles),
+                               OptStagnation(window=args.stagnation_window)]).start_in_thread()
+
+        def on_start(job):
+            if journal is not None and sources[job.inp_file.resolve()] not in failed_sources:
+                journal.record(task_type, sources[job.inp_file.resolve()], RUNNING)
+            if monitor is not None:
+                monitor.watch_job(job)
+
+        def on_finish(job):
+            # 正常结束的计算标记为 finished，由 post 阶段标记为 done；
+            # 数值频率的任一位移失败后该结构保持 failed
+            if journal is not None:
+                source = sources[job.inp_file.resolve()]
+                if not job.succeeded:
+                    failed_sources.add(source)
+                    journal.record(task_type, source, FAILED, job.failure)
+                elif source not in failed_sources:
+                    journal.record(task_type, source, FINISHED)
+            if monitor is not None:
+                monitor.unwatch_job(job)
+            if args.trace:
+                record_job(job)
+
+        jobs = LocalScheduler(args.total_cores, staging=open_staging(args)).run(list(sources), on_start=on_start, on_finish=on_finish)
+        if monitor is not None:
+            monitor.stop()
+        report(jobs)
+        return jobs
+
+    # 多阶段流水线：后一阶段使用前一阶段的优化结构和 .gbw
+    if process_type == "pipeline":
+        from core.batch import collect_inputs
+        from core.pipeline import DEFAULT_STAGES, run_pipelines, report as report_pipeline
+        from core.scratch import open_staging
+
+        if args.stages:
+            stages = args.stages.split(",")
+        else:
+            stages = DEFAULT_STAGES[DEFAULT_STAGES.index(task_type):]
+        records = run_pipelines(collect_inputs(args.input), stages, ncores=args.ncores,
+                                total_cores=args.total_cores, moread=not args.no_moread,
+                                staging=open_staging(args))
+        report_pipeline(records)
+        return records
+
+    # 多层级筛选漏斗：廉价层级的计算结果决定哪些结构进入下一层级
+    if process_type == "funnel":
+        from core.batch import collect_inputs
+        from core.funnel import DEFAULT_LEVELS, FUNNEL_TASKS, Funnel, parse_level, report as report_funnel
+        from core.scratch import open_staging
+        from core.task_manager import open_cache
+
+        if args.levels is None and task_type not in FUNNEL_TASKS:
+            sys.exit(f"错误: funnel 的默认最终层级为 -t 指定的任务，只支持 {'/'.join(FUNNEL_TASKS)}；"
+                     f"{task_type} 任务请用 --levels 指定筛选层级后单独运行")
+        specs = args.levels or DEFAULT_LEVELS + [task_type]
+        try:
+            levels = [parse_level(s) for s in specs]
+        except ValueError as e:
+            sys.exit(f"错误: {e}")
+        funnel = Funnel(collect_inputs(args.input), levels, ncores=args.ncores,
+                        total_cores=args.total_cores, staging=open_staging(args), cache=open_cache(args))
+        summary = funnel.run()
+        report_funnel(summary)
+        return summary
+
+    # 方法/基组参数扫描：较小基组的结果作为较大基组的初始猜测
+    if process_type == "sweep":
+        from core.batch import collect_inputs
+        from core.scratch import open_staging
+        from core.sweep import Sweep, report as report_sweep
+        from core.task_manager import open_cache
+
+        sweep = Sweep(task_type, collect_inputs(args.input), args.methods, args.basis_sets, args.dispersions,
+                      ncores=args.ncores, total_cores=args.total_cores, staging=open_staging(args),
+                      cache=open_cache(args), moread=not args.no_moread)
+        summary = sweep.run()
+        report_sweep(summary)
+        return summary
+
+    # 准备输入并生成 Slurm 作业数组脚本，核数按 --ntasks-per-node / --pack 计算
+    if process_type == "submit":
+        if task_type == "freq":
+            sys.exit("错误: 数值频率由多个位移计算组成，请使用 run 阶段在本地调度，submit 只处理单个输入的任务")
+        from core.batch import collect_inputs, run_batch, summarize
+        from core.journal import Journal
+        from core.submit import SlurmSubmitter, cores_per_job, post_arguments
+        from core.task_manager import open_cache, open_dedup
+
+        ncores = cores_per_job(args.ntasks_per_node, args.pack)
+        dedup = open_dedup(args)
+        results = run_batch(task_type, "pre", collect_inputs(args.input),
+                            ncores=ncores, workers=args.workers, cache=open_cache(args),
+                            journal=Journal(args.journal) if args.journal else None, dedup=dedup,
+                            bulk=args.bulk)
+        summarize(results)
+        if dedup is not None and args.dedup_index:
+            dedup.save(args.dedup_index)
+        prepared = [r["input"] for r in results
+                    if r["status"] == "ok" and not r["cache_hit"] and not r.get("duplicate_of")]
+        submitter = SlurmSubmitter(task_type, ntasks_per_node=args.ntasks_per_node,
+                                   partition=args.partition, env_script=args.orca_env,
+                                   journal=args.journal, scratch=args.scratch,
+                                   scratch_dir=args.scratch_dir, gbw_store=args.gbw_store,
+                                   post_args=post_arguments(args))
+        if args.queue:
+            # 各节点从共享队列领取计算，先结束的节点继续处理剩余结构
+            from core.workqueue import WorkQueue
+            added = WorkQueue(args.queue).enqueue(task_type, prepared, retry_failed=args.retry_failed)
+            print(f"加入队列 {added} 个任务: {args.queue}")
+            script = submitter.write_workers(args.queue, args.queue_workers, pack=args.pack)
+        else:
+            script = submitter.write(prepared, pack=args.pack)
+        print(f"提交脚本: {script}")
+        if not args.dry_run:
+            print(f"已提交作业: {submitter.submit(script)}")
+        return script
+
+    # 目录、通配符或多帧XYZ输入，以及使用状态日志时走批量模式
+    from core.batch import is_batch_input
+    if is_batch_input(args.input) or args.journal:
+        from core.batch import collect_inputs, run_batch, summarize
+        from core.journal import Journal
+        from core.task_manager import open_cache, open_cost_model, open_dedup, open_warehouse, stage_kwargs
+
+        dedup = open_dedup(args)
+        results = run_batch(task_type, process_type, collect_inputs(args.input),
+                            ncores=args.ncores, workers=args.workers, cache=open_cache(args),
+                            kwargs=stage_kwargs(args), warehouse=open_warehouse(args),
+                            journal=Journal(args.journal) if args.journal else None,
+                            cost_model=open_cost_model(args), dedup=dedup, bulk=args.bulk, trace=args.trace)
+        summarize(results)
+        if dedup is not None and args.dedup_index and process_type == "pre":
+            dedup.save(args.dedup_index)
+        if args.plot_summary and process_type == "post":
+            from core.plotting import collect_trajectories, plot_summary
+            trajectories = collect_trajectories(Path(task_type), [r["basename"] for r in results if r["status"] == "ok"])
+            path = plot_summary(trajectories, Path(args.plot_summary), args.plot_mode)
+            print(f"能量轨迹汇总图: {path}" if path else "没有可绘制的能量轨迹")
+        if args.trace and process_type == "post":
+            from core.trace import aggregate, report as report_trace
+            report_trace(aggregate(Path(task_type) / f"{r['basename']}.trace.jsonl" for r in results
+                                   if (Path(task_type) / f"{r['basename']}.trace.jsonl").exists()))
+        return results
+
     #从core/task_manager.py获取action_map映射，根据任务类型和阶段类型获取对应的lambda函数
+    from core.task_manager import run_task
     result = run_task(args)
     
 
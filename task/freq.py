@@ -0,0 +1,286 @@
+import sys
+import json
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.base_workflow import OPIWorkflow
+from core.scheduler import LocalScheduler, report
+from task.sp import spWorkflow
+from opi.input.simple_keywords import *
+from opi.input.arbitrary_string import ArbitraryStringPos
+
+BOHR_TO_ANGSTROM = 0.529177210903
+HARTREE_TO_WAVENUMBER = 219474.6313702
+# sqrt(Eh / (bohr^2 · amu)) / (2πc)，质量加权Hessian本征值 → cm^-1
+AU_TO_WAVENUMBER = 5140.48712
+
+# 标准原子量 (amu)，无稳定同位素的元素取最长寿命同位素的质量
+ATOMIC_MASSES = {
+    "H": 1.008, "He": 4.0026, "Li": 6.94, "Be": 9.0122, "B": 10.81, "C": 12.011,
+    "N": 14.007, "O": 15.999, "F": 18.998, "Ne": 20.180, "Na": 22.990, "Mg": 24.305,
+    "Al": 26.982, "Si": 28.085, "P": 30.974, "S": 32.06, "Cl": 35.45, "Ar": 39.948,
+    "K": 39.098, "Ca": 40.078, "Sc": 44.956, "Ti": 47.867, "V": 50.942, "Cr": 51.996,
+    "Mn": 54.938, "Fe": 55.845, "Co": 58.933, "Ni": 58.693, "Cu": 63.546, "Zn": 65.38,
+    "Ga": 69.723, "Ge": 72.630, "As": 74.922, "Se": 78.971, "Br": 79.904, "Kr": 83.798,
+    "Rb": 85.468, "Sr": 87.62, "Y": 88.906, "Zr": 91.224, "Nb": 92.906, "Mo": 95.95,
+    "Tc": 97.907, "Ru": 101.07, "Rh": 102.91, "Pd": 106.42, "Ag": 107.87, "Cd": 112.41,
+    "In": 114.82, "Sn": 118.71, "Sb": 121.76, "Te": 127.60, "I": 126.904, "Xe": 131.29,
+    "Cs": 132.91, "Ba": 137.33, "La": 138.91, "Ce": 140.12, "Pr": 140.91, "Nd": 144.24,
+    "Pm": 144.91, "Sm": 150.36, "Eu": 151.96, "Gd": 157.25, "Tb": 158.93, "Dy": 162.50,
+    "Ho": 164.93, "Er": 167.26, "Tm": 168.93, "Yb": 173.05, "Lu": 174.97, "Hf": 178.49,
+    "Ta": 180.95, "W": 183.84, "Re": 186.21, "Os": 190.23, "Ir": 192.22, "Pt": 195.08,
+    "Au": 196.97, "Hg": 200.59, "Tl": 204.38, "Pb": 207.2, "Bi": 208.98, "Po": 208.98,
+    "At": 209.99, "Rn": 222.02,
+}
+
+
+def parse_geometry(xyz_block: str) -> Tuple[List[str], np.ndarray]:
+    """将XYZ文本解析为元素列表和坐标数组 (Å)"""
+    elements, coords = [], []
+    for line in xyz_block.strip().splitlines():
+        fields = line.split()
+        if len(fields) >= 4 and fields[0][0].isalpha():
+            elements.append(fields[0].capitalize())
+            coords.append([float(x) for x in fields[1:4]])
+    return elements, np.array(coords)
+
+
+def read_engrad(engrad_file: Path) -> Tuple[float, np.ndarray]:
+    """
+    读取ORCA .engrad 文件
+
+    返回
+    ----------
+    Tuple[float, np.ndarray]
+        总能量 (Eh) 和梯度 (Eh/bohr，长度 3N)
+    """
+    values = [line.split()[0] for line in Path(engrad_file).read_text().splitlines()
+              if line.strip() and not line.lstrip().startswith("#")]
+    natoms = int(values[0])
+    return float(values[1]), np.array(values[2:2 + 3 * natoms], dtype=float)
+
+
+def displacement_inputs(working_dir: Path, basename: str) -> List[Path]:
+    """返回 pre_freq 生成的所有位移计算输入文件"""
+    meta_file = Path(working_dir) / basename / "displacements.json"
+    if not meta_file.exists():
+        return []
+    meta = json.loads(meta_file.read_text())
+    return [meta_file.parent / f"{name}.inp" for name in meta["jobs"]]
+
+
+def trans_rot_basis(coords: np.ndarray, masses: np.ndarray) -> np.ndarray:
+    """
+    质量加权坐标下平动和转动方向的正交基 (3N × 5 或 3N × 6)
+    """
+    sqrt_m = np.sqrt(masses)
+    centered = coords - (masses[:, None] * coords).sum(axis=0) / masses.sum()
+    natoms = len(masses)
+    vectors = np.zeros((6, natoms, 3))
+    for axis in range(3):
+        vectors[axis, :, axis] = sqrt_m
+        # 绕 axis 的无穷小转动: e_axis × r
+        rot = np.zeros(3)
+        rot[axis] = 1.0
+        vectors[3 + axis] = np.cross(rot, centered) * sqrt_m[:, None]
+    D = vectors.reshape(6, -1).T
+    # 线性分子的一个转动方向为零，用SVD丢弃
+    u, s, _ = np.linalg.svd(D, full_matrices=False)
+    return u[:, s > 1e-6 * s.max()]
+
+
+class _engradWorkflow(spWorkflow):
+    """
+    位移结构的能量+梯度计算，关键词与 SP 相同，只将任务改为 EnGrad
+    """
+    def simple_keywords(self) -> list:
+        return [Task.ENGRAD if k is Task.SP else k for k in super().simple_keywords()]
+
+
+class freqWorkflow(OPIWorkflow):
+    """
+    数值频率工作流：对优化结构的每个笛卡尔坐标做正负位移，各位移作为独立的
+    EnGrad 计算运行，post 阶段由梯度的中心差分组装Hessian
+    """
+    def pre_freq(self, method: str = None, basis_set: str = None, dispersion: str = None,
+                 step: float = 0.005, guess: Optional[Path] = None) -> List[Path]:
+        """
+        生成所有位移结构的输入文件
+
+        位移计算位于 freq/<basename>/ 目录，以参考结构的 .gbw 作为初始猜测
+
+        参数
+        ----------
+        method : str, optional
+            计算使用的方法，默认为B3LYP
+        basis_set : str, optional
+            基组，默认为def2-TZVP
+        dispersion : str, optional
+            色散校正，默认为D3
+        step : float, optional
+            位移步长 (bohr)，默认为0.005
+        guess : Optional[Path], optional
+            参考结构的 .gbw，默认为 set_guess 给定的文件或 opt/<basename>.gbw
+
+        返回
+        ----------
+        List[Path]
+            6N 个位移计算的输入文件
+        """
+        if self.calc is None:
+            raise ValueError("请先设置计算器")
+
+        elements, coords = parse_geometry(self.structure.to_xyz_block())
+        unknown = sorted(set(elements) - set(ATOMIC_MASSES))
+        if unknown:
+            # 在运行 6N 个位移计算之前检查，post 阶段组装Hessian需要原子质量
+            raise ValueError(f"缺少元素 {', '.join(unknown)} 的原子质量，无法计算数值频率")
+        disp_dir = self.working_dir / self.basename
+        disp_dir.mkdir(parents=True, exist_ok=True)
+
+        guess = guess or self.guess_file or Path("opt") / f"{self.basename}.gbw"
+        ref_gbw = None
+        if Path(guess).exists():
+            ref_gbw = disp_dir / f"{self.basename}_ref.gbw"
+            shutil.copy2(guess, ref_gbw)
+        else:
+            print(f"未找到参考 .gbw ({guess})，位移计算不使用初始猜测")
+
+        charge = getattr(self.structure, "charge", 0)
+        mult = getattr(self.structure, "multiplicity", 1)
+        ncores = self.calc.input.ncores
+        jobs = []
+        for k in range(coords.size):
+            for sign, tag in ((1, "p"), (-1, "m")):
+                name = f"{self.basename}_{k:04d}{tag}"
+                displaced = coords.copy()
+                displaced.flat[k] += sign * step * BOHR_TO_ANGSTROM
+                xyz_file = disp_dir / f"{name}.xyz"
+                xyz_file.write_text(
+                    f"{len(elements)}\n{self.basename} coordinate {k} {sign * step:+.4f} bohr\n"
+                    + "".join(f"{el} {x:.10f} {y:.10f} {z:.10f}\n" for el, (x, y, z) in zip(elements, displaced))
+                )
+
+                job = _engradWorkflow(basename=name, working_dir=disp_dir)
+                # 位移计算的步骤记录在参考结构的计时中
+                job.tracer = self.tracer
+                job.setup_structure(xyz_file=xyz_file)
+                job.structure.charge = charge
+                job.structure.multiplicity = mult
+                job.setup_calculator(ncores=ncores)
+                if ref_gbw is not None:
+                    # 所有位移共用一份参考轨道，不为每个位移复制 .gbw
+                    job.calc.input.add_arbitrary_string("!MORead", pos=ArbitraryStringPos.TOP)
+                    job.calc.input.add_arbitrary_string(
+                        f'%moinp "{ref_gbw.name}"', pos=ArbitraryStringPos.TOP
+                    )
+                for param in self.custom_parameters:
+                    job.set_custom_parameters(param)
+                job.pre_sp(method, basis_set, dispersion)
+                jobs.append(name)
+
+        meta = {
+            "step": step,
+            "elements": elements,
+            "coords": coords.tolist(),
+            "jobs": jobs,
+        }
+        (disp_dir / "displacements.json").write_text(json.dumps(meta, indent=2))
+        print(f"已生成 {len(jobs)} 个位移计算: {disp_dir}")
+        return [disp_dir / f"{name}.inp" for name in jobs]
+
+    def run_freq(self, total_cores: int, orca_cmd: Optional[str] = None, staging=None) -> float:
+        """
+        在本机按核数预算并发运行所有位移计算
+
+        参数
+        ----------
+        total_cores : int
+            可用的总核数预算
+        orca_cmd : Optional[str], optional
+            ORCA可执行文件，默认见 core.scheduler.find_orca
+        staging : Optional[ScratchStaging], optional
+            暂存配置(core.scratch)
+
+        返回
+        ----------
+        float
+            总墙钟时间(秒)
+        """
+        jobs = LocalScheduler(total_cores, orca_cmd, staging=staging).run(displacement_inputs(self.working_dir, self.basename))
+        report(jobs)
+        failed = [j.basename for j in jobs if not j.succeeded]
+        if failed:
+            raise RuntimeError(f"{len(failed)} 个位移计算失败: {', '.join(failed[:5])}")
+        starts = [j.start_time for j in jobs if j.start_time is not None]
+        ends = [j.end_time for j in jobs if j.end_time is not None]
+        return max(ends) - min(starts) if starts and ends else 0.0
+
+    def post_freq(self) -> dict:
+        """
+        由位移计算的梯度组装Hessian，计算谐振频率和零点能
+
+        结果写入 freq/<basename>.freq.json，Hessian (Eh/bohr²) 写入 freq/<basename>.hess.npy
+        """
+        disp_dir = self.working_dir / self.basename
+        meta_file = disp_dir / "displacements.json"
+        if not meta_file.exists():
+            print(f"未找到位移计算，请先运行 pre: {meta_file}")
+            sys.exit(1)
+        meta = json.loads(meta_file.read_text())
+        elements = meta["elements"]
+        coords = np.array(meta["coords"]) / BOHR_TO_ANGSTROM
+        ncoord = coords.size
+
+        missing = [name for name in meta["jobs"] if not (disp_dir / f"{name}.engrad").exists()]
+        if missing:
+            print(f"{len(missing)} 个位移计算缺少 .engrad，例如: {disp_dir / missing[0]}.out")
+            sys.exit(1)
+
+        # 行 k 为第 k 个坐标正/负位移时的梯度
+        grads = np.array([read_engrad(disp_dir / f"{name}.engrad")[1] for name in meta["jobs"]])
+        grads = grads.reshape(ncoord, 2, ncoord)
+        hessian = (grads[:, 0] - grads[:, 1]) / (2 * meta["step"])
+        hessian = 0.5 * (hessian + hessian.T)
+
+        # 质量加权并投影掉平动和转动
+        masses = np.array([ATOMIC_MASSES[el] for el in elements])
+        inv_sqrt_m = np.repeat(masses ** -0.5, 3)
+        mw_hessian = hessian * np.outer(inv_sqrt_m, inv_sqrt_m)
+        tr = trans_rot_basis(coords, masses)
+        projector = np.eye(ncoord) - tr @ tr.T
+        eigvals, modes = np.linalg.eigh(projector @ mw_hessian @ projector)
+
+        # 丢弃与平动/转动对应、绝对值最小的本征值
+        keep = np.sort(np.argsort(np.abs(eigvals))[tr.shape[1]:])
+        freqs = np.sign(eigvals[keep]) * np.sqrt(np.abs(eigvals[keep])) * AU_TO_WAVENUMBER
+        zpe = 0.5 * freqs[freqs > 0].sum() / HARTREE_TO_WAVENUMBER
+        n_imag = int((freqs < 0).sum())
+
+        print("振动频率 (cm^-1)：")
+        for i, f in enumerate(freqs, start=1):
+            print(f"{i})", f"{f:.2f}" if f >= 0 else f"{-f:.2f}i")
+        if n_imag:
+            print(f"警告: 存在 {n_imag} 个虚频")
+        print("零点能 (Eh)：")
+        print(f"{zpe:.8f}")
+
+        np.save(self.working_dir / f"{self.basename}.hess.npy", hessian)
+        results = {
+            "frequencies": freqs.tolist(),
+            "zpe": float(zpe),
+            "n_imaginary": n_imag,
+            "step": meta["step"],
+        }
+        (self.working_dir / f"{self.basename}.freq.json").write_text(json.dumps(results, indent=2))
+        self.frequencies = freqs
+        self.zpe = zpe
+        self.normal_modes = (modes[:, keep].T * inv_sqrt_m).reshape(len(keep), -1, 3)
+        return results
@@ -1,13 +1,12 @@
-from os import PRIO_USER
 import sys
 from pathlib import Path
 
-from opi.output.models.json.property.properties import energy
 # 添加项目根目录到Python路径
 project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from core.base_workflow import OPIWorkflow
+from core.extract import extract, read_last_frame
 from opi.input.simple_keywords import *
 
 
@@ -15,7 +14,7 @@ class optWorkflow(OPIWorkflow):
     """
     专门用于结构优化的工作流类
     """
-    def pre_opt(self, method: str = None, basis_set: str = None) -> None:
+    def pre_opt(self, method: str = None, basis_set: str = None, dispersion: str = None) -> None:
         """
         准备结构优化计算
         
@@ -26,26 +25,37 @@ class optWorkflow(OPIWorkflow):
         method : str, optional
             优化使用的方法，默认为B3LYP
         basis_set : str, optional
-            基组，默认为None
+            基组，默认为def2-TZVP
+        dispersion : str, optional
+            色散校正，默认为D3
         """
         if self.calc is None:
             raise ValueError("请先设置计算器")
 
+        self.set_level(method, basis_set, dispersion)
+        if self.cache_hit:
+            print(f"命中结果缓存，跳过输入文件写入: {self.basename}")
+            return
+
         # 设置优化参数
-        sk_list = [
+        self.calc.input.add_simple_keywords(*self.simple_keywords())
+        
+        # 写入输入文件
+        with self.span("write_input"):
+            self.calc.write_input()
+
+    def simple_keywords(self) -> list:
+        """结构优化的简单关键词"""
+        return self.apply_level([
             DispersionCorrection.D3, 
             AtomicCharge.NOPOP, 
             Scf.NOAUTOSTART, 
             Task.OPT,
             BasisSet.DEF2_TZVP,
             Dft.B3LYP
-        ]
-        self.calc.input.add_simple_keywords(*sk_list)
-        
-        # 写入输入文件
-        self.calc.write_input()
+        ])
 
-    def post_opt(self) -> None:
+    def post_opt(self, fast: bool = False, stream: bool = False) -> None:
         """
         后处理：检查优化计算输出是否正常终止和收敛
         
@@ -55,15 +65,28 @@ class optWorkflow(OPIWorkflow):
         - 验证几何优化收敛
         - 输出轨迹信息
         - 保存最终优化结构
+
+        参数
+        ----------
+        fast : bool, optional
+            使用轻量级提取(core.extract)代替完整JSON解析，默认为False
+        stream : bool, optional
+            逐个构型流式读取，一次遍历得到全部汇总，逐步数据写入 .steps.npy，
+            适用于大分子的长优化，默认为False
         """
+        if stream:
+            return self._post_opt_stream()
+        if fast:
+            return self._post_opt_fast()
+
         output = self.calc.get_output()
         if not output.terminated_normally():
             print(f"ORCA计算失败，请查看输出文件: {output.get_outfile()}")
             sys.exit(1)
         # << 结束条件判断
 
-        # > 解析JSON文件
-        output.parse()
+        # > 解析JSON文件(同一工作流内只解析一次)
+        output = self.parsed_output(output)
 
         # > 验证SCF收敛
         if not output.scf_converged():
@@ -76,16 +99,18 @@ class optWorkflow(OPIWorkflow):
             sys.exit(1)
 
         ngeoms = len(output.results_properties.geometries)
+        energy_data = [
+            output.results_properties.geometries[igeom].single_point_data.finalenergy
+            for igeom in range(ngeoms)
+        ]
         print("构型数量")
         print(ngeoms)
         print("最终单点能")
-        print(output.results_properties.geometries[-1].single_point_data.finalenergy)
+        print(energy_data[-1])
         print("构型优化过程的SCF能量")
         # > 几何构型索引从1到*ngeom*
         for igeom in range(0, ngeoms):
-            print(
-                f"{igeom})", output.results_properties.geometries[igeom].single_point_data.finalenergy
-            )
+            print(f"{igeom})", energy_data[igeom])
         print("轨迹上的Mulliken电荷")
         # > 几何构型索引从1到*ngeom*
         for igeom in range(0, ngeoms):
@@ -101,58 +126,133 @@ class optWorkflow(OPIWorkflow):
 
         # > 现在输出最终优化结构为xyz文件格式
         optimized = output.get_structure()
+        self.optimized = optimized
         print("最终优化结构:")
         print(optimized.to_xyz_block())
         
         # > 绘制能量轨迹图
-        self._plot_energy_trajectory(output)
+        with self.span("plot"):
+            self._plot_energy_trajectory(energy_data)
+        self.record_success()
+
+    def _post_opt_fast(self) -> dict:
+        """
+        轻量级后处理：只扫描 .out / .property.json / _trj.xyz 中需要的字段
+        """
+        outfile = self.working_dir / f"{self.basename}.out"
+        results = extract(self.working_dir, self.basename)
+        if not results["terminated"]:
+            print(f"ORCA计算失败，请查看输出文件: {outfile}")
+            sys.exit(1)
+        if not results["scf_converged"]:
+            print(f"ORCA SCF未能收敛，请查看输出文件: {outfile}")
+            sys.exit(1)
+        if not results["opt_converged"]:
+            print(f"ORCA几何优化未能收敛，请查看输出文件: {outfile}")
+            sys.exit(1)
+
+        energy_data = results["energies"]
+        print("构型数量")
+        print(len(energy_data))
+        print("最终单点能")
+        print(results["final_energy"])
+        print("构型优化过程的SCF能量")
+        for igeom, energy in enumerate(energy_data):
+            print(f"{igeom})", energy)
+        print("最终构型的Mulliken电荷")
+        print(results["mulliken_charges"] or "无数据，未计算Mulliken电荷")
+
+        print("最终优化结构:")
+        print(read_last_frame(self.working_dir / f"{self.basename}_trj.xyz"))
+
+        with self.span("plot"):
+            self._plot_energy_trajectory(energy_data)
+        self.record_success()
+        return results
     
-    def _plot_energy_trajectory(self, output):
-        """Plot energy trajectory"""
+    def _post_opt_stream(self) -> dict:
+        """
+        流式后处理：逐个读取 .property.json 中的构型，一次遍历得到能量、电荷、最终结构
+        和绘图数据，内存占用与单个构型相当；每一步的坐标、梯度和电荷写入
+        <basename>.steps.npy (core.steps)，不打印到标准输出
+        """
+        from core.extract import extract, iter_geometries
+        from core.steps import BOHR_TO_ANGSTROM, STEPS_SUFFIX, StepWriter
+
+        outfile = self.working_dir / f"{self.basename}.out"
+        status = extract(self.working_dir, self.basename, fields=("terminated", "opt_converged"))
+        if not status["terminated"]:
+            print(f"ORCA计算失败，请查看输出文件: {outfile}")
+            sys.exit(1)
+
+        energy_data, last = [], None
+        with self.span("stream"):
+            with StepWriter(self.working_dir / f"{self.basename}{STEPS_SUFFIX}") as writer:
+                for geometry in iter_geometries(self.working_dir / f"{self.basename}.property.json"):
+                    writer.append(geometry)
+                    energy_data.append((geometry.get("Single_Point_Data") or {}).get("FinalEnergy"))
+                    last = geometry
+            steps_file = writer.path if writer.count else None
+
+        if last is None:
+            print(f"未找到构型数据，请查看输出文件: {outfile}")
+            sys.exit(1)
+        if not (last.get("Single_Point_Data") or {}).get("Converged"):
+            print(f"ORCA SCF未能收敛，请查看输出文件: {outfile}")
+            sys.exit(1)
+        if not status["opt_converged"]:
+            print(f"ORCA几何优化未能收敛，请查看输出文件: {outfile}")
+            sys.exit(1)
+
+        mulliken = last.get("Mulliken_Population_Analysis") or [{}]
+        charges = mulliken[0].get("AtomicCharges")
+        charges = [c[0] if isinstance(c, list) else c for c in charges] if charges else None
+        cartesians = last["Geometry"]["Coordinates"]["Cartesians"]
+        final_xyz = f"{len(cartesians)}\n{self.basename}\n" + "".join(
+            f"{el} {x * BOHR_TO_ANGSTROM:.8f} {y * BOHR_TO_ANGSTROM:.8f} {z * BOHR_TO_ANGSTROM:.8f}\n"
+            for el, x, y, z in cartesians
+        )
+
+        # 个别构型可能没有 FinalEnergy (如中断后写出的最后一步)，只用有能量的构型
+        energies = [e for e in energy_data if e is not None]
+        if not energies:
+            print(f"未找到单点能数据，请查看输出文件: {outfile}")
+            sys.exit(1)
+
+        print("构型数量")
+        print(len(energy_data))
+        print("最终单点能")
+        print(energies[-1])
+        if charges:
+            print(f"最终构型的Mulliken电荷: {min(charges):+.4f} ~ {max(charges):+.4f}")
+        else:
+            print("无数据，未计算Mulliken电荷")
+        print(f"逐步数据(能量、坐标、梯度、Mulliken电荷): {steps_file}")
+        print("最终优化结构:")
+        print(final_xyz)
+
+        with self.span("plot"):
+            self._plot_energy_trajectory(energies)
+        self.record_success()
+        return {
+            "ngeoms": len(energy_data),
+            "final_energy": energies[-1],
+            "energies": energy_data,
+            "mulliken_charges": charges,
+            "final_structure": final_xyz,
+            "steps_file": str(steps_file) if steps_file is not None else None,
+        }
+
+    def _plot_energy_trajectory(self, energy_data):
+        """Plot energy trajectory to <basename>_energy_trajectory.png in the working directory"""
         try:
-            import matplotlib.pyplot as plt
-            
-            energy_data = []
-            ngeoms = len(output.results_properties.geometries)
-            
-            for igeom in range(ngeoms):
-                energy = output.results_properties.geometries[igeom].single_point_data.finalenergy
-                energy_data.append(energy)
+            from core.plotting import render_trajectory, trajectory_path
             
             if energy_data:
-                # Create figure
-                fig, ax = plt.subplots(figsize=(10, 6))
-                
-                # Plot energy trajectory
-                x_indices = list(range(1, len(energy_data) + 1))  # 从1开始计数
-                ax.plot(x_indices, energy_data, 'b-o', linewidth=2, markersize=4, label='SCF Energy')
-                
-                # Mark final energy
-                final_energy = energy_data[-1]
-                ax.axhline(y=final_energy, color='r', linestyle='--', alpha=0.7, 
-                           label=f'Final Energy: {final_energy:.6f} Hartree')
-                
-                # Add title and labels
-                ax.set_title('Geometry Optimization Energy Trajectory', fontsize=14, fontweight='bold')
-                ax.set_xlabel('Geometry Index', fontsize=12)
-                ax.set_ylabel('Energy (Hartree)', fontsize=12)
-                
-                # Set x-axis to show only integers (1,2,3,4,5...) and y-axis to 2 decimal places
-                from matplotlib.ticker import FormatStrFormatter, MaxNLocator
-                ax.xaxis.set_major_locator(MaxNLocator(integer=True))
-                ax.xaxis.set_major_formatter(FormatStrFormatter('%d'))
-                ax.yaxis.set_major_formatter(FormatStrFormatter('%.6f'))
-                
-                # Add grid and legend
-                ax.grid(True, alpha=0.3)
-                ax.legend()
-                
-                # Save plot
-                plt.tight_layout()
-                plt.savefig('energy_trajectory.png', dpi=300, bbox_inches='tight')
-                plt.close()
+                # Agg object API: no pyplot global state, safe in batch worker processes
+                save_path = render_trajectory(energy_data, trajectory_path(self.working_dir, self.basename))
                 
-                print(f"收敛趋势图: opt_energy_trajectory.png")
+                print(f"收敛趋势图: {save_path}")
                 print(f"构型迭代数: {len(energy_data)}")
                 print(f"初始能量: {energy_data[0]:.6f} Hartree")
                 print(f"最终能量: {energy_data[-1]:.6f} Hartree")
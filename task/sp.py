@@ -6,6 +6,7 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from core.base_workflow import OPIWorkflow
+from core.extract import extract
 from opi.input.simple_keywords import *
 
 class spWorkflow(OPIWorkflow):
@@ -13,7 +14,7 @@ class spWorkflow(OPIWorkflow):
     专门用于结构优化的工作流类
     """
     def pre_sp(self, 
-        method: str = None, basis_set: str = None) -> None:
+        method: str = None, basis_set: str = None, dispersion: str = None) -> None:
     
         """
         设置 SP 的参数
@@ -23,33 +24,47 @@ class spWorkflow(OPIWorkflow):
         method : str, optional
             优化使用的方法，默认为B3LYP
         basis_set : str, optional
-            基组，默认为None
+            基组，默认为def2-TZVP
+        dispersion : str, optional
+            色散校正，默认为D3
         additional_keywords : Union[str, List[str]], optional
             额外的关键字，可以是字符串或字符串列表，默认为None
         """
         if self.calc is None:
             raise ValueError("请先设置计算器")
 
-        sk_list = [
+        self.set_level(method, basis_set, dispersion)
+        if self.cache_hit:
+            print(f"命中结果缓存，跳过输入文件写入: {self.basename}")
+            return
+
+        self.calc.input.add_simple_keywords(*self.simple_keywords())
+        with self.span("write_input"):
+            self.calc.write_input()
+
+    def simple_keywords(self) -> list:
+        """SP 计算的简单关键词"""
+        return self.apply_level([
             DispersionCorrection.D3, 
             AtomicCharge.NOPOP, 
             Scf.NOAUTOSTART, 
             Task.SP,
             BasisSet.DEF2_TZVP,
             Dft.B3LYP
-        ]
-        self.calc.input.add_simple_keywords(*sk_list)
-        self.calc.write_input()
+        ])
+
+    def post_sp(self, fast: bool = False):
+        if fast:
+            return self._post_sp_fast()
 
-    def post_sp(self):
         output = self.calc.get_output()
         if not output.terminated_normally():
             print(f"ORCA calculation failed, see output file: {output.get_outfile()}")
             sys.exit(1)
         # << END OF IF
 
-        # > Parse JSON files
-        output.parse()
+        # > Parse JSON files (only once per workflow)
+        output = self.parsed_output(output)
 
         # 检查SCF收敛情况
         if output.results_properties.geometries[0].single_point_data.converged:
@@ -67,3 +82,24 @@ class spWorkflow(OPIWorkflow):
         #     output.results_properties.geometries[0].energy[0].totalenergy[0][0]
         #     + output.results_properties.geometries[0].vdw_correction.vdw
         # )
+        self.record_success()
+
+    def _post_sp_fast(self) -> dict:
+        """
+        轻量级后处理：只扫描 .out / .property.json 中需要的字段，不做完整JSON解析
+        """
+        results = extract(self.working_dir, self.basename, fields=("terminated", "scf_converged", "final_energy"))
+        if not results["terminated"]:
+            print(f"ORCA calculation failed, see output file: {self.working_dir / f'{self.basename}.out'}")
+            sys.exit(1)
+
+        if results["scf_converged"]:
+            print("SCF已收敛")
+        else:
+            print("SCF未收敛")
+            sys.exit(1)
+
+        print("单点能：")
+        print(results["final_energy"])
+        self.record_success()
+        return results
@@ -0,0 +1,100 @@
+import re
+import sys
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from core.base_workflow import OPIWorkflow
+from opi.input.simple_keywords import *
+from opi.input.arbitrary_string import ArbitraryStringPos
+
+# 例: "STATE  1:  E=   0.276498 au      7.524 eV    60684.3 cm**-1 <S**2> =   0.000000 Mult 1"
+STATE_RE = re.compile(r"STATE\s+(\d+):\s+E=\s+(-?\d+\.\d+)\s+au\s+(-?\d+\.\d+)\s+eV")
+
+class tddftWorkflow(OPIWorkflow):
+    """
+    专门用于TDDFT激发态计算的工作流类
+    """
+    # 激发态数目，写入 %tddft 块并计入结果缓存键
+    nroots = 10
+
+    def pre_tddft(self, 
+        method: str = None, basis_set: str = None, nroots: int = 10,
+        dispersion: str = None) -> None:
+    
+        """
+        设置 TDDFT 的参数
+
+        参数
+        ----------
+        method : str, optional
+            计算使用的方法，默认为B3LYP
+        basis_set : str, optional
+            基组，默认为def2-TZVP
+        nroots : int, optional
+            计算的激发态数目，默认为10
+        dispersion : str, optional
+            色散校正，默认为D3
+        """
+        if self.calc is None:
+            raise ValueError("请先设置计算器")
+
+        self.set_level(method, basis_set, dispersion)
+        if nroots != self.nroots:
+            self.nroots = nroots
+            if self.cache is not None:
+                self.attach_cache(self.cache)
+        if self.cache_hit:
+            print(f"命中结果缓存，跳过输入文件写入: {self.basename}")
+            return
+
+        self.calc.input.add_simple_keywords(*self.simple_keywords())
+        for block in self.input_blocks():
+            self.calc.input.add_arbitrary_string(block, pos=ArbitraryStringPos.TOP)
+        with self.span("write_input"):
+            self.calc.write_input()
+
+    def simple_keywords(self) -> list:
+        """TDDFT 计算的简单关键词"""
+        return self.apply_level([
+            DispersionCorrection.D3, 
+            AtomicCharge.NOPOP, 
+            Scf.NOAUTOSTART, 
+            Task.SP,
+            BasisSet.DEF2_TZVP,
+            Dft.B3LYP
+        ])
+
+    def input_blocks(self) -> list:
+        """TDDFT 计算的输入块"""
+        return [f"%tddft\n    nroots {self.nroots}\nend"]
+
+    def post_tddft(self):
+        output = self.calc.get_output()
+        if not output.terminated_normally():
+            print(f"ORCA calculation failed, see output file: {output.get_outfile()}")
+            sys.exit(1)
+
+        # > Parse JSON files
+        output = self.parsed_output(output)
+
+        if not output.scf_converged():
+            print("SCF未收敛")
+            sys.exit(1)
+
+        print("基态单点能：")
+        print(output.get_final_energy())
+
+        # 激发态能量直接从输出文件中读取
+        states = [
+            (int(m.group(1)), float(m.group(2)), float(m.group(3)))
+            for m in STATE_RE.finditer(Path(output.get_outfile()).read_text())
+        ]
+        print("激发态能量 (au / eV)：")
+        for istate, e_au, e_ev in states:
+            print(f"{istate})", f"{e_au:.6f}", f"{e_ev:.3f}")
+
+        self.record_success()
+        return states
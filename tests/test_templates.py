@@ -0,0 +1,52 @@
+"""
+模板化写入(core.templates)与逐结构 Calculator 路径生成的输入文件必须逐字节一致
+"""
+import os
+import sys
+import shutil
+from pathlib import Path
+
+import pytest
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+sys.path.insert(0, str(project_root / "utils"))
+
+from bench_templates import make_structures
+
+DEMO_STRUCTURE = project_root / "demo" / "opt" / "test_water_trj.xyz"
+
+
+@pytest.fixture
+def orca(tmp_path, monkeypatch):
+    """未配置ORCA时使用 utils/fake_orca.py，使 opi 的版本检查通过"""
+    if not (shutil.which("orca") or "OPI_ORCA" in os.environ):
+        (tmp_path / "orca" / "lib").mkdir(parents=True)
+        (tmp_path / "orca" / "bin").mkdir()
+        orca = tmp_path / "orca" / "bin" / "orca"
+        orca.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{project_root / "utils" / "fake_orca.py"}" "$@"\n')
+        orca.chmod(0o755)
+        monkeypatch.setenv("OPI_ORCA", str(orca))
+
+
+@pytest.mark.parametrize("task", ["sp", "opt"])
+def test_templated_inputs_are_byte_identical(task, orca, tmp_path, monkeypatch):
+    from core.task_manager import create_workflow
+    from core.templates import write_inputs
+
+    inputs = make_structures(DEMO_STRUCTURE, 5, tmp_path / "xyz")
+
+    (tmp_path / "calculator").mkdir()
+    monkeypatch.chdir(tmp_path / "calculator")
+    for f in inputs:
+        workflow = create_workflow(task, f, 4)
+        getattr(workflow, f"pre_{task}")()
+
+    (tmp_path / "template").mkdir()
+    monkeypatch.chdir(tmp_path / "template")
+    records = write_inputs(task, inputs, 4)
+
+    assert [r["status"] for r in records] == ["ok"] * len(inputs)
+    for f in inputs:
+        expected = (tmp_path / "calculator" / task / f"{f.stem}.inp").read_bytes()
+        assert (tmp_path / "template" / task / f"{f.stem}.inp").read_bytes() == expected, f.stem
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for main.py based on `python -X importtime`
+
+Runs a few representative main.py invocations in fresh interpreters, sums the
+cumulative import time of the top-level imports reported by -X importtime
+(best of N runs) and checks it against a per-scenario budget:
+
+  help      main.py --help
+  validate  main.py with a missing input file (argument validation only)
+  pre       single-structure sp pre stage (needs opi)
+
+The help and validate scenarios must also not import any of the heavy
+modules listed in HEAVY_MODULES. With --baseline, import times are compared
+against a saved baseline instead and a scenario fails when it is more than
+--threshold (fraction) slower. Exits non-zero on any regression.
+
+If neither $OPI_ORCA nor an `orca` binary on PATH is available, a throwaway
+ORCA installation backed by utils/fake_orca.py is created for the pre scenario.
+
+Usage:
+    python utils/bench_startup.py
+    python utils/bench_startup.py --save-baseline utils/startup_baseline.json
+    python utils/bench_startup.py --baseline utils/startup_baseline.json --threshold 0.2
+"""
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from bench_templates import ensure_orca
+
+# Modules that --help and argument validation must not pull in
+HEAVY_MODULES = ["opi", "numpy", "scipy", "matplotlib", "asyncio", "concurrent.futures", "sqlite3", "core.task_manager"]
+
+# scenario -> (main.py arguments, import-time budget in ms, check heavy modules)
+SCENARIOS = {
+    "help": (["--help"], 60.0, True),
+    "validate": (["-t", "opt", "-p", "pre", "-i", "missing.xyz"], 60.0, True),
+    "pre": (["-t", "sp", "-p", "pre", "-i", "water.xyz"], 2000.0, False),
+}
+
+
+def parse_importtime(stderr: str):
+    """Return (total top-level cumulative import time in us, set of imported module names)."""
+    total = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[1].strip().isdigit():
+            continue  # header line
+        name = fields[2]
+        modules.add(name.strip())
+        # nested imports are indented by two extra spaces per level
+        if not name.startswith("  "):
+            total += int(fields[1])
+    return total, modules
+
+
+def run_scenario(argv, cwd: Path, repeat: int):
+    """Best-of-`repeat` import time (ms) and the module set of that run."""
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", str(project_root / "main.py")] + argv,
+                              cwd=cwd, capture_output=True, text=True)
+        total, modules = parse_importtime(proc.stderr)
+        if best is None or total < best[0]:
+            best = (total, modules)
+    return best[0] / 1000.0, best[1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="main.py startup-time benchmark")
+    parser.add_argument("-r", "--repeat", type=int, default=5, help="runs per scenario, best is kept (default: 5)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated scenarios to run")
+    parser.add_argument("--baseline", default=None, help="compare against this baseline file instead of the budgets")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed slowdown relative to the baseline (default: 0.25)")
+    parser.add_argument("--save-baseline", default=None, help="write the measured import times to this file")
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    results = {}
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ensure_orca(tmp)
+        shutil.copy(project_root / "demo" / "water.xyz", tmp / "water.xyz")
+        for name in args.scenarios.split(","):
+            scenario_argv, budget, check_heavy = SCENARIOS[name]
+            ms, modules = run_scenario(scenario_argv, tmp, args.repeat)
+            results[name] = round(ms, 2)
+
+            if baseline is not None and name in baseline:
+                limit = baseline[name] * (1 + args.threshold)
+                label = f"baseline {baseline[name]:.1f} ms +{args.threshold:.0%}"
+            else:
+                limit = budget
+                label = f"budget {budget:.0f} ms"
+            status = "ok" if ms <= limit else "REGRESSION"
+            if ms > limit:
+                failures.append(name)
+            print(f"{name:<10} {ms:8.1f} ms  ({label}, limit {limit:.1f} ms)  {status}")
+
+            if check_heavy:
+                heavy = sorted(m for m in modules
+                               if any(m == h or m.startswith(h + ".") for h in HEAVY_MODULES))
+                if heavy:
+                    failures.append(f"{name} (heavy imports)")
+                    print(f"{'':<10} imports heavy modules: {', '.join(heavy[:10])}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.save_baseline}")
+    if failures:
+        print(f"Startup regressions: {', '.join(failures)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Check and benchmark the templated pre-stage input writer (core/templates.py)
+
+Generates N perturbed copies of a structure, writes their ORCA inputs once
+through the per-structure Calculator path and once through the template
+path, verifies that every .inp file is byte-identical, and reports the
+throughput of both paths. Exits non-zero on any mismatch.
+
+If neither $OPI_ORCA nor an `orca` binary on PATH is available, a throwaway
+ORCA installation backed by utils/fake_orca.py is created so that opi's
+version check passes.
+
+Usage:
+    python utils/bench_templates.py -t opt -n 2000
+    python utils/bench_templates.py -t sp -n 50000 --structure my_molecule.xyz --skip-calculator 49000
+"""
+import os
+import sys
+import time
+import random
+import shutil
+import argparse
+import tempfile
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+
+def ensure_orca(tmp: Path) -> None:
+    """Point opi at utils/fake_orca.py unless a real ORCA is configured."""
+    if os.environ.get("OPI_ORCA") or shutil.which("orca"):
+        return
+    (tmp / "orca" / "lib").mkdir(parents=True)
+    (tmp / "orca" / "bin").mkdir()
+    orca = tmp / "orca" / "bin" / "orca"
+    orca.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{project_root / "utils" / "fake_orca.py"}" "$@"\n')
+    orca.chmod(0o755)
+    os.environ["OPI_ORCA"] = str(orca)
+
+
+def make_structures(template: Path, count: int, out_dir: Path, seed: int = 0) -> list:
+    """Write `count` randomly perturbed copies of the (last frame of the) template structure."""
+    lines = template.read_text().splitlines()
+    natoms = int(lines[0])
+    atoms = [line.split()[:4] for line in lines[-natoms:]]
+    rng = random.Random(seed)
+    out_dir.mkdir(parents=True)
+    files = []
+    for i in range(count):
+        body = "".join(
+            f"{el} {float(x) + rng.uniform(-0.1, 0.1):.6f} {float(y) + rng.uniform(-0.1, 0.1):.6f} "
+            f"{float(z) + rng.uniform(-0.1, 0.1):.6f}\n"
+            for el, x, y, z in atoms
+        )
+        f = out_dir / f"mol_{i:06d}.xyz"
+        f.write_text(f"{natoms}\nbenchmark structure {i}\n{body}")
+        files.append(f)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="templated input writer check and benchmark")
+    parser.add_argument("-t", "--task", default="opt", help="task type (default: opt)")
+    parser.add_argument("-n", "--count", type=int, default=2000, help="number of structures (default: 2000)")
+    parser.add_argument("--ncores", type=int, default=32, help="nprocs written to the inputs (default: 32)")
+    parser.add_argument("--structure", default=str(project_root / "demo" / "opt" / "test_water_trj.xyz"),
+                        help="structure to perturb (default: last frame of the demo water optimization)")
+    parser.add_argument("--skip-calculator", type=int, default=0,
+                        help="only run the Calculator path for the first count-N structures")
+    args = parser.parse_args(argv)
+
+    from core.task_manager import create_workflow
+    from core.templates import write_inputs
+
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        ensure_orca(tmp)
+        inputs = make_structures(Path(args.structure), args.count, tmp / "xyz")
+        reference = inputs[:len(inputs) - args.skip_calculator]
+
+        try:
+            (tmp / "calculator").mkdir()
+            os.chdir(tmp / "calculator")
+            start = time.perf_counter()
+            for f in reference:
+                workflow = create_workflow(args.task, f, args.ncores)
+                getattr(workflow, f"pre_{args.task}")()
+            t_calc = time.perf_counter() - start
+
+            (tmp / "template").mkdir()
+            os.chdir(tmp / "template")
+            start = time.perf_counter()
+            records = write_inputs(args.task, inputs, args.ncores)
+            t_tmpl = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+        failed = [r for r in records if r["status"] != "ok"]
+        mismatched = [
+            f.stem for f in reference
+            if (tmp / "calculator" / args.task / f"{f.stem}.inp").read_bytes()
+            != (tmp / "template" / args.task / f"{f.stem}.inp").read_bytes()
+        ]
+
+    print(f"Calculator path: {len(reference)} inputs in {t_calc:.2f} s ({len(reference) / t_calc:.0f} inputs/s)")
+    print(f"Template path:   {len(inputs)} inputs in {t_tmpl:.2f} s ({len(inputs) / t_tmpl:.0f} inputs/s)")
+    print(f"Speedup: {(len(inputs) / t_tmpl) / (len(reference) / t_calc):.1f}x")
+    print(f"Byte-identical: {len(reference) - len(mismatched)}/{len(reference)}, write failures: {len(failed)}")
+    if mismatched or failed:
+        for name in mismatched[:10]:
+            print(f"  mismatch: {name}")
+        for r in failed[:10]:
+            print(f"  failed: {r['basename']}: {r['error']}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Workflow overhead benchmark on a fake ORCA (utils/fake_orca.py)
+
+Drives the full pre -> run -> post cycle for N synthetic structures (randomly
+perturbed copies of one molecule) against a throwaway ORCA installation that
+replays the canned demo/opt/test_water.* outputs, and reports for each stage:
+
+  create  create_workflow (structure parsing + Calculator setup)
+  pre     pre_<task> (input writing)
+  run     fake ORCA via LocalScheduler (per-job wall time, process overhead)
+  post    create_workflow + post_<task>
+
+throughput (structures/s), p50/p99 latency, the growth of the harness peak
+RSS during the stage (memory the stage itself added) and the cumulative peak
+RSS after it. Each repetition (--repeat) runs in a fresh interpreter and the
+reported figures are the medians over the repetitions.
+
+Results can be saved as a baseline; with --baseline the run fails (exit 1)
+when any stage is slower or grows memory more than the baseline by more than
+--threshold (and by more than --min-delta-ms / --min-delta-mb, so
+sub-millisecond stages do not fail on timer noise). p99 is only gated with at
+least --min-p99-samples structures, below that it is a single outlier.
+
+utils/workflow_baseline.json was recorded with the first command below; it is
+machine-specific, re-record it on the machine that runs the gate.
+
+Usage:
+    python utils/bench_workflow.py -t opt -n 100 --save-baseline utils/workflow_baseline.json
+    python utils/bench_workflow.py -t opt -n 100 --baseline utils/workflow_baseline.json --threshold 0.3
+    python utils/bench_workflow.py -t sp -n 10000 --fast --scale 50
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import tempfile
+import statistics
+import contextlib
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+
+from bench_templates import make_structures
+
+STAGES = ("create", "pre", "run", "post")
+TIMINGS = ("p50_ms", "p99_ms", "mean_ms")
+METRICS = ("count", "throughput", *TIMINGS, "rss_growth_mb", "peak_rss_mb")
+
+
+def fake_installation(tmp: Path) -> str:
+    """Create <tmp>/orca/{bin,lib} with a wrapper around fake_orca.py and point opi at it."""
+    (tmp / "orca" / "lib").mkdir(parents=True)
+    (tmp / "orca" / "bin").mkdir()
+    orca = tmp / "orca" / "bin" / "orca"
+    orca.write_text(f'#!/bin/sh\nexec "{sys.executable}" "{project_root / "utils" / "fake_orca.py"}" "$@"\n')
+    orca.chmod(0o755)
+    os.environ["OPI_ORCA"] = str(orca)
+    return str(orca)
+
+
+def percentile(values, q: float) -> float:
+    """Nearest-rank percentile."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered) + 0.5)) - 1))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux; it only ever grows over the life of the process
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def stage_stats(latencies, elapsed: float, rss_before: float) -> dict:
+    peak = peak_rss_mb()
+    return {
+        "count": len(latencies),
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "mean_ms": elapsed / len(latencies) * 1000 if latencies else 0.0,
+        "rss_growth_mb": peak - rss_before,
+        "peak_rss_mb": peak,
+    }
+
+
+def run_benchmark(task: str, inputs, ncores: int, total_cores: int, orca_cmd: str, fast: bool) -> dict:
+    from core.task_manager import create_workflow
+    from core.scheduler import LocalScheduler
+
+    results = {}
+
+    # create + pre: timed separately for each structure
+    rss = peak_rss_mb()
+    create_lat, pre_lat = [], []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for f in inputs:
+            t0 = time.perf_counter()
+            workflow = create_workflow(task, f, ncores)
+            t1 = time.perf_counter()
+            getattr(workflow, f"pre_{task}")()
+            t2 = time.perf_counter()
+            create_lat.append(t1 - t0)
+            pre_lat.append(t2 - t1)
+    # sequential in-process stages: throughput is the inverse of the mean latency;
+    # create and pre are interleaved, so both report the memory growth of the pair
+    results["create"] = stage_stats(create_lat, sum(create_lat), rss)
+    results["pre"] = stage_stats(pre_lat, sum(pre_lat), rss)
+
+    rss = peak_rss_mb()
+    start = time.perf_counter()
+    jobs = LocalScheduler(total_cores, orca_cmd).run([Path(task) / f"{f.stem}.inp" for f in inputs])
+    results["run"] = stage_stats([j.wall_time for j in jobs], time.perf_counter() - start, rss)
+    failed_runs = sum(1 for j in jobs if not j.succeeded)
+
+    rss = peak_rss_mb()
+    post_lat, failed_posts = [], 0
+    kwargs = {"fast": True} if fast else {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for f in inputs:
+            t0 = time.perf_counter()
+            try:
+                workflow = create_workflow(task, f, ncores)
+                getattr(workflow, f"post_{task}")(**kwargs)
+            except SystemExit:
+                failed_posts += 1
+            post_lat.append(time.perf_counter() - t0)
+    results["post"] = stage_stats(post_lat, sum(post_lat), rss)
+    results["failures"] = {"run": failed_runs, "post": failed_posts}
+    return results
+
+
+def run_once(task: str, count: int, structure: str, ncores: int, total_cores: int, fast: bool) -> dict:
+    """One repetition in a throwaway directory (run in a fresh process, see main)."""
+    cwd = Path.cwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        orca_cmd = fake_installation(tmp)
+        inputs = make_structures(Path(structure), count, tmp / "xyz")
+        (tmp / "work").mkdir()
+        os.chdir(tmp / "work")
+        try:
+            return run_benchmark(task, inputs, ncores, total_cores, orca_cmd, fast)
+        finally:
+            os.chdir(cwd)
+
+
+def median_results(runs: list) -> dict:
+    """
+    Per-stage median of every metric over the repetitions, plus the spread (max - min)
+    of the timings as a noise estimate; failures are summed.
+    """
+    results = {}
+    for stage in STAGES:
+        results[stage] = {key: statistics.median(r[stage][key] for r in runs) for key in METRICS}
+        results[stage]["spread"] = {key: max(r[stage][key] for r in runs) - min(r[stage][key] for r in runs)
+                                    for key in TIMINGS}
+    results["failures"] = {key: sum(r["failures"][key] for r in runs) for key in ("run", "post")}
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float, min_delta_ms: float = 1.0,
+            min_delta_mb: float = 10.0, min_p99_samples: int = 1000) -> list:
+    """
+    Return a list of regression messages.
+
+    A metric regresses when it is worse than the baseline by more than `threshold`
+    (relative) and by more than an absolute floor: `min_delta_ms`, or the combined
+    spread of the repetitions of both runs if that is larger, so that sub-millisecond
+    stages and process-launch jitter do not fail on noise. p99 is skipped for stages with fewer than
+    `min_p99_samples` structures, where the nearest-rank p99 is the slowest
+    one or two samples.
+    """
+    regressions = []
+    for stage in STAGES:
+        if stage not in baseline:
+            continue
+        cur, ref = results[stage], baseline[stage]
+        # throughput is compared as time per structure (mean_ms)
+        keys = [key for key in TIMINGS if key != "p99_ms" or cur["count"] >= min_p99_samples]
+        for key in keys:
+            noise = cur.get("spread", {}).get(key, 0.0) + ref.get("spread", {}).get(key, 0.0)
+            if cur[key] > ref[key] * (1 + threshold) and cur[key] - ref[key] > max(min_delta_ms, noise):
+                regressions.append(f"{stage} {key}: {cur[key]:.2f} > {ref[key]:.2f} "
+                                   f"(+{threshold:.0%}, noise {noise:.2f})")
+        if (cur["rss_growth_mb"] > ref["rss_growth_mb"] * (1 + threshold)
+                and cur["rss_growth_mb"] - ref["rss_growth_mb"] > min_delta_mb):
+            regressions.append(f"{stage} rss_growth_mb: {cur['rss_growth_mb']:.1f} > "
+                               f"{ref['rss_growth_mb']:.1f} (+{threshold:.0%})")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="workflow overhead benchmark on a fake ORCA")
+    parser.add_argument("-t", "--task", default="opt", choices=["sp", "opt"], help="task type (default: opt)")
+    parser.add_argument("-n", "--count", type=int, default=1000, help="number of structures (default: 1000)")
+    parser.add_argument("--ncores", type=int, default=1, help="nprocs written to the inputs (default: 1)")
+    parser.add_argument("--total-cores", type=int, default=os.cpu_count(), help="core budget of the run stage")
+    parser.add_argument("--structure", default=str(project_root / "demo" / "opt" / "test_water_trj.xyz"),
+                        help="structure to perturb (default: last frame of the demo water optimization)")
+    parser.add_argument("--scale", type=int, default=1,
+                        help="repeat the fake binary artifacts (.gbw/.densities) this many times (FAKE_ORCA_SCALE)")
+    parser.add_argument("--fast", action="store_true", help="benchmark post --fast instead of the full JSON parse")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="repetitions, each in a fresh process; medians are reported (default: 3)")
+    parser.add_argument("--baseline", default=None, help="fail if any stage regresses against this baseline")
+    parser.add_argument("--threshold", type=float, default=0.3, help="allowed regression (default: 0.3)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore latency regressions smaller than this (default: 1 ms)")
+    parser.add_argument("--min-delta-mb", type=float, default=10.0,
+                        help="ignore RSS growth regressions smaller than this (default: 10 MB)")
+    parser.add_argument("--min-p99-samples", type=int, default=1000,
+                        help="only gate p99 latency with at least this many structures (default: 1000)")
+    parser.add_argument("--save-baseline", default=None, help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    os.environ["FAKE_ORCA_SCALE"] = str(args.scale)
+    # a fresh interpreter per repetition: no warm caches and a clean ru_maxrss
+    runs = []
+    for _ in range(max(1, args.repeat)):
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            runs.append(pool.submit(run_once, args.task, args.count, args.structure, args.ncores,
+                                    args.total_cores, args.fast).result())
+    results = median_results(runs)
+
+    results["config"] = {"task": args.task, "count": args.count, "scale": args.scale, "fast": args.fast,
+                         "repeat": len(runs)}
+    print(f"{args.count} x {args.task} structures (scale {args.scale}, post {'fast' if args.fast else 'full'}, "
+          f"median of {len(runs)} runs)")
+    print(f"{'stage':<8}{'throughput/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'RSS +MB':>10}{'peak RSS MB (cumulative)':>26}")
+    for stage in STAGES:
+        r = results[stage]
+        print(f"{stage:<8}{r['throughput']:>14.1f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}"
+              f"{r['rss_growth_mb']:>10.1f}{r['peak_rss_mb']:>26.1f}")
+    failures = results["failures"]
+    if failures["run"] or failures["post"]:
+        print(f"Failures: run {failures['run']}, post {failures['post']}")
+
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.save_baseline}")
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        if baseline.get("config") != results["config"]:
+            print(f"Warning: baseline config {baseline.get('config')} differs from this run")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms, args.min_delta_mb,
+                              args.min_p99_samples)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if not regressions:
+            print(f"No regressions against {args.baseline} (threshold {args.threshold:.0%})")
+    if regressions or failures["run"] or failures["post"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+ORCA stand-in for testing executors without a real ORCA installation
+
+Replays a canned calculation (by default demo/opt/test_water.*) under the
+basename of the given input file. The .out content goes to stdout like the
+real ORCA binary; all other artifacts are written next to the input.
+
+Environment variables:
+    FAKE_ORCA_TEMPLATE  directory with canned <name>.* files (default: demo/opt)
+    FAKE_ORCA_NAME      basename of the canned files (default: test_water)
+    FAKE_ORCA_SLEEP     seconds to sleep before "finishing" (default: 0)
+    FAKE_ORCA_FAIL      exit with this non-zero code without writing outputs
+    FAKE_ORCA_SCALE     repeat the binary artifacts (.gbw, .densities, .tar) this
+                        many times to mimic larger molecules (default: 1)
+
+The program version recorded in the canned JSON files is rewritten to the
+version reported by --version, so that opi accepts them in the post stage.
+
+Usage:
+    ORCA_BIN=utils/fake_orca.py python main.py -t opt -p run -i demo/water.xyz
+
+opi itself also needs an ORCA installation (it checks `orca --version` and
+expects sibling bin/ and lib/ folders). To run the pre stage without ORCA:
+    mkdir -p /tmp/orca/bin /tmp/orca/lib
+    printf '#!/bin/sh\nexec %s "$@"\n' "$PWD/utils/fake_orca.py" > /tmp/orca/bin/orca
+    chmod +x /tmp/orca/bin/orca
+    export OPI_ORCA=/tmp/orca/bin/orca
+"""
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parent.parent
+
+# reported by --version; the minimal version accepted by opi
+FAKE_VERSION = "6.1.1-f.0"
+
+VERSION_RE = re.compile(rb'("[Vv]ersion"\s*:\s*")[^"]*"')
+BINARY_SUFFIXES = (".gbw", ".densities", ".tar")
+
+
+def main(argv):
+    if len(argv) < 2:
+        sys.exit("usage: fake_orca.py <input.inp>")
+
+    if argv[1] == "--version":
+        print(f"Program Version {FAKE_VERSION}")
+        return
+
+    inp_file = Path(argv[1]).resolve()
+    if not inp_file.exists():
+        sys.exit(f"input file not found: {inp_file}")
+
+    template_dir = Path(os.environ.get("FAKE_ORCA_TEMPLATE", project_root / "demo" / "opt"))
+    template_name = os.environ.get("FAKE_ORCA_NAME", "test_water")
+    time.sleep(float(os.environ.get("FAKE_ORCA_SLEEP", "0")))
+
+    fail = int(os.environ.get("FAKE_ORCA_FAIL", "0"))
+    if fail:
+        print("ORCA finished by error termination")
+        sys.exit(fail)
+
+    scale = int(os.environ.get("FAKE_ORCA_SCALE", "1"))
+    basename = inp_file.stem
+    for src in template_dir.glob(f"{template_name}*"):
+        suffix = src.name[len(template_name):]
+        if suffix in (".inp", ".out"):
+            continue
+        data = src.read_bytes()
+        if suffix.endswith(".json"):
+            data = VERSION_RE.sub(rb"\g<1>" + FAKE_VERSION.encode() + b'"', data)
+        elif suffix in BINARY_SUFFIXES:
+            data *= scale
+        (inp_file.parent / f"{basename}{suffix}").write_bytes(data)
+
+    out = (template_dir / f"{template_name}.out").read_bytes()
+    sys.stdout.buffer.write(out.replace(template_name.encode(), basename.encode()))
+
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -3,8 +3,6 @@
 Energy trajectory plotting tool
 For plotting energy changes during ORCA geometry optimization
 """
-import matplotlib.pyplot as plt
-import numpy as np
 from pathlib import Path
 import sys
 
@@ -26,6 +24,17 @@ def plot_energy_trajectory(energy_data, title="Energy Trajectory", xlabel="Geome
     if not energy_data:
         print("Error: Energy data is empty")
         return
+
+    # Saving goes through the Agg object API (no pyplot global state), so this is
+    # safe to call from worker processes; pyplot is only used to show the plot
+    if save_path:
+        from core.plotting import render_trajectory
+        render_trajectory(energy_data, save_path, title=title, xlabel=xlabel, ylabel=ylabel)
+        print(f"Plot saved to: {save_path}")
+        return
+
+    # Imported on first use so that importing this module stays cheap
+    import matplotlib.pyplot as plt
     
     # 创建图形
     plt.figure(figsize=(10, 6))
@@ -51,13 +60,7 @@ def plot_energy_trajectory(energy_data, title="Energy Trajectory", xlabel="Geome
     
     # Adjust layout
     plt.tight_layout()
-    
-    # Save or display
-    if save_path:
-        plt.savefig(save_path, dpi=300, bbox_inches='tight')
-        print(f"Plot saved to: {save_path}")
-    else:
-        plt.show()
+    plt.show()
 
 def extract_energy_from_orca_output(output_file):
     """
@@ -97,8 +100,8 @@ def plot_from_workflow(workflow_instance):
         workflow_instance: ORCA workflow instance
     """
     try:
-        output = workflow_instance.calc.get_output()
-        output.parse()
+        # Reuse the workflow's memoized parse instead of parsing again
+        output = workflow_instance.parsed_output()
         
         energy_data = []
         ngeoms = len(output.results_properties.geometries)
@@ -108,10 +111,11 @@ def plot_from_workflow(workflow_instance):
             energy_data.append(energy)
         
         if energy_data:
+            from core.plotting import trajectory_path
             plot_energy_trajectory(
                 energy_data,
                 title="Geometry Optimization Energy Trajectory",
-                save_path="energy_trajectory.png"
+                save_path=trajectory_path(workflow_instance.working_dir, workflow_instance.basename)
             )
             
             # Print statistics